@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Keeps N concurrent clients waiting on synchronous API calls
+and reports how many of them the API serves at once.
+
+Usage:
+    benchmarks/api_load.py --config CONFIG [--action plan] [--clients 200]
+
+TERRESTRIAL_ADDR and TERRESTRIAL_TOKEN are read the same
+way as the bash CLI does.
+"""
+import os
+import time
+import argparse
+import threading
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+
+
+def client(url, token, method, results, lock, active, peak):
+    req = Request(
+        url, method=method, headers={'Authorization': f'Token {token}'})
+
+    with lock:
+        active[0] += 1
+        peak[0] = max(peak[0], active[0])
+
+    start = time.perf_counter()
+    try:
+        with urlopen(req) as r:
+            status = r.status
+    except HTTPError as e:
+        status = e.code
+    except Exception:
+        status = None
+    elapsed = time.perf_counter() - start
+
+    with lock:
+        active[0] -= 1
+        results.append((status, elapsed))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--config', required=True)
+    parser.add_argument('--workspace', default='default')
+    parser.add_argument('--action', default='plan')
+    parser.add_argument('--clients', type=int, default=200)
+    args = parser.parse_args()
+
+    addr = os.getenv('TERRESTRIAL_ADDR', 'http://localhost:8000')
+    token = os.getenv('TERRESTRIAL_TOKEN', 'dev')
+    method = 'GET' if args.action in ['show', 'output'] else 'POST'
+    url = (f'{addr}/api/v1/configurations/'
+           f'{args.config}/{args.workspace}/{args.action}')
+
+    results, lock, active, peak = [], threading.Lock(), [0], [0]
+    threads = [
+        threading.Thread(
+            target=client,
+            args=(url, token, method, results, lock, active, peak))
+        for _ in range(args.clients)]
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+
+    # Health endpoint must stay responsive while clients wait
+    health = []
+    while any(t.is_alive() for t in threads):
+        probe = time.perf_counter()
+        try:
+            urlopen(f'{addr}/api/v1/health', timeout=5).read()
+            health.append(time.perf_counter() - probe)
+        except Exception:
+            health.append(float('inf'))
+        time.sleep(1)
+
+    for t in threads:
+        t.join()
+    total = time.perf_counter() - start
+
+    latencies = [e for s, e in results if s and s < 300]
+    failed = len(results) - len(latencies)
+
+    print(f'clients:             {args.clients}')
+    print(f'peak concurrent:     {peak[0]}')
+    print(f'succeeded / failed:  {len(latencies)} / {failed}')
+    print(f'wall time, s:        {total:.2f}')
+    if latencies:
+        print(f'latency p50/p99, s:  {percentile(latencies, 50):.2f} / '
+              f'{percentile(latencies, 99):.2f}')
+    if health:
+        print(f'health p99, ms:      {percentile(health, 99) * 1000:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Compares configuration clone strategies by wall time
+and amount of data written to disk per clone.
+
+Usage:
+    benchmarks/clone.py [--path CONFIG_PATH] [--iterations N] [--plugin-size MB]
+
+Unless --path is given, a synthetic initialized configuration
+with a fake provider plugin of --plugin-size MB is generated.
+"""
+import os
+import sys
+import time
+import argparse
+from pathlib import Path
+from tempfile import mkdtemp
+from shutil import rmtree
+
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+from terrestrial.core.clone import CLONE_STRATEGIES
+
+
+def make_config(root, plugin_size):
+    config = Path(root, 'bench')
+    plugins = config / '.terraform' / 'plugins' / 'linux_amd64'
+    plugins.mkdir(parents=True)
+
+    for i in range(20):
+        (config / f'resource{i}.tf').write_text(
+            f'resource null_resource "dummy{i}" {{}}\n')
+
+    with open(plugins / 'terraform-provider-fake_v1.0.0_x4', 'wb') as f:
+        f.write(os.urandom(plugin_size * 1024 * 1024))
+
+    (config / '.terraform' / 'terraform.tfstate').write_text('{}')
+    return config
+
+
+def bytes_written(src, clone):
+    """
+    Sums sizes of regular files in <clone>
+    which do not share an inode with <src>
+    """
+    src_inodes = set()
+    for root, _, files in os.walk(src):
+        for f in files:
+            st = os.lstat(os.path.join(root, f))
+            src_inodes.add((st.st_dev, st.st_ino))
+
+    written = 0
+    for root, _, files in os.walk(clone):
+        for f in files:
+            st = os.lstat(os.path.join(root, f))
+            if Path(root, f).is_symlink():
+                continue
+            if (st.st_dev, st.st_ino) not in src_inodes:
+                written += st.st_size
+
+    return written
+
+
+def bench(strategy, src, iterations, sandbox_path):
+    clone = CLONE_STRATEGIES[strategy]
+    timings, written = [], 0
+
+    for _ in range(iterations):
+        dst = Path(mkdtemp(dir=sandbox_path), src.name)
+        start = time.perf_counter()
+        clone(src, dst)
+        timings.append(time.perf_counter() - start)
+        written = bytes_written(src, dst)
+        rmtree(dst.parent)
+
+    return sum(timings) / len(timings), min(timings), written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--path', help='initialized configuration to clone')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--plugin-size', type=int, default=100,
+                        help='fake plugin size in MB (synthetic config only)')
+    parser.add_argument('--sandbox-path', default=None,
+                        help='where to put clones, defaults to system tmp')
+    args = parser.parse_args()
+
+    tmp = None
+    if args.path:
+        src = Path(args.path).absolute()
+    else:
+        tmp = mkdtemp(dir=args.sandbox_path)
+        src = make_config(tmp, args.plugin_size)
+
+    try:
+        print(f'{"strategy":<10}{"mean, ms":>12}{"min, ms":>12}{"written, KB":>14}')
+        for strategy in CLONE_STRATEGIES:
+            mean, best, written = bench(
+                strategy, src, args.iterations, args.sandbox_path)
+            print(f'{strategy:<10}{mean * 1000:>12.2f}'
+                  f'{best * 1000:>12.2f}{written / 1024:>14.1f}')
+    finally:
+        if tmp:
+            rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Measures Terrestrial's own overhead: API latency, time tasks wait
+to start, clone and workspace switch time and tasks per second
+at N concurrent clients, with Terraform replaced by a fake.
+
+Usage:
+    benchmarks/overhead.py [--broker memory|redis] [--clients 10]
+        [--tasks 100] [--workspaces 10] [--action plan]
+        [--latency 0] [--output-bytes 1024] [--concurrency 4]
+
+API runs in-process. With memory broker a single worker runs in
+a thread of the same process, with Redis broker --concurrency
+worker processes are started. Either way results, locks and task
+registry live in Redis at --redis (CELERY_RESULT_BACKEND), so it
+has to be running.
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import subprocess
+from pathlib import Path
+from tempfile import mkdtemp
+from shutil import rmtree
+from contextlib import contextmanager
+
+ROOT = Path(__file__).parents[1]
+FAKE_PATH = Path(__file__).parent / 'fake'
+PHASES = ['queue_wait', 'clone', 'workspace', 'terraform', 'result']
+
+# Terrestrial is configured from environment as it's imported,
+# so it's only imported once environment is prepared
+sys.path.insert(0, str(ROOT))
+
+
+def prepare(root, args):
+    """
+    Generates a configuration and points Terrestrial, the workers
+    it starts and Terraform they run to <root> and the fake
+    """
+    config = Path(root, 'configurations', 'bench')
+    config.mkdir(parents=True)
+    (config / 'main.tf').write_text('resource "null_resource" "fake" {}\n')
+
+    metrics_path = Path(root, 'metrics')
+    metrics_path.mkdir()
+
+    broker = 'memory://' if args.broker == 'memory' else args.redis
+    os.environ.update({
+        'PATH': f'{FAKE_PATH.absolute()}{os.pathsep}{os.environ["PATH"]}',
+        'FAKE_TF_LATENCY': str(args.latency),
+        'FAKE_TF_OUTPUT_BYTES': str(args.output_bytes),
+        'TF_CONF_PATH': str(config.parent),
+        'TF_DATA_PATH': str(Path(root, 'data')),
+        'CELERY_BROKER_URL': broker,
+        'CELERY_RESULT_BACKEND': args.redis,
+        'API_TOKEN': 'bench',
+        'API_SYNC_TIMEOUT': '0',
+        # Worker processes and API report phases to the same place
+        'prometheus_multiproc_dir': str(metrics_path)
+    })
+
+
+def client(api, url, pending, lock, results):
+    http = api.test_client()
+    headers = {'Authorization': 'Token bench'}
+
+    while True:
+        with lock:
+            if not pending:
+                return
+            workspace = pending.pop()
+
+        start = time.perf_counter()
+        r = http.post(url.format(workspace=workspace), headers=headers)
+        elapsed = time.perf_counter() - start
+
+        with lock:
+            results.append((r.status_code, elapsed))
+
+
+@contextmanager
+def workers(args):
+    """
+    Runs a worker in a thread with memory broker, or worker
+    processes with Redis broker, until they're no longer needed
+    """
+    from terrestrial.core import tasks
+
+    if args.broker == 'memory':
+        from celery.contrib.testing.worker import start_worker
+
+        # Test worker doesn't send signals Terrestrial initializes on
+        tasks.prepare_plugin_cache()
+        tasks.init()
+        with start_worker(
+                tasks.app, pool='solo', loglevel='WARNING',
+                perform_ping_check=False):
+            yield
+        return
+
+    worker = subprocess.Popen(
+        [sys.executable, 'worker.py', '-c', str(args.concurrency),
+         '-l', 'warning'],
+        cwd=str(ROOT))
+    try:
+        deadline = time.monotonic() + 60
+        while not tasks.app.control.ping(timeout=1):
+            if worker.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError('Worker failed to start')
+
+        yield
+    finally:
+        worker.terminate()
+        worker.wait()
+
+
+def phases():
+    """
+    Returns mean seconds tasks spent in every phase so far,
+    and how many times each phase was observed
+    """
+    from terrestrial.core import metrics
+
+    sums, counts = {}, {}
+    for family in metrics.registry().collect():
+        if family.name != 'terrestrial_task_phase_seconds':
+            continue
+
+        for s in family.samples:
+            phase = s.labels.get('phase')
+            if s.name.endswith('_sum'):
+                sums[phase] = sums.get(phase, 0) + s.value
+            elif s.name.endswith('_count'):
+                counts[phase] = counts.get(phase, 0) + s.value
+
+    return {p: (sums.get(p, 0) / counts[p], int(counts[p]))
+            for p in counts if counts[p]}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def run(args):
+    from terrestrial.api import api
+
+    url = f'/api/v1/configurations/bench/{{workspace}}/{args.action}'
+    pending = [f'bench{i % args.workspaces}' for i in range(args.tasks)]
+    results, lock = [], threading.Lock()
+    threads = [
+        threading.Thread(
+            target=client, args=(api, url, pending, lock, results))
+        for _ in range(args.clients)]
+
+    with workers(args):
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        total = time.perf_counter() - start
+
+    return results, total, phases()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--broker', choices=['memory', 'redis'], default='memory')
+    parser.add_argument(
+        '--redis',
+        default=os.getenv('CELERY_RESULT_BACKEND') or 'redis://localhost:6379/0')
+    parser.add_argument('--clients', type=int, default=10)
+    parser.add_argument('--tasks', type=int, default=100)
+    parser.add_argument('--workspaces', type=int, default=10,
+                        help='tasks are spread over this many workspaces')
+    parser.add_argument('--action', default='plan',
+                        choices=['plan', 'apply', 'destroy'])
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds every fake Terraform action takes')
+    parser.add_argument('--output-bytes', type=int, default=1024,
+                        help='size of fake Terraform action output')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='worker processes (Redis broker only)')
+    args = parser.parse_args()
+
+    root = mkdtemp(prefix='terrestrial-bench-')
+    try:
+        prepare(root, args)
+        results, total, observed = run(args)
+    finally:
+        rmtree(root, ignore_errors=True)
+
+    latencies = [e for s, e in results if s < 300]
+    failed = len(results) - len(latencies)
+
+    print(f'broker:              {args.broker}')
+    print(f'clients / tasks:     {args.clients} / {args.tasks}')
+    print(f'succeeded / failed:  {len(latencies)} / {failed}')
+    print(f'wall time, s:        {total:.2f}')
+    print(f'tasks per second:    {len(latencies) / total:.2f}')
+    if latencies:
+        print(f'latency p50/p99, ms: {percentile(latencies, 50) * 1000:.1f} / '
+              f'{percentile(latencies, 99) * 1000:.1f}')
+
+    print(f'\n{"phase":<12}{"mean, ms":>12}{"count":>8}')
+    for phase in PHASES:
+        if phase in observed:
+            mean, count = observed[phase]
+            print(f'{phase:<12}{mean * 1000:>12.2f}{count:>8}')
+
+
+if __name__ == '__main__':
+    main()
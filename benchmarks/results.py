@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Compares latency of reading task state through a locally
+applied Celery task against reading result backend directly.
+
+Usage:
+    benchmarks/results.py [--tasks 100] [--iterations 1000]
+
+Runs against result backend configured for Terrestrial
+(CELERY_RESULT_BACKEND), seeding it with fake finished tasks.
+"""
+import sys
+import time
+import uuid
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+from celery.states import SUCCESS
+
+from terrestrial.core import get_task_state, get_meta, get_metas
+from terrestrial.core.celery import app
+
+
+def timed(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--tasks', type=int, default=100)
+    parser.add_argument('--iterations', type=int, default=1000)
+    args = parser.parse_args()
+
+    task_ids = [str(uuid.uuid4()) for _ in range(args.tasks)]
+    for t in task_ids:
+        app.backend.store_result(t, (0, 'stdout', 'stderr'), SUCCESS)
+
+    one = task_ids[0]
+    many = max(1, args.iterations // args.tasks)
+    cases = [
+        ('celery task, one',
+            lambda: get_task_state.apply((one,)).get(), args.iterations),
+        ('direct, one',
+            lambda: get_meta(one)['status'], args.iterations),
+        (f'celery task, {args.tasks}',
+            lambda: [get_task_state.apply((t,)).get() for t in task_ids], many),
+        (f'direct bulk, {args.tasks}',
+            lambda: get_metas(task_ids), many)
+    ]
+
+    print(f'{"lookup":<24}{"mean, ms":>12}')
+    for name, fn, iterations in cases:
+        print(f'{name:<24}{timed(fn, iterations) * 1000:>12.3f}')
+
+    for t in task_ids:
+        app.backend.forget(t)
+
+
+if __name__ == '__main__':
+    main()
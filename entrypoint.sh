@@ -1,16 +1,28 @@
 #!/bin/sh
 
+# API and worker processes keep their metrics here, to be served together
+export prometheus_multiproc_dir=${prometheus_multiproc_dir:-/tmp/terrestrial-metrics}
+rm -rf $prometheus_multiproc_dir && mkdir -p $prometheus_multiproc_dir
+
 if [ "$1" == "api" ]; then
     NPROC=$(grep -c ^processor /proc/cpuinfo 2>/dev/null || echo -n 1)
     shift
-    exec gunicorn api:api -w ${GUNICORN_WORKERS:-$NPROC} -b 0.0.0.0 "$@"
+    exec gunicorn api:api \
+        -k ${GUNICORN_WORKER_CLASS:-gevent} \
+        --worker-connections ${GUNICORN_WORKER_CONNECTIONS:-1000} \
+        -w ${GUNICORN_WORKERS:-$NPROC} -b 0.0.0.0 "$@"
 elif [ "$1" == "worker" ]; then
     shift
-    exec python worker.py "$@"
+    exec python worker.py \
+        ${WORKER_QUEUES:+-Q $WORKER_QUEUES} \
+        ${WORKER_CONCURRENCY:+-c $WORKER_CONCURRENCY} "$@"
+elif [ "$1" == "beat" ]; then
+    shift
+    exec celery -A terrestrial beat "$@"
 else
     cat <<EOF
 Unknown command $1
-Usage: (api|worker) [options]
+Usage: (api|worker|beat) [options]
 EOF
     exit 1
 fi
@@ -1,7 +1,15 @@
+import time
 import logging
-from flask import request
+from datetime import datetime
+from flask import request, Response, stream_with_context
+from celery.states import (
+    PENDING, STARTED, RETRY, SUCCESS, FAILURE, REJECTED, READY_STATES)
 
-from terrestrial.core import list_celery_tasks, get_task_state, get_task_result
+import terrestrial.config as config
+from terrestrial.core import (
+    TaskLog, get_meta, get_metas, task_registry, batch_registry,
+    pipeline_registry, pipelines, drift_registry)
+from terrestrial.core.celery import app
 
 
 logger = logging.getLogger(f'{__name__}.celery')
@@ -9,23 +17,35 @@ logger = logging.getLogger(f'{__name__}.celery')
 
 def list_tasks(status=None):
     """
-    List all tasks filtered by status
+    List tasks filtered by state, configuration and workspace
     """
 
-    state = None
-    if 'state' in request.args:
-        state = request.args['state'].upper()
+    states = [s.upper() for s in request.args.getlist('state')]
+    if not states:
+        states = [PENDING, STARTED, RETRY]
+    elif 'ALL' in states:
+        states = None
+
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', config.API_TASKS_PAGE_SIZE))
+    except ValueError:
+        body = f'Offset and limit must be integers'
+        return body, 500
 
     logger.debug('Listing tasks')
     try:
-        task = list_celery_tasks.apply((state,))
-        status = task.get()
+        tasks = task_registry().list(
+            states=states,
+            config=request.args.get('config'),
+            workspace=request.args.get('workspace'),
+            offset=offset, limit=min(limit, config.API_TASKS_PAGE_SIZE))
     except Exception as e:
         body = f'Failed to list tasks: {e}'
         logger.error(body)
         return body, 500
 
-    return status, 200
+    return '\n'.join(t['id'] for t in tasks), 200
 
 
 def get_state(task_id):
@@ -35,8 +55,7 @@ def get_state(task_id):
 
     logger.debug(f'Retrieving state of a task {task_id}')
     try:
-        task = get_task_state.apply((task_id,))
-        status = task.get()
+        status = get_meta(task_id)['status']
     except Exception as e:
         body = f'Failed to get state of a task "{task_id}": {e}'
         logger.error(body)
@@ -45,6 +64,91 @@ def get_state(task_id):
     return status, 200
 
 
+def get_states():
+    """
+    Retrieve statuses of many tasks at once by their IDs
+    """
+
+    task_ids = request.form.getlist('id')
+    if len(task_ids) > config.API_BULK_MAX_TASKS:
+        body = f'At most {config.API_BULK_MAX_TASKS} task IDs are allowed'
+        return body, 500
+
+    logger.debug(f'Retrieving states of {len(task_ids)} tasks')
+    try:
+        metas = get_metas(task_ids)
+    except Exception as e:
+        body = f'Failed to get states of tasks: {e}'
+        logger.error(body)
+        return body, 500
+
+    body = '\n'.join(f'{t} {m["status"]}' for t, m in zip(task_ids, metas))
+    return body, 200
+
+
+def stream_states():
+    """
+    Stream states of many tasks by their IDs as Server-Sent Events,
+    one "<task_id> <state>" event per state change, until all of
+    them are done
+    """
+
+    task_ids = request.args.getlist('id')
+    if not task_ids:
+        return f'At least one task ID is required', 500
+    if len(task_ids) > config.API_BULK_MAX_TASKS:
+        body = f'At most {config.API_BULK_MAX_TASKS} task IDs are allowed'
+        return body, 500
+
+    backend = app.backend
+    channels = {backend.get_key_for_task(t): t for t in task_ids}
+
+    logger.debug(f'Streaming states of {len(task_ids)} tasks')
+    # Result backend publishes every state it stores to task's key.
+    # Subscribing before reading states, so no change is missed
+    pubsub = backend.client.pubsub(ignore_subscribe_messages=True)
+    try:
+        pubsub.subscribe(*channels)
+        metas = get_metas(task_ids)
+    except Exception as e:
+        pubsub.close()
+        body = f'Failed to stream states of tasks: {e}'
+        logger.error(body)
+        return body, 500
+
+    def events(states):
+        try:
+            for t, s in states.items():
+                yield f'event: state\ndata: {t} {s}\n\n'
+
+            deadline = time.monotonic() + config.API_EVENTS_TIMEOUT
+            sent = time.monotonic()
+            while time.monotonic() < deadline and \
+                    not all(s in READY_STATES for s in states.values()):
+                message = pubsub.get_message(
+                    timeout=config.API_EVENTS_KEEPALIVE)
+                if not message:
+                    # Keeps proxies from closing idle connection
+                    if time.monotonic() - sent >= config.API_EVENTS_KEEPALIVE:
+                        sent = time.monotonic()
+                        yield ': keepalive\n\n'
+                    continue
+
+                t = channels[message['channel']]
+                s = backend.decode_result(message['data'])['status']
+                if states[t] != s:
+                    states[t] = s
+                    sent = time.monotonic()
+                    yield f'event: state\ndata: {t} {s}\n\n'
+        finally:
+            pubsub.close()
+
+    states = {t: m['status'] for t, m in zip(task_ids, metas)}
+    return Response(
+        stream_with_context(events(states)), mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 def get_result(task_id):
     """
     Retrieve result of a task by its ID
@@ -52,9 +156,11 @@ def get_result(task_id):
 
     logger.debug(f'Retrieving result of task {task_id}')
     try:
-        task = get_task_result.apply((task_id,))
-        if task.get():
-            rc, stdout, stderr = task.get()
+        meta = get_meta(task_id)
+        if meta['status'] == FAILURE:
+            raise RuntimeError(f'task failed: {meta["result"]}')
+        elif meta['status'] == SUCCESS and meta['result']:
+            rc, stdout, stderr = meta['result']
         else:
             raise RuntimeError(f'ID is incorrect or task is still pending')
     except Exception as e:
@@ -66,3 +172,251 @@ def get_result(task_id):
         return stderr, 500
 
     return stdout, 200
+
+
+def get_log(task_id):
+    """
+    Retrieve output of a task by its ID, starting at
+    <offset> line, optionally following it until task is done
+    """
+
+    try:
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        body = f'Log offset must be an integer'
+        return body, 500
+
+    log = TaskLog(app.backend.client, task_id)
+
+    logger.debug(f'Retrieving log of task {task_id} from line {offset}')
+    if 'follow' not in request.args:
+        try:
+            lines, offset = log.read(offset, config.API_LOG_CHUNK_LINES)
+        except Exception as e:
+            body = f'Failed to get log of a task "{task_id}": {e}'
+            logger.error(body)
+            return body, 500
+
+        body = ''.join(f'{l}\n' for l in lines)
+        return body, 200, {'X-Log-Offset': str(offset)}
+
+    def follow(offset):
+        deadline = time.monotonic() + config.API_LOG_FOLLOW_TIMEOUT
+        while time.monotonic() < deadline:
+            done = app.AsyncResult(task_id).ready()
+            lines, offset = log.read(offset, config.API_LOG_CHUNK_LINES)
+
+            for l in lines:
+                yield f'{l}\n'
+
+            if not lines:
+                if done:
+                    return
+                time.sleep(1)
+
+    return Response(stream_with_context(follow(offset)), mimetype='text/plain')
+
+
+def cancel_task(task_id):
+    """
+    Cancel a task by its ID. Queued task is dropped, running one
+    is interrupted, and killed if it doesn't stop in time
+    """
+
+    logger.debug(f'Cancelling task {task_id}')
+    try:
+        registry = task_registry()
+        task = registry.get(task_id)
+        if not task:
+            return f'No task found for ID "{task_id}"', 404
+
+        if task['state'] in READY_STATES:
+            return f'Task {task_id} is already {task["state"]}', 409
+
+        registry.cancel(task_id)
+        app.control.revoke(task_id)
+    except Exception as e:
+        body = f'Failed to cancel task "{task_id}": {e}'
+        logger.error(body)
+        return body, 500
+
+    return task_id, 202
+
+
+def get_batch(batch_id):
+    """
+    Retrieve states of all tasks of a batch by its ID,
+    one "<workspace> <state> <task_id>" line per task
+    """
+
+    logger.debug(f'Retrieving state of batch {batch_id}')
+    try:
+        batch = batch_registry().get(batch_id)
+        if not batch:
+            return f'No batch found for ID "{batch_id}"', 404
+
+        tasks = batch['tasks']
+        metas = get_metas(list(tasks.values()))
+    except Exception as e:
+        body = f'Failed to get state of batch "{batch_id}": {e}'
+        logger.error(body)
+        return body, 500
+
+    lines = [
+        f'{w} {m["status"]} {t}'
+        for (w, t), m in zip(tasks.items(), metas)]
+    lines += [f'{w} {REJECTED}' for w in batch['rejected']]
+
+    done = [m for m in metas if m['status'] in READY_STATES]
+    failed = [
+        m for m in done
+        if m['status'] != SUCCESS or not m['result'] or m['result'][0] != 0]
+
+    return '\n'.join(lines), 200, {
+        'X-Batch-Total': str(len(tasks) + len(batch['rejected'])),
+        'X-Batch-Done': str(len(done)),
+        'X-Batch-Failed': str(len(failed) + len(batch['rejected']))
+    }
+
+
+def get_batch_result(batch_id):
+    """
+    Retrieve results of all finished tasks of a batch by its ID
+    """
+
+    logger.debug(f'Retrieving results of batch {batch_id}')
+    try:
+        batch = batch_registry().get(batch_id)
+        if not batch:
+            return f'No batch found for ID "{batch_id}"', 404
+
+        tasks = batch['tasks']
+        metas = get_metas(list(tasks.values()))
+    except Exception as e:
+        body = f'Failed to get results of batch "{batch_id}": {e}'
+        logger.error(body)
+        return body, 500
+
+    results = []
+    for w, m in zip(tasks, metas):
+        if m['status'] == SUCCESS and m['result']:
+            rc, stdout, stderr = m['result']
+            output = stdout if rc == 0 else stderr
+        elif m['status'] == FAILURE:
+            output = f'task failed: {m["result"]}'
+        else:
+            output = ''
+        results.append(f'# {w}: {m["status"]}\n{output}')
+
+    for w, reason in batch['rejected'].items():
+        results.append(f'# {w}: {REJECTED}\n{reason}')
+
+    return '\n\n'.join(results), 200
+
+
+def pipeline_progress(pipeline_id):
+    """
+    Returns pipeline by its ID along with states and metas of its nodes
+    """
+    pipeline = pipeline_registry().get(pipeline_id)
+    if not pipeline:
+        return None, None, None
+
+    tasks = pipeline['tasks']
+    metas = dict(zip(tasks, get_metas(list(tasks.values()))))
+    states = pipelines.states(
+        pipeline['nodes'], tasks, pipeline['errors'], metas)
+
+    return pipeline, states, metas
+
+
+def get_pipeline(pipeline_id):
+    """
+    Retrieve states of all nodes of a pipeline by its ID,
+    one "<node> <state> <task_id>" line per node
+    """
+
+    logger.debug(f'Retrieving state of pipeline {pipeline_id}')
+    try:
+        pipeline, states, metas = pipeline_progress(pipeline_id)
+        if not pipeline:
+            return f'No pipeline found for ID "{pipeline_id}"', 404
+    except Exception as e:
+        body = f'Failed to get state of pipeline "{pipeline_id}": {e}'
+        logger.error(body)
+        return body, 500
+
+    lines = [
+        f'{n} {s} {pipeline["tasks"].get(n, "")}'.rstrip()
+        for n, s in states.items()]
+
+    return '\n'.join(lines), 200, {
+        'X-Pipeline-State': pipelines.state(states)
+    }
+
+
+def get_pipeline_result(pipeline_id):
+    """
+    Retrieve results of all nodes of a pipeline by its ID
+    """
+
+    logger.debug(f'Retrieving results of pipeline {pipeline_id}')
+    try:
+        pipeline, states, metas = pipeline_progress(pipeline_id)
+        if not pipeline:
+            return f'No pipeline found for ID "{pipeline_id}"', 404
+    except Exception as e:
+        body = f'Failed to get results of pipeline "{pipeline_id}": {e}'
+        logger.error(body)
+        return body, 500
+
+    results = []
+    for n, s in states.items():
+        m = metas.get(n)
+        if n in pipeline['errors']:
+            output = pipeline['errors'][n]
+        elif m and m['status'] == SUCCESS and m['result']:
+            rc, stdout, stderr = m['result']
+            output = stdout if rc == 0 else stderr
+        elif m and m['status'] == FAILURE:
+            output = f'task failed: {m["result"]}'
+        else:
+            output = ''
+        results.append(f'# {n}: {s}\n{output}')
+
+    return '\n\n'.join(results), 200, {
+        'X-Pipeline-State': pipelines.state(states)
+    }
+
+
+def list_drift():
+    """
+    List outcome of the last drift check of every configuration and
+    workspace, filtered by status and configuration, one
+    "<config> <workspace> <status> <checked> <task_id> <summary>"
+    line per workspace
+    """
+
+    statuses = [s.upper() for s in request.args.getlist('status')]
+    config_name = request.args.get('config')
+
+    logger.debug('Listing drift')
+    try:
+        entries = [
+            e for e in drift_registry().all()
+            if (not statuses or e['status'] in statuses) and
+            (not config_name or e['config'] == config_name)]
+    except Exception as e:
+        body = f'Failed to list drift: {e}'
+        logger.error(body)
+        return body, 500
+
+    lines = []
+    for e in entries:
+        checked = datetime.utcfromtimestamp(e['checked']).isoformat()
+        details = (e.get('summary') or e.get('reason') or '').splitlines()
+        lines.append(' '.join([
+            e['config'], e['workspace'], e['status'], checked,
+            e.get('task_id') or '-', details[-1] if details else '']).rstrip())
+
+    return '\n'.join(lines), 200
@@ -1,14 +1,35 @@
 import logging
+from redis import StrictRedis
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+
 import terrestrial.config as config
+from terrestrial.core import metrics as core_metrics
+from terrestrial.core import Catalog
 
 
 logger = logging.getLogger(f'{__name__}.common')
 
+broker = StrictRedis.from_url(config.BROKER_URL)
+catalog = Catalog(config.TF_CONF_PATH, interval=config.API_CATALOG_INTERVAL)
+
 
 def health():
     return 'OK', 200
 
 
+def metrics():
+    """
+    Exposes API metrics along with depth of task queues
+    """
+    queues = sorted({
+        config.TF_DEFAULT_QUEUE, config.TF_FAST_QUEUE,
+        *config.TF_CONFIG_QUEUES.values()})
+    registry = core_metrics.registry(
+        core_metrics.QueueCollector(broker, queues))
+
+    return generate_latest(registry), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+
+
 def verify_token(token):
     """
     Verifies Token from Authorization header
@@ -1,9 +1,24 @@
+import time
+import json
 import logging
+from uuid import uuid4
+from fnmatch import fnmatch
+from urllib.parse import urlparse
 from flask import request
-from celery_once import AlreadyQueued
+from celery import group
+from celery.exceptions import TimeoutError as TaskTimeoutError
 
-import terrestrial.config as config
-from terrestrial.core import terraform
+from terrestrial.config import (
+    API_SYNC_TIMEOUT, API_BATCH_MAX_WORKSPACES, API_PIPELINE_MAX_NODES,
+    TF_COALESCE_PLANS, TF_ENV_VARIABLES)
+from terrestrial.core import (
+    terraform, read_cache, etag, task_scheduler, signature,
+    OPTIONS, parse_options, batch_registry, workspace_index,
+    advance_pipeline, pipeline_registry, pipelines, unpack, result_store,
+    formats, check_variables, task_registry, serialized, terraform_version)
+from terrestrial.core import list_workspaces as list_workspaces_task
+from terrestrial.errors import TerrestrialQueueFullError, TerrestrialFatalError
+from terrestrial.api.common import catalog
 
 
 logger = logging.getLogger(f'{__name__}.terraform')
@@ -13,10 +28,47 @@ def list_configurations():
     """
     Lists existing configurations
     """
-    body = '\n'.join(config.TF_CONFIGURATIONS)
+    body = '\n'.join(catalog.names())
     return body, 200
 
 
+def describe_configuration(config):
+    """
+    Describes variables, outputs, backend and providers
+    of a given <config> as JSON
+    """
+    body = json.dumps(catalog.get(config), indent=2, sort_keys=True)
+    return body, 200, {'Content-Type': 'application/json'}
+
+
+def list_workspaces(config):
+    """
+    Lists workspaces of a given <config>
+    """
+    try:
+        body = '\n'.join(known_workspaces(config))
+    except Exception as e:
+        body = f'Failed to list workspaces of "{config}": {e}'
+        logger.error(body)
+        return body, 500
+
+    return body, 200
+
+
+def known_workspaces(config):
+    """
+    Returns workspaces of <config> from the index, listing
+    them with Terraform only if they weren't listed lately
+    """
+    workspaces = workspace_index().get(config)
+    if workspaces is None:
+        logger.debug(f'Listing workspaces of {config} with Terraform')
+        workspaces = list_workspaces_task.delay(config).get(
+            timeout=API_SYNC_TIMEOUT or None)
+
+    return workspaces
+
+
 def execute(config, action, workspace='default'):
     """
     Performs "terraform <action>" on a given <config>
@@ -42,25 +94,308 @@ def execute(config, action, workspace='default'):
     logger.debug(
         f'Passing following variables to Terraform: {var}')
 
+    save = action == 'plan' and 'save' in request.args
+    plan = request.args.get('plan') if action == 'apply' else None
+    if plan and var:
+        body = f'Variables can not be passed along with a saved plan'
+        return body, 500
+
+    if action in ['plan', 'apply', 'destroy'] and not plan:
+        try:
+            check_variables(catalog.get(config), var, TF_ENV_VARIABLES)
+        except TerrestrialFatalError as e:
+            body = str(e)
+            logger.error(body)
+            return body, 500
+
+    callback = request.args.get('callback')
+    if callback:
+        url = urlparse(callback)
+        if url.scheme not in ['http', 'https'] or not url.netloc:
+            body = f'Callback must be an HTTP(S) URL'
+            return body, 500
+
+    output_format = request.args.get('format', 'text')
+    if output_format not in formats.FORMATS:
+        body = f'Format must be one of {formats.FORMATS}'
+        return body, 500
+    if output_format == 'json' and action not in formats.JSON_ACTIONS:
+        body = f'Only {", ".join(formats.JSON_ACTIONS)} can output JSON'
+        return body, 500
+    # API runs the same Terraform as workers do
+    if output_format == 'json' and action in formats.JSON_MIN_VERSIONS:
+        version = terraform_version()
+        if not formats.supports_json(action, version):
+            wanted = '.'.join(map(str, formats.JSON_MIN_VERSIONS[action]))
+            body = f'JSON output of {action} requires Terraform {wanted} ' \
+                f'or newer, {".".join(map(str, version))} is installed'
+            return body, 400
+
+    names = request.args.getlist('name') if action == 'output' else []
+    addresses = request.args.getlist('address') \
+        if action in ['show', 'plan'] else []
+    if (names or addresses) and output_format != 'json':
+        body = f'Output can only be filtered in JSON format'
+        return body, 500
+
+    # "refresh" of show and output bypasses cache instead, see below
+    options = {} if action in ['show', 'output'] else {
+        k: request.args.getlist(k) for k in OPTIONS
+        if k in request.args and k != 'json'}
+    if output_format == 'json':
+        options['json'] = 'true'
+    if plan and set(options) & {'target', 'refresh'}:
+        body = f'Target and refresh can not be passed along with a saved plan'
+        return body, 500
+
     try:
-        task = terraform.apply_async(
-            (config, action, var, workspace), countdown=delay)
-    except AlreadyQueued as e:
-        body = f'This task is already queued! Cooldown time left: {e}s'
+        options = parse_options(action, options)
+    except TerrestrialFatalError as e:
+        body = str(e)
         logger.error(body)
         return body, 500
+
+    logger.debug(f'Passing following options to Terraform: {options}')
+
+    # Cached output is served without a task, so nothing calls back
+    cacheable = action in ['show', 'output'] and not apply_async \
+        and not delay and not var and not callback
+    no_cache = 'refresh' in request.args \
+        or 'no-cache' in request.headers.get('Cache-Control', '')
+
+    if cacheable and not no_cache:
+        cached = read_cache().get(
+            config, workspace, formats.variant(action, options))
+        if cached:
+            logger.debug(f'Serving cached {action} of {config}/{workspace}')
+            return filtered_response(
+                action, cached['stdout'], options, names, addresses)
+
+    scheduler = task_scheduler()
+    coalesce = signature(action, var, save, options) \
+        if action == 'plan' and TF_COALESCE_PLANS else None
+
+    new_id = task_id = str(uuid4())
+    try:
+        if serialized(action):
+            task_id = scheduler.admit(
+                config, workspace, new_id,
+                eta=time.time() + delay, coalesce=coalesce)
+    except TerrestrialQueueFullError as e:
+        body = str(e)
+        logger.error(body)
+        return body, 429
     except Exception as e:
         body = f'Terraform task failed for "{config}": {e}'
         logger.error(body)
         return body, 500
 
+    if task_id != new_id:
+        logger.debug(f'Joining identical queued task {task_id}')
+
+    try:
+        # Callback is known before task is queued, so it can't be missed
+        if callback:
+            task_registry().add_callback(task_id, callback)
+
+        if task_id != new_id:
+            task = terraform.AsyncResult(task_id)
+        else:
+            task = terraform.apply_async(
+                (config, action, var, workspace),
+                {'plan': plan, 'save': save, 'options': options},
+                countdown=delay, task_id=task_id)
+    except Exception as e:
+        if task_id == new_id:
+            scheduler.forget(config, workspace, task_id)
+        body = f'Terraform task failed for "{config}": {e}'
+        logger.error(body)
+        return body, 500
+
     if apply_async:
         return task.id, 201
 
     logger.debug(f'Waiting for task {task.id} to finish')
-    rc, stdout, stderr = task.wait()
+    try:
+        rc, stdout, stderr = unpack(
+            task.get(timeout=API_SYNC_TIMEOUT or None), result_store())
+    except TaskTimeoutError:
+        logger.debug(f'Task {task.id} is still running, handing it over')
+        return task.id, 202, {'Location': f'/api/v1/tasks/{task.id}'}
+    except Exception as e:
+        body = f'Terraform task failed for "{config}": {e}'
+        logger.error(body)
+        return body, 500
+
     if rc != 0:
         logger.error(stderr)
         return stderr, 500
 
-    return stdout, 201
+    if cacheable:
+        return filtered_response(action, stdout, options, names, addresses)
+
+    try:
+        stdout = formats.select(action, stdout, names, addresses)
+    except KeyError as e:
+        return e.args[0], 404
+    except ValueError as e:
+        body = f'Failed to parse {action} output as JSON: {e}'
+        logger.error(body)
+        return body, 500
+
+    headers = {'X-Plan-Id': task.id} if save else {}
+    if options.get('json'):
+        headers['Content-Type'] = 'application/json'
+    return stdout, 201, headers
+
+
+def execute_batch(config, action):
+    """
+    Performs "terraform <action>" on a given <config> in many
+    workspaces, given as a list or a mapping to their own
+    variables, or matched by a glob
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return f'Batch must be given as a JSON object', 500
+
+    workspaces = body.get('workspaces') or {}
+    if isinstance(workspaces, list):
+        workspaces = {w: {} for w in workspaces}
+    var = body.get('var') or {}
+
+    if not isinstance(workspaces, dict) or not isinstance(var, dict) or \
+            not all(isinstance(v, dict) for v in workspaces.values()):
+        body = f'Workspaces must be a list, or a mapping to variables'
+        return body, 500
+
+    if body.get('glob'):
+        try:
+            existing = known_workspaces(config)
+        except Exception as e:
+            body = f'Failed to list workspaces of "{config}": {e}'
+            logger.error(body)
+            return body, 500
+
+        for w in existing:
+            if fnmatch(w, body['glob']):
+                workspaces.setdefault(w, {})
+
+    if not workspaces:
+        return f'No workspaces given or matched', 500
+    if len(workspaces) > API_BATCH_MAX_WORKSPACES:
+        body = f'At most {API_BATCH_MAX_WORKSPACES} workspaces are allowed'
+        return body, 500
+
+    try:
+        options = parse_options(action, {
+            k: request.args.getlist(k) for k in OPTIONS if k in request.args})
+
+        if action in ['plan', 'apply', 'destroy']:
+            meta = catalog.get(config)
+            for w_var in workspaces.values():
+                check_variables(meta, dict(var, **w_var), TF_ENV_VARIABLES)
+    except TerrestrialFatalError as e:
+        body = str(e)
+        logger.error(body)
+        return body, 500
+
+    logger.debug(
+        f'Performing {action} on {config} in {len(workspaces)} workspaces')
+
+    scheduler = task_scheduler()
+    tasks, rejected, signatures = {}, {}, []
+    try:
+        for w, w_var in workspaces.items():
+            task_id = str(uuid4())
+            try:
+                if serialized(action):
+                    scheduler.admit(config, w, task_id)
+            except TerrestrialQueueFullError as e:
+                rejected[w] = str(e)
+                continue
+
+            tasks[w] = task_id
+            signatures.append(terraform.signature(
+                (config, action, dict(var, **w_var), w),
+                {'options': options, 'reuse': True}, task_id=task_id))
+
+        batch_id = str(uuid4())
+        if signatures:
+            group(signatures).apply_async(task_id=batch_id)
+        batch_registry().create(batch_id, config, action, tasks, rejected)
+    except Exception as e:
+        for w, task_id in tasks.items():
+            scheduler.forget(config, w, task_id)
+        body = f'Terraform batch failed for "{config}": {e}'
+        logger.error(body)
+        return body, 500
+
+    return batch_id, 201, {'Location': f'/api/v1/batches/{batch_id}'}
+
+
+def execute_pipeline():
+    """
+    Performs actions given as a DAG of nodes, each running as soon
+    as nodes it depends on succeed and taking their outputs as
+    variables
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return f'Pipeline must be given as a JSON object', 500
+
+    nodes = body.get('nodes')
+    if isinstance(nodes, dict) and len(nodes) > API_PIPELINE_MAX_NODES:
+        body = f'At most {API_PIPELINE_MAX_NODES} nodes are allowed'
+        return body, 500
+
+    try:
+        nodes = pipelines.validate(nodes, catalog.all(), TF_ENV_VARIABLES)
+    except TerrestrialFatalError as e:
+        body = str(e)
+        logger.error(body)
+        return body, 500
+
+    pipeline_id = str(uuid4())
+    logger.debug(f'Starting pipeline {pipeline_id} of {len(nodes)} nodes')
+
+    try:
+        pipeline_registry().create(pipeline_id, nodes)
+        advance_pipeline.delay(pipeline_id)
+    except Exception as e:
+        body = f'Pipeline failed to start: {e}'
+        logger.error(body)
+        return body, 500
+
+    return pipeline_id, 201, {'Location': f'/api/v1/pipelines/{pipeline_id}'}
+
+
+def filtered_response(action, stdout, options, names, addresses):
+    """
+    Responds with JSON <stdout> of <action> narrowed down to outputs
+    of given <names> or to resources at given <addresses>
+    """
+    try:
+        body = formats.select(action, stdout, names, addresses)
+    except KeyError as e:
+        return e.args[0], 404
+    except ValueError as e:
+        body = f'Failed to parse {action} output as JSON: {e}'
+        logger.error(body)
+        return body, 500
+
+    return cached_response(body, etag(body), options)
+
+
+def cached_response(body, tag, options=None):
+    """
+    Responds with <body> tagged with <tag>, or with 304
+    if client already has it
+    """
+    headers = {'ETag': f'"{tag}"', 'Cache-Control': 'no-cache'}
+    if (options or {}).get('json'):
+        headers['Content-Type'] = 'application/json'
+    if request.if_none_match.contains(tag):
+        return '', 304, headers
+
+    return body, 200, headers
@@ -1,7 +1,6 @@
-from flask import Blueprint, redirect, url_for
+from flask import Blueprint
 from flask_httpauth import HTTPTokenAuth
 
-from terrestrial.config import TF_CONFIGURATIONS
 from terrestrial.api import common, terraform, celery
 
 from .converters import add_url_converter, RegexConverter
@@ -25,16 +24,33 @@ def health():
     return common.health()
 
 
+@blueprint.route('/metrics')
+def metrics():
+    return common.metrics()
+
+
 @blueprint.route('/configurations', methods=['GET'])
 @auth.login_required
 def list_configurations():
     return terraform.list_configurations()
 
 
-@blueprint.route('/configurations/<regex("[\w-]+"):config>')
-def show_default_workspace(config):
-    return redirect(
-        url_for('v1.execute', config=config, action='show'), code=302)
+@blueprint.route('/configurations/<regex("[\w-]+"):config>', methods=['GET'])
+@auth.login_required
+def describe_configuration(config):
+    if not common.catalog.get(config):
+        return (f'Configration {config} not found', 404)
+
+    return terraform.describe_configuration(config)
+
+
+@blueprint.route('/configurations/<regex("[\w-]+"):config>/workspaces', methods=['GET'])
+@auth.login_required
+def list_workspaces(config):
+    if not common.catalog.get(config):
+        return (f'Configration {config} not found', 404)
+
+    return terraform.list_workspaces(config)
 
 
 @blueprint.route('/configurations/<regex("[\w-]+"):config>/<regex("show|output"):action>')
@@ -43,25 +59,94 @@ def show_default_workspace(config):
 @blueprint.route('/configurations/<regex("[\w-]+"):config>/<regex("[\w-]+"):workspace>/<regex("plan|apply|destroy"):action>', methods=['POST'])
 @auth.login_required
 def execute(config, action, workspace='default'):
-    if config not in TF_CONFIGURATIONS:
+    if not common.catalog.get(config):
         return (f'Configration {config} not found', 404)
 
     return terraform.execute(config, action, workspace=workspace)
 
 
+@blueprint.route('/batches/<regex("[\w-]+"):config>/<regex("show|output|plan|apply|destroy"):action>', methods=['POST'])
+@auth.login_required
+def execute_batch(config, action):
+    if not common.catalog.get(config):
+        return (f'Configration {config} not found', 404)
+
+    return terraform.execute_batch(config, action)
+
+
+@blueprint.route('/batches/<regex("[\w-]+"):batch_id>', methods=['GET'])
+@auth.login_required
+def get_batch(batch_id):
+    return celery.get_batch(batch_id)
+
+
+@blueprint.route('/batches/<regex("[\w-]+"):batch_id>/result', methods=['GET'])
+@auth.login_required
+def get_batch_result(batch_id):
+    return celery.get_batch_result(batch_id)
+
+
+@blueprint.route('/pipelines', methods=['POST'])
+@auth.login_required
+def execute_pipeline():
+    return terraform.execute_pipeline()
+
+
+@blueprint.route('/pipelines/<regex("[\w-]+"):pipeline_id>', methods=['GET'])
+@auth.login_required
+def get_pipeline(pipeline_id):
+    return celery.get_pipeline(pipeline_id)
+
+
+@blueprint.route('/pipelines/<regex("[\w-]+"):pipeline_id>/result', methods=['GET'])
+@auth.login_required
+def get_pipeline_result(pipeline_id):
+    return celery.get_pipeline_result(pipeline_id)
+
+
+@blueprint.route('/drift', methods=['GET'])
+@auth.login_required
+def list_drift():
+    return celery.list_drift()
+
+
 @blueprint.route('/tasks', methods=['GET'])
 @auth.login_required
 def list_celery_tasks(status=None):
     return celery.list_tasks(status)
 
 
+@blueprint.route('/tasks/states', methods=['POST'])
+@auth.login_required
+def get_task_states():
+    return celery.get_states()
+
+
+@blueprint.route('/tasks/events', methods=['GET'])
+@auth.login_required
+def stream_task_states():
+    return celery.stream_states()
+
+
 @blueprint.route('/tasks/<regex("[\w-]+"):task_id>', methods=['GET'])
 @auth.login_required
 def get_task_state(task_id):
     return celery.get_state(task_id)
 
 
+@blueprint.route('/tasks/<regex("[\w-]+"):task_id>', methods=['DELETE'])
+@auth.login_required
+def cancel_task(task_id):
+    return celery.cancel_task(task_id)
+
+
 @blueprint.route('/tasks/<regex("[\w-]+"):task_id>/result', methods=['GET'])
 @auth.login_required
 def get_task_result(task_id):
     return celery.get_result(task_id)
+
+
+@blueprint.route('/tasks/<regex("[\w-]+"):task_id>/log', methods=['GET'])
+@auth.login_required
+def get_task_log(task_id):
+    return celery.get_log(task_id)
@@ -2,3 +2,13 @@ import os
 
 # API
 API_TOKEN = os.getenv('API_TOKEN', None)
+API_LOG_CHUNK_LINES = int(os.getenv('API_LOG_CHUNK_LINES') or 1000)
+API_LOG_FOLLOW_TIMEOUT = int(os.getenv('API_LOG_FOLLOW_TIMEOUT') or 3600)
+API_EVENTS_TIMEOUT = int(os.getenv('API_EVENTS_TIMEOUT') or 3600)
+API_EVENTS_KEEPALIVE = int(os.getenv('API_EVENTS_KEEPALIVE') or 15)
+API_SYNC_TIMEOUT = int(os.getenv('API_SYNC_TIMEOUT') or 0)
+API_BULK_MAX_TASKS = int(os.getenv('API_BULK_MAX_TASKS') or 1000)
+API_TASKS_PAGE_SIZE = int(os.getenv('API_TASKS_PAGE_SIZE') or 100)
+API_BATCH_MAX_WORKSPACES = int(os.getenv('API_BATCH_MAX_WORKSPACES') or 1000)
+API_PIPELINE_MAX_NODES = int(os.getenv('API_PIPELINE_MAX_NODES') or 100)
+API_CATALOG_INTERVAL = int(os.getenv('API_CATALOG_INTERVAL') or 10)
@@ -1,21 +1,88 @@
 import os
 from pathlib import Path
 
+from kombu import Queue
+
 
 # Terraform
+TF_DATA_PATH = os.getenv('TF_DATA_PATH') or f'{Path(__file__).parents[2]}/.terrestrial'
 TF_CONF_PATH = os.getenv('TF_CONF_PATH') or f'{Path(__file__).parents[2]}/configurations'
-TF_CONFIGURATIONS = [p.stem for p in Path(TF_CONF_PATH).iterdir() if p.is_dir()]
+TF_ENV_VARIABLES = [v for v in (os.getenv('TF_ENV_VARIABLES') or '').split(',') if v]
+TF_CLONE_STRATEGY = os.getenv('TF_CLONE_STRATEGY') or 'copy'
+TF_SANDBOX_PATH = os.getenv('TF_SANDBOX_PATH')
+TF_SANDBOX_POOL_SIZE = int(os.getenv('TF_SANDBOX_POOL_SIZE') or 0)
+TF_PLUGIN_CACHE_DIR = os.getenv('TF_PLUGIN_CACHE_DIR') or f'{TF_DATA_PATH}/plugins'
+TF_INIT_CONCURRENCY = int(os.getenv('TF_INIT_CONCURRENCY') or 4)
+TF_INIT_BACKGROUND = (os.getenv('TF_INIT_BACKGROUND') or '').lower() in ['1', 'true', 'yes']
+TF_INIT_WAIT_TIMEOUT = int(os.getenv('TF_INIT_WAIT_TIMEOUT') or 600)
+TF_RELOAD_INTERVAL = int(os.getenv('TF_RELOAD_INTERVAL') or 0)
+TF_LOG_MAX_LINES = int(os.getenv('TF_LOG_MAX_LINES') or 100000)
+TF_LOG_TTL = int(os.getenv('TF_LOG_TTL') or 86400)
+TF_OUTPUT_TAIL = int(os.getenv('TF_OUTPUT_TAIL') or 10000)
+TF_REGISTRY_TTL = int(os.getenv('TF_REGISTRY_TTL') or 86400)
+TF_PLAN_PATH = os.getenv('TF_PLAN_PATH') or f'{TF_DATA_PATH}/plans'
+TF_PLAN_TTL = int(os.getenv('TF_PLAN_TTL') or 3600)
+TF_PLAN_STORE_SIZE = int(os.getenv('TF_PLAN_STORE_SIZE') or 1024 ** 3)
+TF_RESULT_TTL = int(os.getenv('TF_RESULT_TTL') or 86400)
+TF_RESULT_COMPRESSION = os.getenv('TF_RESULT_COMPRESSION') or 'gzip'
+TF_RESULT_MAX_BYTES = int(os.getenv('TF_RESULT_MAX_BYTES') or 1024 ** 2)
+TF_RESULT_PATH = os.getenv('TF_RESULT_PATH') or f'{TF_DATA_PATH}/results'
+TF_RESULT_STORE_SIZE = int(os.getenv('TF_RESULT_STORE_SIZE') or 1024 ** 3)
+TF_WORKSPACE_INDEX_TTL = int(os.getenv('TF_WORKSPACE_INDEX_TTL') or 3600)
+TF_READ_CACHE_TTL = int(os.getenv('TF_READ_CACHE_TTL') or 300)
+TF_QUEUE_DEPTH = int(os.getenv('TF_QUEUE_DEPTH') or 10)
+TF_QUEUE_TIMEOUT = int(os.getenv('TF_QUEUE_TIMEOUT') or 3600)
+TF_LOCK_TIMEOUT = int(os.getenv('TF_LOCK_TIMEOUT') or 3600)
+TF_LOCK_RETRY_INTERVAL = int(os.getenv('TF_LOCK_RETRY_INTERVAL') or 5)
+TF_COALESCE_PLANS = (os.getenv('TF_COALESCE_PLANS') or '').lower() in ['1', 'true', 'yes']
+TF_WEBHOOK_TIMEOUT = int(os.getenv('TF_WEBHOOK_TIMEOUT') or 10)
+TF_WEBHOOK_RETRIES = int(os.getenv('TF_WEBHOOK_RETRIES') or 5)
+TF_WEBHOOK_RETRY_DELAY = int(os.getenv('TF_WEBHOOK_RETRY_DELAY') or 10)
+TF_WEBHOOK_SECRET = os.getenv('TF_WEBHOOK_SECRET')
+TF_METRICS_PORT = int(os.getenv('TF_METRICS_PORT') or 0)
+TF_TIMEOUT = int(os.getenv('TF_TIMEOUT') or 0)
+TF_MEMORY_LIMIT = int(os.getenv('TF_MEMORY_LIMIT') or 0)
+TF_CPU_LIMIT = int(os.getenv('TF_CPU_LIMIT') or 0)
+TF_KILL_GRACE = int(os.getenv('TF_KILL_GRACE') or 10)
+
+# Routing
+TF_DEFAULT_QUEUE = os.getenv('TF_DEFAULT_QUEUE') or 'celery'
+TF_FAST_QUEUE = os.getenv('TF_FAST_QUEUE') or 'terrestrial.fast'
+TF_CONFIG_QUEUES = dict(
+    q.split(':', 1) for q in (os.getenv('TF_CONFIG_QUEUES') or '').split(',') if q)
+TF_PRIORITIES = {
+    'show': int(os.getenv('TF_PRIORITY_READ') or 0),
+    'output': int(os.getenv('TF_PRIORITY_READ') or 0),
+    'plan': int(os.getenv('TF_PRIORITY_PLAN') or 3),
+    'apply': int(os.getenv('TF_PRIORITY_APPLY') or 6),
+    'destroy': int(os.getenv('TF_PRIORITY_APPLY') or 6),
+    'drift': int(os.getenv('TF_PRIORITY_DRIFT') or 9)
+}
+TF_DRIFT_INTERVAL = int(os.getenv('TF_DRIFT_INTERVAL') or 0)
+TF_DRIFT_JITTER = int(os.getenv('TF_DRIFT_JITTER') or 300)
+TF_DRIFT_TIMEOUT = int(os.getenv('TF_DRIFT_TIMEOUT') or 3600)
+TF_DRIFT_RECHECK = int(os.getenv('TF_DRIFT_RECHECK') or 86400)
+TF_DRIFT_CONCURRENCY = int(os.getenv('TF_DRIFT_CONCURRENCY') or 2)
+TF_DRIFT_PROVIDER_CONCURRENCY = int(os.getenv('TF_DRIFT_PROVIDER_CONCURRENCY') or 1)
 
 # Celery
 BROKER_URL = os.getenv('CELERY_BROKER_URL') or 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND') or 'redis://localhost:6379/0'
 CELERY_TRACK_STARTED = True
-
-# Celery once
-ONCE = {
-  'backend': 'celery_once.backends.Redis',
-  'settings': {
-    'url': BROKER_URL,
-    'default_timeout': 600
-  }
+CELERY_TASK_RESULT_EXPIRES = TF_RESULT_TTL
+CELERY_DEFAULT_QUEUE = TF_DEFAULT_QUEUE
+CELERY_QUEUES = [
+    Queue(q) for q in
+    sorted({TF_DEFAULT_QUEUE, TF_FAST_QUEUE, *TF_CONFIG_QUEUES.values()})]
+CELERY_ROUTES = ('terrestrial.core.tasks.route_task',)
+CELERYBEAT_SCHEDULE = {
+    'drift': {
+        'task': 'terrestrial.core.tasks.schedule_drift',
+        'schedule': TF_DRIFT_INTERVAL,
+        'args': (TF_DRIFT_INTERVAL,)
+    }
+} if TF_DRIFT_INTERVAL else {}
+BROKER_TRANSPORT_OPTIONS = {
+    'priority_steps': list(range(10)),
+    'queue_order_strategy': 'priority'
 }
@@ -1 +1,14 @@
-from .tasks import terraform, list_celery_tasks, get_task_state, get_task_result
+from .tasks import terraform, get_task_state, get_task_result
+from .tasks import read_cache, task_scheduler, list_workspaces, batch_registry
+from .tasks import advance_pipeline, pipeline_registry, workspace_index
+from .tasks import drift_registry, serialized
+from . import pipelines
+from .scheduler import signature
+from .tfworker import OPTIONS, parse_options
+from .tfconfig import terraform_version
+from .cache import etag
+from .catalog import Catalog, check_variables
+from . import formats
+from .tasklog import TaskLog
+from .results import get_meta, get_metas, unpack, result_store
+from .signals import task_registry
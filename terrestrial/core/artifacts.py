@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import logging
+from pathlib import Path
+from shutil import copyfile
+
+
+class ArtifactStore:
+    """
+    Directory of files produced by tasks, each stored along
+    with its metadata. Artifacts expire after <ttl> seconds,
+    least recently used ones are evicted once store grows
+    over <max_size> bytes
+    """
+    def __init__(self, path, ttl=3600, max_size=None, logger=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_size = max_size
+
+    def put(self, name, src, meta=None):
+        """
+        Copies file <src> to store as <name>
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        tmp = self.path / f'.{name}'
+        copyfile(src, tmp)
+        self._meta_path(name).write_text(json.dumps(meta or {}))
+        tmp.rename(self.path / name)
+
+        self.evict()
+        return self.path / name
+
+    def get(self, name):
+        """
+        Returns path to artifact <name> and its metadata,
+        or None if there's no such artifact or it expired
+        """
+        path = self.path / name
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                self.remove(name)
+                return None
+
+            meta = json.loads(self._meta_path(name).read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+        # Keep modification time intact, it's what expiration relies on
+        os.utime(path, (time.time(), path.stat().st_mtime))
+        return path, meta
+
+    def remove(self, name):
+        for p in [self.path / name, self._meta_path(name)]:
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+
+    def evict(self):
+        """
+        Removes expired artifacts, then least recently used
+        ones until store fits into its size limit
+        """
+        now, artifacts = time.time(), []
+
+        for p in list(self.path.iterdir()):
+            if p.name.startswith('.') or p.suffix == '.meta':
+                continue
+
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+
+            if now - st.st_mtime > self.ttl:
+                self.logger.debug(f'Artifact {p.name} expired')
+                self.remove(p.name)
+            else:
+                artifacts.append((st.st_atime, st.st_size, p.name))
+
+        if not self.max_size:
+            return
+
+        size = sum(a[1] for a in artifacts)
+        for _, s, name in sorted(artifacts):
+            if size <= self.max_size:
+                break
+
+            self.logger.debug(f'Evicting artifact {name}')
+            self.remove(name)
+            size -= s
+
+    def _meta_path(self, name):
+        return self.path / f'{name}.meta'
@@ -0,0 +1,44 @@
+import time
+import json
+
+
+class BatchRegistry:
+    """
+    Batches of tasks running the same action on a configuration
+    across many workspaces, kept in Redis for <ttl> seconds
+    """
+    KEY = 'terrestrial:batches'
+
+    def __init__(self, client, ttl=86400):
+        self.client = client
+        self.ttl = ttl
+
+    def create(self, batch_id, config, action, tasks, rejected=None):
+        """
+        Records batch <batch_id> of <tasks>, a mapping of workspaces
+        to IDs of their tasks, along with <rejected> workspaces
+        which didn't make it to the queue and why
+        """
+        key = f'{self.KEY}:{batch_id}'
+
+        pipe = self.client.pipeline()
+        pipe.hset(key, mapping={
+            'id': batch_id,
+            'config': config,
+            'action': action,
+            'created': time.time(),
+            'tasks': json.dumps(tasks),
+            'rejected': json.dumps(rejected or {})
+        })
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def get(self, batch_id):
+        batch = self.client.hgetall(f'{self.KEY}:{batch_id}')
+        batch = {k.decode(): v.decode() for k, v in batch.items()}
+
+        for field in ['tasks', 'rejected']:
+            if field in batch:
+                batch[field] = json.loads(batch[field])
+
+        return batch
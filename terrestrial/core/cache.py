@@ -0,0 +1,79 @@
+import hashlib
+
+from redis import WatchError
+
+
+def etag(body):
+    return hashlib.sha1(body.encode()).hexdigest()
+
+
+class ReadCache:
+    """
+    Results of read-only actions cached per configuration and
+    workspace. Every apply or destroy bumps generation of their
+    configuration and workspace, invalidating what was cached
+    """
+    KEY = 'terrestrial:cache'
+
+    def __init__(self, client, ttl=300):
+        self.client = client
+        self.ttl = ttl
+
+    def generation(self, config, workspace):
+        return int(self.client.get(self._generation_key(config, workspace)) or 0)
+
+    def bump(self, config, workspace):
+        self.client.incr(self._generation_key(config, workspace))
+
+    def get(self, config, workspace, action):
+        """
+        Returns cached output of <action>, unless configuration
+        and workspace changed since it was cached
+        """
+        if not self.ttl:
+            return None
+
+        pipe = self.client.pipeline()
+        pipe.get(self._generation_key(config, workspace))
+        pipe.hgetall(self._key(config, workspace, action))
+        generation, entry = pipe.execute()
+
+        entry = {k.decode(): v.decode() for k, v in entry.items()}
+        if not entry or int(entry['generation']) != int(generation or 0):
+            return None
+
+        return entry
+
+    def put(self, config, workspace, action, generation, stdout):
+        """
+        Caches output of <action> if configuration and workspace
+        are still at <generation> it was produced at
+        """
+        if not self.ttl:
+            return
+
+        generation_key = self._generation_key(config, workspace)
+        key = self._key(config, workspace, action)
+
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(generation_key)
+                if int(pipe.get(generation_key) or 0) != generation:
+                    return
+
+                pipe.multi()
+                pipe.hset(key, mapping={
+                    'generation': generation,
+                    'etag': etag(stdout),
+                    'stdout': stdout
+                })
+                pipe.expire(key, self.ttl)
+                pipe.execute()
+            except WatchError:
+                pass
+
+    def _generation_key(self, config, workspace):
+        return f'{self.KEY}:{config}:{workspace}:generation'
+
+    def _key(self, config, workspace, action):
+        return f'{self.KEY}:{config}:{workspace}:{action}'
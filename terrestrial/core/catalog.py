@@ -0,0 +1,187 @@
+import time
+import threading
+from pathlib import Path
+
+import hcl
+
+from terrestrial.errors import TerrestrialFatalError
+
+
+TF_PATTERNS = ['*.tf', '*.tf.json']
+TFVARS_PATTERNS = [
+    'terraform.tfvars',
+    'terraform.tfvars.json',
+    '*.auto.tfvars',
+    '*.auto.tfvars.json'
+]
+
+
+def files(path, patterns):
+    return sorted({f for p in patterns for f in Path(path).glob(p) if f.is_file()})
+
+
+def blocks(value):
+    """
+    Blocks declared once are parsed as a mapping, repeated ones as a list
+    """
+    return value if isinstance(value, list) else [value]
+
+
+def describe(path):
+    """
+    Describes configuration at <path> from its files: variables
+    it declares, outputs, backend and providers
+    """
+    meta = {
+        'name': Path(path).stem,
+        'variables': {},
+        'outputs': {},
+        'backend': None,
+        'providers': set(),
+        'errors': []
+    }
+
+    for f in files(path, TF_PATTERNS):
+        try:
+            # HCL parser takes JSON as well
+            doc = hcl.loads(f.read_text())
+        except Exception as e:
+            meta['errors'].append(f'{f.name}: {e}')
+            continue
+
+        for block in blocks(doc.get('variable', {})):
+            for name, v in block.items():
+                v = blocks(v)[0]
+                meta['variables'][name] = {
+                    'description': v.get('description'),
+                    'default': v.get('default'),
+                    'required': 'default' not in v
+                }
+
+        for block in blocks(doc.get('output', {})):
+            for name, o in block.items():
+                o = blocks(o)[0]
+                meta['outputs'][name] = {
+                    'description': o.get('description'),
+                    'sensitive': bool(o.get('sensitive', False))
+                }
+
+        for block in blocks(doc.get('terraform', {})):
+            for backend in blocks(block.get('backend', {})):
+                meta['backend'] = next(iter(backend), meta['backend'])
+
+        for block in blocks(doc.get('provider', {})):
+            meta['providers'].update(block)
+        for kind in ['resource', 'data']:
+            for block in blocks(doc.get(kind, {})):
+                meta['providers'].update(t.split('_')[0] for t in block)
+
+    # Variables set by files Terraform loads by itself aren't required
+    for f in files(path, TFVARS_PATTERNS):
+        try:
+            preset = hcl.loads(f.read_text())
+        except Exception as e:
+            meta['errors'].append(f'{f.name}: {e}')
+            continue
+
+        for name in preset:
+            if name in meta['variables']:
+                meta['variables'][name]['required'] = False
+
+    meta['providers'] = sorted(meta['providers'])
+    return meta
+
+
+def fingerprint(path):
+    """
+    Changes whenever files configuration is described from change
+    """
+    result = []
+    for f in files(path, TF_PATTERNS + TFVARS_PATTERNS):
+        try:
+            st = f.stat()
+        except FileNotFoundError:
+            continue
+        result.append((f.name, st.st_mtime_ns, st.st_size))
+
+    return tuple(result)
+
+
+def check_variables(meta, names, provided=()):
+    """
+    Rejects variable <names> configuration described by <meta> doesn't
+    declare, and required variables missing from <names>, unless
+    they're <provided> to Terraform by workers' environment
+    """
+    # Can't tell what's declared in files which failed to parse
+    if meta['errors']:
+        return
+
+    unknown = sorted(set(names) - set(meta['variables']))
+    if unknown:
+        raise TerrestrialFatalError(
+            f'Variables not declared by "{meta["name"]}": {", ".join(unknown)}')
+
+    missing = sorted(
+        name for name, v in meta['variables'].items()
+        if v['required'] and name not in names and name not in provided)
+    if missing:
+        raise TerrestrialFatalError(
+            f'Variables required by "{meta["name"]}" are missing: '
+            f'{", ".join(missing)}')
+
+
+class Catalog:
+    """
+    Configurations found under <conf_path>, described from their
+    files. Configurations are looked up again at most every <interval>
+    seconds, and only those whose files changed are described again
+    """
+    def __init__(self, conf_path, interval=10):
+        self.conf_path = Path(conf_path)
+        self.interval = interval
+        # Configuration name -> (fingerprint, description)
+        self._entries = {}
+        self._refreshed = None
+        self._lock = threading.Lock()
+
+    def names(self):
+        self.refresh()
+        return sorted(self._entries)
+
+    def get(self, name):
+        """
+        Returns description of configuration <name>, or None
+        if there's no such configuration
+        """
+        self.refresh()
+        entry = self._entries.get(name)
+        return entry[1] if entry else None
+
+    def all(self):
+        self.refresh()
+        return {name: meta for name, (_, meta) in self._entries.items()}
+
+    def refresh(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._refreshed is not None \
+                    and now - self._refreshed < self.interval:
+                return
+            self._refreshed = now
+
+            try:
+                paths = [p for p in self.conf_path.iterdir() if p.is_dir()]
+            except FileNotFoundError:
+                paths = []
+
+            entries = {}
+            for p in paths:
+                current = fingerprint(p)
+                known = self._entries.get(p.stem)
+                if known and known[0] == current:
+                    entries[p.stem] = known
+                else:
+                    entries[p.stem] = (current, describe(p))
+
+            self._entries = entries
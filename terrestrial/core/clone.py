@@ -0,0 +1,92 @@
+import os
+from pathlib import Path
+from shutil import copy2, copytree
+
+
+# Directories populated by "terraform init", which are never
+# written to afterwards and can be shared between sandboxes as is
+SHARED_DIRS = [
+    '.terraform/plugins',
+    '.terraform/modules'
+]
+
+# Files and directories Terraform writes to while running,
+# every sandbox must own a private copy of those
+SCRATCH_PATHS = [
+    '.terraform/environment',
+    '.terraform/terraform.tfstate',
+    '.terraform.lock.hcl',
+    '.terraform.tfstate.lock.info',
+    'terraform.tfstate',
+    'terraform.tfstate.backup',
+    'terraform.tfstate.d'
+]
+
+
+def copy_tree(src, dst):
+    """
+    Copies configuration directory as a whole,
+    except for plugins symlinked from shared cache
+    """
+    return copytree(src, dst, copy_function=_copy)
+
+
+def link_tree(src, dst):
+    """
+    Builds a hardlink farm of configuration directory,
+    symlinking directories shared between sandboxes
+    and copying files Terraform writes to
+    """
+    src = Path(src)
+    dst = Path(dst)
+    dst.mkdir()
+
+    for root, dirs, files in os.walk(src):
+        rel = Path(root).relative_to(src)
+
+        for d in list(dirs):
+            s, d_rel = Path(root, d), (rel / d).as_posix()
+
+            if d_rel in SHARED_DIRS or s.is_symlink():
+                os.symlink(os.path.realpath(s), dst / d_rel)
+                dirs.remove(d)
+            elif d_rel in SCRATCH_PATHS:
+                copytree(s, dst / d_rel)
+                dirs.remove(d)
+            else:
+                (dst / d_rel).mkdir()
+
+        for f in files:
+            s, f_rel = Path(root, f), (rel / f).as_posix()
+
+            if s.is_symlink():
+                os.symlink(os.path.realpath(s), dst / f_rel)
+            elif f_rel in SCRATCH_PATHS:
+                copy2(s, dst / f_rel)
+            else:
+                _hardlink(s, dst / f_rel)
+
+    return str(dst)
+
+
+def _copy(src, dst):
+    # Absolute links, like ones into provider plugins
+    # cache, resolve the same way from any sandbox
+    if os.path.islink(src) and os.path.isabs(os.readlink(src)):
+        os.symlink(os.readlink(src), dst)
+    else:
+        copy2(src, dst)
+
+
+def _hardlink(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        # Sandbox is on another filesystem or links are not supported
+        copy2(src, dst)
+
+
+CLONE_STRATEGIES = {
+    'copy': copy_tree,
+    'link': link_tree
+}
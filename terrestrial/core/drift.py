@@ -0,0 +1,107 @@
+import re
+import time
+import json
+
+
+CLEAN = 'CLEAN'
+DRIFTED = 'DRIFTED'
+FAILED = 'FAILED'
+SKIPPED = 'SKIPPED'
+
+SUMMARY_EXPR = re.compile(r'^Plan: .*$', re.MULTILINE)
+
+ACQUIRE_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', ARGV[2])
+    local limit = tonumber(ARGV[i + 3])
+    if limit > 0 and not redis.call('ZSCORE', key, ARGV[1])
+            and redis.call('ZCARD', key) >= limit then
+        return 0
+    end
+end
+for i, key in ipairs(KEYS) do
+    redis.call('ZADD', key, ARGV[3], ARGV[1])
+end
+return 1
+"""
+
+
+def summarize(stdout):
+    """
+    Picks "Plan: N to add, ..." line out of plan output
+    """
+    found = re.findall(SUMMARY_EXPR, stdout or '')
+    return found[-1] if found else None
+
+
+def unchanged(entry, digest, generation, recheck, now=None):
+    """
+    Whether pair's last check recorded in <entry> was clean and
+    neither configuration <digest> nor state <generation> changed
+    since, within <recheck> seconds
+    """
+    now = now or time.time()
+    return bool(entry) and entry['status'] == CLEAN and \
+        entry.get('digest') == digest and \
+        entry.get('generation') == generation and \
+        now - entry['checked'] < recheck
+
+
+class Budget:
+    """
+    Concurrency budget shared by all workers: every pool of slots
+    has at most its limit of holders at once. Holders which didn't
+    release their slots in <ttl> seconds lose them
+    """
+    KEY = 'terrestrial:budget'
+
+    def __init__(self, client, ttl=3600):
+        self.client = client
+        self.ttl = ttl
+        self._acquire = client.register_script(ACQUIRE_SCRIPT)
+
+    def acquire(self, token, limits):
+        """
+        Takes a slot in every pool of <limits>, a mapping of pool
+        names to their limits (0 for no limit), all or none of them.
+        Returns whether it did
+        """
+        pools = sorted(limits)
+        now = time.time()
+        return bool(self._acquire(
+            keys=[self._key(p) for p in pools],
+            args=[token, now, now + self.ttl] + [limits[p] for p in pools]))
+
+    def release(self, token, pools):
+        pipe = self.client.pipeline()
+        for p in pools:
+            pipe.zrem(self._key(p), token)
+        pipe.execute()
+
+    def _key(self, pool):
+        return f'{self.KEY}:{pool}'
+
+
+class DriftRegistry:
+    """
+    Outcome of the last drift check of every configuration
+    and workspace
+    """
+    KEY = 'terrestrial:drift'
+
+    def __init__(self, client):
+        self.client = client
+
+    def record(self, config, workspace, status, **details):
+        entry = dict(
+            details, config=config, workspace=workspace,
+            status=status, checked=time.time())
+        self.client.hset(self.KEY, f'{config}/{workspace}', json.dumps(entry))
+
+    def get(self, config, workspace):
+        entry = self.client.hget(self.KEY, f'{config}/{workspace}')
+        return json.loads(entry) if entry else None
+
+    def all(self):
+        entries = [json.loads(e) for e in self.client.hvals(self.KEY)]
+        return sorted(entries, key=lambda e: (e['config'], e['workspace']))
@@ -0,0 +1,164 @@
+import os
+import time
+import signal
+import logging
+import resource
+import threading
+import subprocess
+from collections import deque
+
+from terrestrial.errors import TerrestrialTimeoutError, TerrestrialCancelledError
+from .metrics import SUBPROCESSES, SUBPROCESSES_RUNNING
+
+
+logger = logging.getLogger(__name__)
+
+# How often running process is checked for timeout and cancellation
+POLL_INTERVAL = 1
+# First line of output cut down to its tail
+TRUNCATED = '[output truncated]'
+
+
+def run(cmds, cwd=None, on_output=None, tail=None, timeout=None,
+        memory=None, cpu=None, grace=10, cancelled=None):
+    """
+    Runs <cmds> passing every line of its output to <on_output>
+    as soon as it is printed. Returns return code along with
+    last <tail> lines of stdout and stderr, marked as truncated
+    if there were more.
+
+    Process is limited to <memory> bytes of data and <cpu> seconds
+    of CPU time. Once it runs longer than <timeout> seconds, or
+    <cancelled> returns True, it is interrupted, and killed along
+    with its children if it doesn't exit in <grace> seconds
+    """
+    logger.debug(f'Running {" ".join(cmds)}')
+
+    p = subprocess.Popen(
+        cmds, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        start_new_session=True)
+    limit(p, memory, cpu)
+    SUBPROCESSES.labels(cmds[1] if len(cmds) > 1 else cmds[0]).inc()
+
+    buffers = {
+        'stdout': deque(maxlen=tail),
+        'stderr': deque(maxlen=tail)
+    }
+    counts = {'stdout': 0, 'stderr': 0}
+
+    def pump(stream, name):
+        for raw in iter(stream.readline, b''):
+            line = raw.decode('utf-8', errors='replace').rstrip('\n')
+            buffers[name].append(line)
+            counts[name] += 1
+            if on_output:
+                try:
+                    on_output(name, line)
+                except Exception as e:
+                    # Keep draining the pipe, or the process will block
+                    logger.warning(f'Failed to pass output along: {e}')
+        stream.close()
+
+    pumps = [
+        threading.Thread(target=pump, args=(p.stdout, 'stdout'), daemon=True),
+        threading.Thread(target=pump, args=(p.stderr, 'stderr'), daemon=True)
+    ]
+    for t in pumps:
+        t.start()
+
+    with SUBPROCESSES_RUNNING.track_inprogress():
+        rc, error = wait(p, cmds, timeout, grace, cancelled)
+        for t in pumps:
+            # Don't wait for output of stopped process' orphans
+            t.join(grace if error else None)
+
+    if error:
+        raise error
+
+    stdout, stderr = [
+        '\n'.join(
+            ([TRUNCATED] if counts[name] > len(buffers[name]) else []) +
+            list(buffers[name]))
+        for name in ['stdout', 'stderr']]
+
+    return rc, stdout, stderr
+
+
+def wait(p, cmds, timeout=None, grace=10, cancelled=None):
+    """
+    Waits for process <p> to exit, stopping it on timeout or
+    cancellation. Returns its return code and reason it was stopped
+    """
+    if not timeout and not cancelled:
+        return p.wait(), None
+
+    deadline = time.monotonic() + timeout if timeout else None
+    while True:
+        try:
+            return p.wait(timeout=POLL_INTERVAL), None
+        except subprocess.TimeoutExpired:
+            pass
+
+        if deadline and time.monotonic() > deadline:
+            error = TerrestrialTimeoutError(
+                f'"{" ".join(cmds[1:2])}" timed out after {timeout}s')
+        elif cancelled and is_cancelled(cancelled):
+            error = TerrestrialCancelledError(
+                f'"{" ".join(cmds[1:2])}" was cancelled')
+        else:
+            continue
+
+        logger.warning(f'{error}, stopping process {p.pid}')
+        return stop(p, grace), error
+
+
+def stop(p, grace=10):
+    """
+    Interrupts process group of <p>, so Terraform gets a chance to
+    release state lock, then kills whatever is left of the group
+    once <p> exits, or in <grace> seconds if it doesn't
+    """
+    killpg(p, signal.SIGINT)
+    try:
+        rc = p.wait(timeout=grace)
+    except subprocess.TimeoutExpired:
+        logger.warning(f'Process {p.pid} is still running, killing it')
+        rc = None
+
+    killpg(p, signal.SIGKILL)
+    return p.wait() if rc is None else rc
+
+
+def killpg(p, sig):
+    try:
+        os.killpg(p.pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+def is_cancelled(cancelled):
+    try:
+        return cancelled()
+    except Exception as e:
+        logger.warning(f'Failed to check for cancellation: {e}')
+        return False
+
+
+def limit(p, memory=None, cpu=None):
+    """
+    Sets resource limits of process <p> once it's started, as
+    running code between fork and exec isn't safe in a worker
+    running threads. Processes it starts later inherit them
+    """
+    limits = [
+        (resource.RLIMIT_DATA, memory),
+        (resource.RLIMIT_CPU, cpu)
+    ]
+    for kind, value in limits:
+        if not value:
+            continue
+        try:
+            resource.prlimit(p.pid, kind, (value, value))
+        except ProcessLookupError:
+            # Exited already, nothing to limit
+            return
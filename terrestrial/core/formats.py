@@ -0,0 +1,70 @@
+import json
+
+
+FORMATS = ['text', 'json']
+# Actions which can give their output as JSON
+JSON_ACTIONS = ['show', 'output', 'plan']
+# Earlier Terraform versions can't show state or plans as JSON
+JSON_MIN_VERSIONS = {'show': (0, 12), 'plan': (0, 12)}
+
+
+def variant(action, options):
+    """
+    Name output of <action> is known by, given its <options>
+    """
+    return f'{action}.json' if (options or {}).get('json') else action
+
+
+def supports_json(action, version):
+    """
+    Whether Terraform of <version> can give output of <action> as
+    JSON, assuming it can if version is unknown
+    """
+    wanted = JSON_MIN_VERSIONS.get(action)
+    return not wanted or not version or tuple(version[:2]) >= wanted
+
+
+def matches(address, wanted):
+    """
+    Whether resource at <address> is the <wanted> one,
+    one of its instances, or is in the <wanted> module
+    """
+    return address == wanted or \
+        address.startswith(f'{wanted}[') or address.startswith(f'{wanted}.')
+
+
+def resources(module):
+    """
+    Resources of a module in JSON state, and of all of its child modules
+    """
+    yield from module.get('resources', [])
+    for child in module.get('child_modules', []):
+        yield from resources(child)
+
+
+def select(action, body, names=None, addresses=None):
+    """
+    Narrows JSON output of <action> down to outputs of given <names>,
+    or to resources at given <addresses>
+    """
+    if not names and not addresses:
+        return body
+
+    data = json.loads(body)
+
+    if action == 'output':
+        missing = [n for n in names if n not in data]
+        if missing:
+            raise KeyError(f'Outputs not found: {", ".join(missing)}')
+        data = {n: data[n] for n in names}
+    elif action == 'show':
+        root = data.get('values', {}).get('root_module', {})
+        data = {'resources': [
+            r for r in resources(root)
+            if any(matches(r['address'], a) for a in addresses)]}
+    elif action == 'plan':
+        data = {'resource_changes': [
+            r for r in data.get('resource_changes', [])
+            if any(matches(r['address'], a) for a in addresses)]}
+
+    return json.dumps(data)
@@ -0,0 +1,209 @@
+import time
+import logging
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from terrestrial.errors import TerrestrialFatalError, TerrestrialTimeoutError
+from .tfconfig import TerraformConfig
+
+
+PENDING = 'pending'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class ConfigInitializer:
+    """
+    Runs init and validate over configurations in a bounded
+    pool of threads, keeping track of each configuration's
+    readiness on disk, so worker processes can wait for it
+    """
+    def __init__(self, state_path, manifest=None, concurrency=4,
+                 logger=None, limits=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.state_path = Path(state_path)
+        self.manifest = manifest
+        self.concurrency = concurrency
+        self.limits = limits
+
+    def reset(self, names=()):
+        """
+        Forgets readiness of all configurations, then marks
+        configurations <names> as pending initialization
+        """
+        self.state_path.mkdir(parents=True, exist_ok=True)
+        for p in self.state_path.iterdir():
+            p.unlink()
+
+        for name in names:
+            self._mark(name, PENDING)
+
+    def initialize(self, path):
+        """
+        Initializes and validates configuration at <path> unless
+        it is unchanged since last time, returns True if it is
+        ready to be used
+        """
+        name = Path(path).stem
+        start = time.monotonic()
+
+        with TerraformConfig(
+                path=path, logger=self.logger, limits=self.limits) as c:
+            digest = c.digest()
+            if self._is_current(path, digest):
+                self.logger.info(f'"{name}" is unchanged, skipping initialization')
+                return True
+
+            self.logger.debug(f'Initializing {name}')
+            try:
+                rc_i, stdout, stderr = c.init()
+                if rc_i != 0:
+                    self.logger.error(
+                        f'Initialization failed for "{name}": {stderr}')
+
+                rc_v, stdout, stderr = c.validate()
+                if rc_v != 0:
+                    self.logger.error(
+                        f'Configuration "{name}" is invalid: {stderr}')
+            except TerrestrialTimeoutError as e:
+                self.logger.error(f'Initialization failed for "{name}": {e}')
+                rc_i = rc_v = None
+
+        ok = rc_i == 0 and rc_v == 0
+        if self.manifest:
+            if ok:
+                self.manifest.update(name, digest)
+            else:
+                self.manifest.remove(name)
+
+        self.logger.info(
+            f'{"Initialized" if ok else "Failed to initialize"} '
+            f'"{name}" in {time.monotonic() - start:.2f}s')
+
+        return ok
+
+    def initialize_all(self, paths):
+        """
+        Initializes configurations at <paths> concurrently,
+        returns names of ones which failed to initialize
+        """
+        paths = list(paths)
+        retry = self.concurrency > 1
+
+        def run(path):
+            ok = self.initialize(path)
+            if ok or not retry:
+                self._mark(path.stem, READY if ok else FAILED)
+            return ok
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            results = list(pool.map(run, paths))
+
+        # Concurrent init is not guaranteed to be safe with a shared
+        # plugins cache, so give failed configurations one more go alone
+        failed = []
+        for path, ok in zip(paths, results):
+            if not ok and retry:
+                self.logger.warning(f'Retrying initialization of "{path.stem}"')
+                ok = self.initialize(path)
+                self._mark(path.stem, READY if ok else FAILED)
+
+            if not ok:
+                failed.append(path.stem)
+
+        return failed
+
+    def watch(self, conf_path, interval):
+        """
+        Re-initializes configurations under <conf_path>
+        as they change, checking every <interval> seconds
+        """
+        seen = {}
+
+        while True:
+            time.sleep(interval)
+
+            paths = [
+                p.absolute() for p in Path(conf_path).iterdir() if p.is_dir()]
+
+            for path in paths:
+                try:
+                    digest = TerraformConfig(path=path).digest()
+                except OSError as e:
+                    self.logger.warning(f'Failed to check "{path.stem}": {e}')
+                    continue
+
+                if seen.get(path.stem) == digest:
+                    continue
+                seen[path.stem] = digest
+
+                if self._is_current(path, digest):
+                    continue
+
+                self.logger.info(
+                    f'Configuration "{path.stem}" changed, re-initializing')
+                self._mark(path.stem, PENDING)
+                self._mark(
+                    path.stem, READY if self.initialize(path) else FAILED)
+
+            for name in set(seen) - {p.stem for p in paths}:
+                self.logger.info(f'Configuration "{name}" was removed')
+                self._unmark(name)
+                seen.pop(name)
+                if self.manifest:
+                    self.manifest.remove(name)
+
+    def generation(self, name):
+        """
+        Identifies last (re-)initialization of configuration <name>
+        """
+        try:
+            return (self.state_path / name).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def wait(self, name, timeout=None):
+        """
+        Blocks until configuration <name> is initialized. Fails right
+        away if it's not known to be initialized at all, e.g. added
+        since worker started and not picked up by watch (yet)
+        """
+        marker = self.state_path / name
+        deadline = time.monotonic() + timeout if timeout else None
+
+        while True:
+            try:
+                state = marker.read_text()
+            except FileNotFoundError:
+                raise TerrestrialFatalError(
+                    f'Configuration "{name}" is not known to this worker')
+
+            if state != PENDING:
+                break
+            if deadline and time.monotonic() > deadline:
+                raise TerrestrialFatalError(
+                    f'Timed out waiting for "{name}" to initialize')
+            time.sleep(0.5)
+
+        if state != READY:
+            raise TerrestrialFatalError(
+                f'Configuration "{name}" failed to initialize')
+
+    def _is_current(self, path, digest):
+        path = Path(path)
+        return (
+            self.manifest is not None and
+            self.manifest.get(path.stem) == digest and
+            (path / '.terraform').is_dir())
+
+    def _unmark(self, name):
+        try:
+            (self.state_path / name).unlink()
+        except FileNotFoundError:
+            pass
+
+    def _mark(self, name, state):
+        self.state_path.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_path / f'.{name}'
+        tmp.write_text(state)
+        tmp.rename(self.state_path / name)
@@ -0,0 +1,78 @@
+import re
+import json
+import hashlib
+import threading
+from pathlib import Path
+
+
+CONTENT_PATTERNS = [
+    '*.tf',
+    '*.tf.json',
+    '*.tfvars',
+    '*.tfvars.json',
+    '.terraform.lock.hcl'
+]
+
+SOURCE_EXPR = re.compile(r'^\s*"?source"?\s*[=:]\s*"([^"]+)"', re.MULTILINE)
+
+
+def config_digest(path):
+    """
+    Hashes everything init and validate results depend on:
+    configuration files, lock data and sources of modules
+    in use, including contents of local ones
+    """
+    h = hashlib.sha256()
+    _hash_dir(Path(path), h, set())
+    return h.hexdigest()
+
+
+def _hash_dir(path, h, seen):
+    path = path.resolve()
+    if path in seen or not path.is_dir():
+        return
+    seen.add(path)
+
+    files = sorted({f for p in CONTENT_PATTERNS for f in path.glob(p)})
+    for f in files:
+        content = f.read_bytes()
+        h.update(f.name.encode())
+        h.update(content)
+
+        for source in re.findall(SOURCE_EXPR, content.decode(errors='ignore')):
+            if source.startswith(('./', '../')):
+                _hash_dir(path / source, h, seen)
+
+
+class Manifest:
+    """
+    Digests of configurations as of their last successful
+    initialization, persisted across worker restarts
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+        try:
+            self._digests = json.loads(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            self._digests = {}
+
+    def get(self, name):
+        return self._digests.get(name)
+
+    def update(self, name, digest):
+        with self._lock:
+            self._digests[name] = digest
+            self._save()
+
+    def remove(self, name):
+        with self._lock:
+            if self._digests.pop(name, None) is not None:
+                self._save()
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f'.{self.path.name}')
+        tmp.write_text(json.dumps(self._digests, indent=2, sort_keys=True))
+        tmp.rename(self.path)
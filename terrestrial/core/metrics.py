@@ -0,0 +1,132 @@
+import os
+from pathlib import Path
+
+from prometheus_client import (
+    CollectorRegistry, Histogram, Counter, Gauge, REGISTRY, multiprocess)
+from prometheus_client.core import GaugeMetricFamily
+
+
+# Kombu keeps messages of every priority but 0 in a list of its own
+PRIORITY_SEP = '\x06\x16'
+PRIORITY_STEPS = range(10)
+
+PHASES = Histogram(
+    'terrestrial_task_phase_seconds',
+    'Time tasks spend in each phase',
+    ['phase', 'config', 'workspace', 'action'],
+    buckets=(.05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600))
+
+SUBPROCESSES = Counter(
+    'terrestrial_subprocesses_total',
+    'Terraform subprocesses started', ['command'])
+
+SUBPROCESSES_RUNNING = Gauge(
+    'terrestrial_subprocesses_running',
+    'Terraform subprocesses running', multiprocess_mode='livesum')
+
+
+def observe(phase, seconds, config=None, workspace=None, action=None):
+    PHASES.labels(phase, config or '', workspace or '', action or '') \
+        .observe(seconds)
+
+
+def multiprocess_mode():
+    return 'prometheus_multiproc_dir' in os.environ
+
+
+def registry(*collectors):
+    """
+    Returns registry with metrics of current process, or of all
+    processes in multiprocess mode, along with extra <collectors>
+    """
+    r = CollectorRegistry()
+
+    if multiprocess_mode():
+        multiprocess.MultiProcessCollector(r)
+    else:
+        r.register(REGISTRY)
+
+    for c in collectors:
+        r.register(c)
+
+    return r
+
+
+def process_dead(pid):
+    if multiprocess_mode():
+        multiprocess.mark_process_dead(pid)
+
+
+def disk_usage(path):
+    """
+    Total size of files under <path>, hardlinked ones counted once
+    """
+    size, seen = 0, set()
+
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                st = os.lstat(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+
+            if (st.st_dev, st.st_ino) in seen:
+                continue
+            seen.add((st.st_dev, st.st_ino))
+            size += st.st_size
+
+    return size
+
+
+class DiskUsageCollector:
+    """
+    Reports disk usage of sandboxes (directories matching
+    <sandbox_glob> under <sandbox_path>) and of given <paths>
+    """
+    def __init__(self, sandbox_path, sandbox_glob, **paths):
+        self.sandbox_path = Path(sandbox_path)
+        self.sandbox_glob = sandbox_glob
+        self.paths = paths
+
+    def collect(self):
+        usage = GaugeMetricFamily(
+            'terrestrial_disk_usage_bytes',
+            'Disk space taken by worker data', labels=['kind'])
+        sandboxes = GaugeMetricFamily(
+            'terrestrial_sandboxes', 'Sandboxes on disk')
+
+        found = list(self.sandbox_path.glob(self.sandbox_glob))
+        usage.add_metric(['sandboxes'], sum(disk_usage(p) for p in found))
+        sandboxes.add_metric([], len(found))
+
+        for kind, path in self.paths.items():
+            usage.add_metric([kind], disk_usage(path))
+
+        yield usage
+        yield sandboxes
+
+
+class QueueCollector:
+    """
+    Reports number of messages waiting in broker <queues>
+    """
+    def __init__(self, client, queues):
+        self.client = client
+        self.queues = queues
+
+    def collect(self):
+        depth = GaugeMetricFamily(
+            'terrestrial_queue_depth',
+            'Tasks waiting in broker queue', labels=['queue'])
+
+        pipe = self.client.pipeline()
+        for q in self.queues:
+            for p in PRIORITY_STEPS:
+                pipe.llen(f'{q}{PRIORITY_SEP}{p}' if p else q)
+        lengths = pipe.execute()
+
+        steps = len(PRIORITY_STEPS)
+        for i, q in enumerate(self.queues):
+            depth.add_metric([q], sum(lengths[i * steps:(i + 1) * steps]))
+
+        yield depth
@@ -0,0 +1,257 @@
+import time
+import json
+
+from celery.states import (
+    PENDING, STARTED, RETRY, SUCCESS, FAILURE, REVOKED, REJECTED)
+
+from terrestrial.errors import TerrestrialFatalError
+from .tfworker import parse_options
+from .catalog import check_variables
+
+
+ACTIONS = ['show', 'output', 'plan', 'apply', 'destroy']
+
+# Node which can't run as some of its ancestors failed
+SKIPPED = 'SKIPPED'
+# Node waiting for its parents to succeed
+WAITING = 'WAITING'
+
+FAILED_STATES = {FAILURE, REVOKED, REJECTED, SKIPPED}
+ACTIVE_STATES = {PENDING, STARTED, RETRY, WAITING}
+
+
+def validate(nodes, configurations, provided=()):
+    """
+    Checks pipeline <nodes> form a DAG of actions on existing
+    <configurations>, a mapping of their names to descriptions,
+    returns nodes with defaults filled in. Variables <provided> by
+    workers' environment aren't required
+    """
+    if not isinstance(nodes, dict) or not nodes:
+        raise TerrestrialFatalError('Pipeline must have at least one node')
+
+    normalized = {}
+    for name, node in nodes.items():
+        if not isinstance(node, dict):
+            raise TerrestrialFatalError(f'Node "{name}" must be an object')
+        if node.get('config') not in configurations:
+            raise TerrestrialFatalError(
+                f'Configuration of node "{name}" not found')
+        if node.get('action') not in ACTIONS:
+            raise TerrestrialFatalError(
+                f'Action of node "{name}" must be one of {ACTIONS}')
+
+        after = node.get('after') or []
+        missing = [p for p in after if p not in nodes]
+        if missing:
+            raise TerrestrialFatalError(
+                f'Node "{name}" depends on unknown nodes: {", ".join(missing)}')
+
+        options = dict(node.get('options') or {})
+        if node['action'] == 'output':
+            # Outputs are passed downstream, so they must be parseable
+            options['json'] = True
+
+        normalized[name] = {
+            'config': node['config'],
+            'workspace': node.get('workspace') or 'default',
+            'action': node['action'],
+            'var': node.get('var') or {},
+            'var_from': node.get('var_from') or {},
+            'after': after,
+            'options': parse_options(node['action'], options)
+        }
+
+    order(normalized)
+
+    for name, node in normalized.items():
+        for var, ref in node['var_from'].items():
+            parent, _, output = str(ref).partition('.')
+            if parent not in ancestors(normalized, name) or not output:
+                raise TerrestrialFatalError(
+                    f'Variable "{var}" of node "{name}" must refer to '
+                    f'an output of an upstream node, like "<node>.<output>"')
+            if normalized[parent]['action'] != 'output':
+                raise TerrestrialFatalError(
+                    f'Node "{parent}" must perform output for '
+                    f'node "{name}" to use its outputs')
+
+        if node['action'] in ['plan', 'apply', 'destroy']:
+            try:
+                check_variables(
+                    configurations[node['config']],
+                    set(node['var']) | set(node['var_from']), provided)
+            except TerrestrialFatalError as e:
+                raise TerrestrialFatalError(f'Node "{name}": {e}')
+
+    return normalized
+
+
+def order(nodes):
+    """
+    Returns names of <nodes> in topological order
+    """
+    ordered, visiting, visited = [], set(), set()
+
+    def visit(name):
+        if name in visited:
+            return
+        if name in visiting:
+            raise TerrestrialFatalError(
+                f'Pipeline has a dependency cycle through "{name}"')
+
+        visiting.add(name)
+        for parent in nodes[name]['after']:
+            visit(parent)
+        visiting.discard(name)
+
+        visited.add(name)
+        ordered.append(name)
+
+    for name in nodes:
+        visit(name)
+
+    return ordered
+
+
+def ancestors(nodes, name):
+    found, stack = set(), list(nodes[name]['after'])
+    while stack:
+        parent = stack.pop()
+        if parent not in found:
+            found.add(parent)
+            stack.extend(nodes[parent]['after'])
+
+    return found
+
+
+def states(nodes, tasks, errors, metas):
+    """
+    Returns state of every node, given IDs of <tasks> launched so far,
+    <errors> of nodes which failed to launch and <metas> of tasks
+    """
+    result = {}
+
+    for name in order(nodes):
+        if name in errors:
+            result[name] = REJECTED
+        elif name in tasks:
+            meta = metas[name]
+            if meta['status'] == SUCCESS and (
+                    not meta['result'] or meta['result'][0] != 0):
+                result[name] = FAILURE
+            else:
+                result[name] = meta['status']
+        elif any(result[p] in FAILED_STATES for p in nodes[name]['after']):
+            result[name] = SKIPPED
+        else:
+            result[name] = WAITING
+
+    return result
+
+
+def ready(nodes, node_states):
+    """
+    Returns names of waiting nodes whose parents all succeeded
+    """
+    return [
+        name for name, state in node_states.items()
+        if state == WAITING and
+        all(node_states[p] == SUCCESS for p in nodes[name]['after'])]
+
+
+def state(node_states):
+    """
+    Returns state of the pipeline as a whole
+    """
+    if any(s in ACTIVE_STATES for s in node_states.values()):
+        return STARTED
+    if all(s == SUCCESS for s in node_states.values()):
+        return SUCCESS
+
+    return FAILURE
+
+
+def upstream_vars(node, metas):
+    """
+    Returns variables of <node> taken from outputs of upstream nodes
+    """
+    var = {}
+    for name, ref in node['var_from'].items():
+        parent, _, output = ref.partition('.')
+        try:
+            outputs = json.loads(metas[parent]['result'][1])
+            var[name] = outputs[output]['value']
+        except (KeyError, TypeError, ValueError):
+            raise TerrestrialFatalError(
+                f'Output "{output}" of node "{parent}" not found')
+
+    return var
+
+
+class PipelineRegistry:
+    """
+    Pipelines of tasks, kept in Redis for <ttl> seconds along
+    with IDs of tasks launched for their nodes
+    """
+    KEY = 'terrestrial:pipelines'
+
+    def __init__(self, client, ttl=86400):
+        self.client = client
+        self.ttl = ttl
+
+    def create(self, pipeline_id, nodes):
+        key = f'{self.KEY}:{pipeline_id}'
+
+        pipe = self.client.pipeline()
+        pipe.hset(key, mapping={
+            'id': pipeline_id,
+            'created': time.time(),
+            'nodes': json.dumps(nodes)
+        })
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def get(self, pipeline_id):
+        """
+        Returns pipeline nodes, IDs of tasks launched for them
+        and errors of nodes which failed to launch
+        """
+        fields = self.client.hgetall(f'{self.KEY}:{pipeline_id}')
+        fields = {k.decode(): v.decode() for k, v in fields.items()}
+        if not fields:
+            return None
+
+        return {
+            'id': fields['id'],
+            'nodes': json.loads(fields['nodes']),
+            'tasks': {
+                k[len('task:'):]: v for k, v in fields.items()
+                if k.startswith('task:')},
+            'errors': {
+                k[len('error:'):]: v for k, v in fields.items()
+                if k.startswith('error:')}
+        }
+
+    def claim(self, pipeline_id, node, task_id):
+        """
+        Assigns task <task_id> to <node> unless it has one already,
+        returns whether it did
+        """
+        claimed = bool(self.client.hsetnx(
+            f'{self.KEY}:{pipeline_id}', f'task:{node}', task_id))
+        if claimed:
+            self.client.set(
+                f'{self.KEY}:task:{task_id}', pipeline_id, ex=self.ttl)
+
+        return claimed
+
+    def pipeline_of(self, task_id):
+        """
+        Returns ID of pipeline task <task_id> was launched for, if any
+        """
+        pipeline_id = self.client.get(f'{self.KEY}:task:{task_id}')
+        return pipeline_id.decode() if pipeline_id else None
+
+    def fail(self, pipeline_id, node, error):
+        self.client.hset(f'{self.KEY}:{pipeline_id}', f'error:{node}', error)
@@ -0,0 +1,42 @@
+import os
+import re
+import logging
+from pathlib import Path
+
+
+PLUGIN_EXPR = re.compile(r'^terraform-provider-(?P<name>[\w-]+?)_v(?P<version>[\w.\-]+?)(_x\d+)?(\.exe)?$')
+
+
+class PluginCache:
+    """
+    Provider plugins cache shared by all configurations and
+    sandboxes of a worker. Terraform keeps it keyed by provider
+    name and version, and symlinks plugins from it on init
+    """
+    def __init__(self, path, logger=None):
+        self.logger = logger or logging.getLogger(__name__)
+        self.path = str(Path(path).absolute())
+
+    def prepare(self):
+        """
+        Creates cache directory and points Terraform
+        processes spawned from now on to it
+        """
+        Path(self.path).mkdir(parents=True, exist_ok=True)
+        os.environ['TF_PLUGIN_CACHE_DIR'] = self.path
+
+        self.logger.debug(f'Using provider plugins cache at {self.path}')
+
+    def providers(self):
+        """
+        Lists (provider, version) pairs found in cache
+        """
+        found = set()
+
+        for root, _, files in os.walk(self.path):
+            for f in files:
+                m = re.match(PLUGIN_EXPR, f)
+                if m:
+                    found.add((m.group('name'), m.group('version')))
+
+        return sorted(found)
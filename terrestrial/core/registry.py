@@ -0,0 +1,151 @@
+import time
+from uuid import uuid4
+
+
+# Moves task from index of its previous state to one of the new state,
+# ordered by time task was first queued at
+RECORD_SCRIPT = """
+local previous = redis.call('HGET', KEYS[1], 'state')
+redis.call('HMSET', KEYS[1], unpack(ARGV, 6))
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('ZADD', KEYS[2], 'NX', ARGV[3], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], 0, ARGV[3] - ARGV[4])
+
+local index = ARGV[5] .. ARGV[2]
+if previous and previous ~= ARGV[2] then
+    redis.call('ZREM', ARGV[5] .. previous, ARGV[1])
+end
+redis.call('ZADD', index, redis.call('ZSCORE', KEYS[2], ARGV[1]), ARGV[1])
+redis.call('EXPIRE', index, ARGV[4])
+redis.call('ZREMRANGEBYSCORE', index, 0, ARGV[3] - ARGV[4])
+"""
+
+
+class TaskRegistry:
+    """
+    Index of Terraform tasks kept in Redis, updated by the tasks
+    themselves as they get queued, start and finish, so listing
+    them takes no broadcasts to workers
+    """
+    KEY = 'terrestrial:tasks'
+
+    def __init__(self, client, ttl=86400):
+        self.client = client
+        self.ttl = ttl
+        self._record = client.register_script(RECORD_SCRIPT)
+
+    def record(self, task_id, state, **fields):
+        """
+        Sets <state> of task <task_id> along with any extra <fields>
+        """
+        now = time.time()
+        fields.update({'id': task_id, 'state': state, 'updated': now})
+        mapping = [
+            x for k, v in fields.items() if v is not None for x in (k, v)]
+
+        self._record(
+            keys=[f'{self.KEY}:{task_id}', self.KEY],
+            args=[task_id, state, now, self.ttl, f'{self.KEY}:state:']
+            + mapping)
+
+    def get(self, task_id):
+        task = self.client.hgetall(f'{self.KEY}:{task_id}')
+        return {k.decode(): v.decode() for k, v in task.items()}
+
+    def cancel(self, task_id):
+        """
+        Asks task <task_id> to stop, whether it's running or not
+        """
+        key = f'{self.KEY}:{task_id}'
+        pipe = self.client.pipeline()
+        pipe.hset(key, 'cancelled', time.time())
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def cancelled(self, task_id):
+        return bool(self.client.hexists(f'{self.KEY}:{task_id}', 'cancelled'))
+
+    def add_callback(self, task_id, url):
+        """
+        Has <url> called once task <task_id> is done
+        """
+        key = f'{self.KEY}:{task_id}:callbacks'
+        pipe = self.client.pipeline()
+        pipe.sadd(key, url)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def pop_callbacks(self, task_id):
+        """
+        Takes URLs to call once task <task_id> is done, so they're
+        only called once
+        """
+        key = f'{self.KEY}:{task_id}:callbacks'
+        pipe = self.client.pipeline()
+        pipe.smembers(key)
+        pipe.delete(key)
+        urls, _ = pipe.execute()
+
+        return sorted(u.decode() for u in urls)
+
+    def queued(self, task_id):
+        """
+        Returns time task <task_id> was first queued at
+        """
+        return self.client.zscore(self.KEY, task_id)
+
+    def list(self, states=None, config=None, workspace=None,
+             offset=0, limit=100, chunk=500):
+        """
+        Lists tasks matching given filters, most recent first. Tasks
+        in given <states> are looked up in indexes of those states only
+        """
+        if not states:
+            return self._list(self.KEY, states, config, workspace,
+                              offset, limit, chunk)
+        if len(states) == 1:
+            return self._list(f'{self.KEY}:state:{states[0]}', states,
+                              config, workspace, offset, limit, chunk)
+
+        key = f'{self.KEY}:list:{uuid4()}'
+        pipe = self.client.pipeline()
+        pipe.zunionstore(
+            key, [f'{self.KEY}:state:{s}' for s in states], aggregate='MAX')
+        pipe.expire(key, 60)
+        pipe.execute()
+        try:
+            return self._list(
+                key, states, config, workspace, offset, limit, chunk)
+        finally:
+            self.client.delete(key)
+
+    def _list(self, index, states, config, workspace, offset, limit, chunk):
+        found, skipped, start = [], 0, 0
+
+        while len(found) < limit:
+            ids = self.client.zrevrange(index, start, start + chunk - 1)
+            if not ids:
+                break
+            start += chunk
+
+            pipe = self.client.pipeline()
+            for i in ids:
+                pipe.hgetall(f'{self.KEY}:{i.decode()}')
+
+            for task in pipe.execute():
+                task = {k.decode(): v.decode() for k, v in task.items()}
+                if not task:
+                    continue
+                if states and task['state'] not in states:
+                    continue
+                if config and task.get('config') != config:
+                    continue
+                if workspace and task.get('workspace') != workspace:
+                    continue
+
+                if skipped < offset:
+                    skipped += 1
+                elif len(found) < limit:
+                    found.append(task)
+
+        return found
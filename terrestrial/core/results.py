@@ -0,0 +1,155 @@
+import os
+import gzip
+import json
+import base64
+import tempfile
+
+from celery import states
+
+from terrestrial.errors import TerrestrialFatalError
+from .celery import app
+from .artifacts import ArtifactStore
+from .executor import TRUNCATED as TRUNCATED_LINE
+
+
+COMPRESSIONS = ['gzip', 'zstd', 'none']
+# Smaller outputs aren't worth compressing
+COMPRESS_MIN_BYTES = 1024
+TRUNCATED = f'{TRUNCATED_LINE}\n'
+
+
+def zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise TerrestrialFatalError(
+            'zstd compression requires zstandard package to be installed')
+    return zstandard
+
+
+def compress(data, compression):
+    if compression == 'gzip':
+        return gzip.compress(data)
+    if compression == 'zstd':
+        return zstandard().ZstdCompressor().compress(data)
+    return data
+
+
+def decompress(data, compression):
+    if compression == 'gzip':
+        return gzip.decompress(data)
+    if compression == 'zstd':
+        return zstandard().ZstdDecompressor().decompress(data)
+    return data
+
+
+def pack(result, compression='gzip', max_bytes=0, store=None, name=None):
+    """
+    Packs (rc, stdout, stderr) <result> of a task for result backend,
+    compressing its output. Output over <max_bytes> is cut down to
+    its tail, <result> as given is spilled to artifact <store> as
+    <name>. Task results are already cut to TF_OUTPUT_TAIL lines
+    """
+    if compression not in COMPRESSIONS:
+        raise TerrestrialFatalError(
+            f'Result compression must be one of {COMPRESSIONS}')
+
+    rc, stdout, stderr = result
+    out, err = (stdout or '').encode(), (stderr or '').encode()
+    packed = {'rc': rc, 'truncated': [], 'spilled': None}
+
+    if max_bytes and len(out) + len(err) > max_bytes:
+        if store and name:
+            packed['spilled'] = spill(
+                store, name, {'stdout': stdout, 'stderr': stderr}, compression)
+
+        # Keep the tails, that's where Terraform sums things up
+        cut_err = err[-(max_bytes // 2):] if max_bytes // 2 else b''
+        cut_out = out[-(max_bytes - len(cut_err)):]
+        packed['truncated'] = [
+            field for field, data, cut in [
+                ('stdout', out, cut_out), ('stderr', err, cut_err)]
+            if len(cut) < len(data)]
+        out, err = cut_out, cut_err
+
+    if len(out) + len(err) < COMPRESS_MIN_BYTES:
+        compression = 'none'
+
+    packed['compression'] = compression
+    for field, data in [('stdout', out), ('stderr', err)]:
+        packed[field] = base64.b64encode(compress(data, compression)).decode()
+
+    return packed
+
+
+def spill(store, name, output, compression):
+    fd, tmp = tempfile.mkstemp(prefix='terrestrial-result-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(compress(json.dumps(output).encode(), compression))
+        store.put(name, tmp, meta={'compression': compression})
+    finally:
+        os.remove(tmp)
+
+    return name
+
+
+def unpack(result, store=None):
+    """
+    Returns (rc, stdout, stderr) of a <result> packed by pack(), full
+    output is read from artifact <store> if it was spilled there.
+    Results of other tasks are returned as is
+    """
+    if not isinstance(result, dict) or 'compression' not in result:
+        return result
+
+    artifact = store.get(result['spilled']) \
+        if store and result['spilled'] else None
+    if artifact:
+        path, meta = artifact
+        output = json.loads(
+            decompress(path.read_bytes(), meta['compression']).decode())
+        return result['rc'], output['stdout'], output['stderr']
+
+    stdout, stderr = [
+        (TRUNCATED if field in result['truncated'] else '') +
+        decompress(base64.b64decode(result[field]), result['compression'])
+        .decode(errors='ignore')
+        for field in ['stdout', 'stderr']]
+
+    return result['rc'], stdout, stderr
+
+
+def result_store():
+    return ArtifactStore(
+        app.conf.TF_RESULT_PATH, ttl=app.conf.TF_RESULT_TTL,
+        max_size=app.conf.TF_RESULT_STORE_SIZE)
+
+
+def get_metas(task_ids):
+    """
+    Reads state and result of every task in <task_ids>
+    straight from result backend in a single round-trip
+    """
+    if not task_ids:
+        return []
+
+    backend = app.backend
+    values = backend.client.mget(
+        [backend.get_key_for_task(t) for t in task_ids])
+
+    metas = [
+        backend.decode_result(v) if v else
+        {'status': states.PENDING, 'result': None}
+        for v in values]
+
+    store = result_store()
+    for meta in metas:
+        if meta['status'] == states.SUCCESS:
+            meta['result'] = unpack(meta['result'], store)
+
+    return metas
+
+
+def get_meta(task_id):
+    return get_metas([task_id])[0]
@@ -0,0 +1,152 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from .tfworker import TerraformWorker
+
+
+class SandboxPool:
+    """
+    Keeps a bounded number of configuration clones with workspace
+    already selected, so an action can run as soon as a task starts
+    """
+    def __init__(self, size, logger=None, **worker_kwargs):
+        self.logger = logger or logging.getLogger(__name__)
+        self.size = size
+        self.worker_kwargs = worker_kwargs
+
+        # (config_path, workspace) -> idle (generation, worker) pairs,
+        # least recently used keys first
+        self._idle = OrderedDict()
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def acquire(self, config_path, workspace, generation=None, switch=False):
+        """
+        Hands out a ready sandbox for <config_path> in <workspace>,
+        creating one if none is idle. With <switch> set, an idle
+        sandbox of the same configuration in another workspace is
+        switched to <workspace> rather than cloning a new one.
+        Sandboxes cloned from another <generation> of configuration
+        are dropped. Caller owns the sandbox, and either closes or
+        releases it
+        """
+        key = (str(config_path), workspace)
+        keys = [key]
+        stale, w = [], None
+
+        with self._lock:
+            if switch:
+                keys += [k for k in reversed(self._idle)
+                         if k[0] == key[0] and k != key]
+
+            for k in keys:
+                idle = self._idle.get(k, [])
+                while idle and w is None:
+                    g, candidate = idle.pop()
+                    if g == generation:
+                        w = candidate
+                    else:
+                        stale.append(candidate)
+
+                if idle:
+                    self._idle.move_to_end(k)
+                else:
+                    self._idle.pop(k, None)
+                if w is not None:
+                    break
+
+        for s in stale:
+            s.close()
+
+        if w is not None and w.workspace != workspace:
+            self.logger.debug(f'Switching idle sandbox to {key}')
+            try:
+                w.workspace = workspace
+            except Exception as e:
+                self.logger.warning(f'Failed to switch sandbox to {key}: {e}')
+                w.close()
+                w = None
+
+        if w is not None:
+            self.logger.debug(f'Reusing pre-warmed sandbox for {key}')
+            return w
+
+        return self._create(*key)
+
+    def release(self, w, generation=None):
+        """
+        Takes sandbox <w> back to be reused by following tasks. Pool
+        keeps at least one sandbox this way, even if it's disabled
+        """
+        self._put((str(w.config.path), w.workspace), generation, w,
+                  max(self.size, 1))
+
+    def refill(self, config_path, workspace, generation=None):
+        """
+        Prepares a replacement sandbox for <config_path> in <workspace>
+        in background, evicting least recently used ones if pool is full
+        """
+        if self.size <= 0:
+            return
+
+        key = (str(config_path), workspace)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+
+        threading.Thread(
+            target=self._refill, args=(key, generation), daemon=True).start()
+
+    def discard(self, config_path=None):
+        """
+        Drops idle sandboxes of <config_path>, or all of them
+        """
+        with self._lock:
+            keys = [k for k in self._idle
+                    if config_path is None or k[0] == str(config_path)]
+            dropped = [w for k in keys for _, w in self._idle.pop(k)]
+
+        for w in dropped:
+            w.close()
+
+    def close(self):
+        self.discard()
+
+    def _create(self, config_path, workspace):
+        return TerraformWorker(
+            config_path=config_path, workspace=workspace,
+            logger=self.logger, **self.worker_kwargs)
+
+    def _refill(self, key, generation):
+        try:
+            w = self._create(*key)
+        except Exception as e:
+            self.logger.warning(f'Failed to pre-warm sandbox for {key}: {e}')
+            return
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+        self._put(key, generation, w, self.size)
+        self.logger.debug(f'Pre-warmed sandbox for {key}')
+
+    def _put(self, key, generation, w, size):
+        # Time spent preparing idle sandboxes isn't spent by tasks
+        w.timings.clear()
+
+        evicted = []
+        with self._lock:
+            self._idle.setdefault(key, []).append((generation, w))
+            self._idle.move_to_end(key)
+
+            while sum(len(i) for i in self._idle.values()) > size:
+                lru, idle = next(iter(self._idle.items()))
+                evicted.append(idle.pop(0)[1])
+                if not idle:
+                    del self._idle[lru]
+
+        for e in evicted:
+            self.logger.debug(f'Evicting pre-warmed sandbox {e.config_path}')
+            e.close()
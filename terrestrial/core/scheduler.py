@@ -0,0 +1,189 @@
+import time
+import json
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from terrestrial.errors import TerrestrialQueueFullError
+
+
+ADMIT_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[3])
+if ARGV[5] == '1' then
+    local queued = redis.call('GET', KEYS[2])
+    if queued and redis.call('ZSCORE', KEYS[1], queued) then
+        return queued
+    end
+end
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    return ARGV[1]
+end
+local depth = tonumber(ARGV[4])
+if depth > 0 and redis.call('ZCARD', KEYS[1]) >= depth then
+    return false
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+if ARGV[5] == '1' then
+    redis.call('SET', KEYS[2], ARGV[1], 'EX', ARGV[6])
+end
+return ARGV[1]
+"""
+
+ACQUIRE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+local rank = redis.call('ZRANK', KEYS[1], ARGV[1])
+if rank and rank > 0 then
+    return 0
+end
+local holder = redis.call('GET', KEYS[2])
+if holder and holder ~= ARGV[1] then
+    return 0
+end
+redis.call('SET', KEYS[2], ARGV[1], 'PX', ARGV[3])
+redis.call('ZREM', KEYS[1], ARGV[1])
+return 1
+"""
+
+EXTEND_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def signature(*args):
+    """
+    Digest identifying tasks doing the same thing
+    """
+    return hashlib.sha256(
+        json.dumps(args, sort_keys=True).encode()).hexdigest()
+
+
+class Scheduler:
+    """
+    Serializes tasks per configuration and workspace. Tasks are
+    admitted to a queue of bounded <max_depth> in order of their
+    ETA, and run one at a time, holding a lock which expires in
+    <lock_timeout> seconds unless it's kept. Tasks which didn't start
+    in <queue_timeout> seconds lose their place in the queue
+    """
+    KEY = 'terrestrial:scheduler'
+
+    def __init__(self, client, max_depth=10,
+                 lock_timeout=3600, queue_timeout=3600):
+        self.client = client
+        self.max_depth = max_depth
+        self.lock_timeout = lock_timeout
+        self.queue_timeout = queue_timeout
+        self._admit = client.register_script(ADMIT_SCRIPT)
+        self._acquire = client.register_script(ACQUIRE_SCRIPT)
+        self._extend = client.register_script(EXTEND_SCRIPT)
+        self._release = client.register_script(RELEASE_SCRIPT)
+
+    def admit(self, config, workspace, task_id, eta=None, coalesce=None):
+        """
+        Queues task <task_id>. If <coalesce> signature is given and
+        a task with the same signature is still queued, returns ID
+        of that task instead. Tasks already queued keep their place
+        """
+        now = time.time()
+        queued = self._admit(
+            keys=[
+                self._key(config, workspace, 'queue'),
+                self._key(config, workspace, f'coalesce:{coalesce}')],
+            args=[
+                task_id, eta or now, now - self.queue_timeout,
+                self.max_depth, 1 if coalesce else 0, self.queue_timeout])
+
+        if queued is None:
+            raise TerrestrialQueueFullError(
+                f'Queue for {config}/{workspace} is full, '
+                f'{self.max_depth} tasks are waiting already')
+
+        return queued.decode()
+
+    def eta(self, config, workspace, task_id):
+        """
+        Returns time task <task_id> is queued to run at, None if
+        it's not queued
+        """
+        return self.client.zscore(self._key(config, workspace, 'queue'), task_id)
+
+    def requeue(self, config, workspace, task_id, eta=None):
+        """
+        Puts task which took the lock back to the queue at <eta> it
+        was queued at, so it keeps its place however full queue is
+        """
+        key = self._key(config, workspace, 'queue')
+        pipe = self.client.pipeline()
+        pipe.zadd(key, {task_id: eta or time.time()})
+        pipe.expire(key, self.queue_timeout)
+        pipe.execute()
+
+    def acquire(self, config, workspace, task_id):
+        """
+        Takes the lock if task <task_id> is first in the queue,
+        returns whether it did
+        """
+        return bool(self._acquire(
+            keys=[
+                self._key(config, workspace, 'queue'),
+                self._key(config, workspace, 'lock')],
+            args=[
+                task_id, time.time() - self.queue_timeout,
+                int(self.lock_timeout * 1000)]))
+
+    def extend(self, config, workspace, task_id):
+        """
+        Pushes expiry of the lock task <task_id> holds <lock_timeout>
+        seconds away, returns whether it still held it
+        """
+        return bool(self._extend(
+            keys=[self._key(config, workspace, 'lock')],
+            args=[task_id, int(self.lock_timeout * 1000)]))
+
+    @contextmanager
+    def keep(self, config, workspace, task_id):
+        """
+        Keeps the lock task <task_id> holds from expiring while in
+        context, so it only expires once its worker is gone
+        """
+        stop = threading.Event()
+
+        def renew():
+            while not stop.wait(self.lock_timeout / 3):
+                if not self.extend(config, workspace, task_id):
+                    return
+
+        thread = threading.Thread(target=renew, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def release(self, config, workspace, task_id):
+        self._release(
+            keys=[self._key(config, workspace, 'lock')], args=[task_id])
+
+    def forget(self, config, workspace, task_id):
+        """
+        Removes task which won't run from the queue
+        """
+        self.client.zrem(self._key(config, workspace, 'queue'), task_id)
+
+    def depth(self, config, workspace):
+        return self.client.zcard(self._key(config, workspace, 'queue'))
+
+    def _key(self, config, workspace, name):
+        return f'{self.KEY}:{config}:{workspace}:{name}'
@@ -0,0 +1,115 @@
+import time
+
+from celery.signals import (
+    after_task_publish, task_prerun, task_postrun, task_revoked)
+from celery.states import PENDING, STARTED, RETRY, REVOKED, IGNORED
+
+from .tasks import (
+    terraform, deliver_webhooks, advance_pipeline, read_cache, task_registry,
+    task_scheduler, pipeline_registry, MUTATING_ACTIONS)
+from . import metrics
+
+
+def describe(args, kwargs):
+    """
+    Picks configuration, workspace and action
+    out of terraform task arguments
+    """
+    call = dict(zip(['config', 'action', 'var', 'workspace'], args or []))
+    call.update(kwargs or {})
+
+    return {
+        'config': call.get('config'),
+        'action': call.get('action'),
+        'workspace': call.get('workspace', 'default')
+    }
+
+
+@after_task_publish.connect(sender=terraform.name)
+def record_queued(sender=None, headers=None, body=None, **kwargs):
+    args, task_kwargs, _ = body
+    # Retries are published again, keep ETA task was requested with
+    eta = None if headers.get('retries') else headers.get('eta')
+    task_registry().record(
+        headers['id'], PENDING, eta=eta, **describe(args, task_kwargs))
+
+
+@task_prerun.connect(sender=terraform)
+def record_started(task_id=None, task=None, args=None, kwargs=None, **kw):
+    task_registry().record(
+        task_id, STARTED, worker=task.request.hostname,
+        **describe(args, kwargs))
+
+
+@task_postrun.connect(sender=terraform)
+def record_finished(task_id=None, state=None, **kwargs):
+    # Ignored tasks have recorded their state themselves
+    if state != IGNORED:
+        task_registry().record(task_id, state)
+
+
+@task_postrun.connect(sender=terraform)
+def invalidate_cache(args=None, kwargs=None, state=None, **kw):
+    """
+    Drops cached read-only results once state could have changed,
+    whether apply or destroy succeeded or not
+    """
+    if state == RETRY:
+        return
+
+    call = describe(args, kwargs)
+    if call['action'] in MUTATING_ACTIONS:
+        read_cache().bump(call['config'], call['workspace'])
+
+
+@task_postrun.connect(sender=terraform)
+def observe_result(task=None, args=None, kwargs=None, **kw):
+    """
+    Observes time it took to store result of the task
+    """
+    returned_at = getattr(task.request, 'returned_at', None)
+    if returned_at is not None:
+        call = describe(args, kwargs)
+        metrics.observe(
+            'result', time.monotonic() - returned_at,
+            call['config'], call['workspace'], call['action'])
+
+
+@task_postrun.connect(sender=terraform)
+def call_webhooks(task_id=None, state=None, **kw):
+    """
+    Calls webhooks task was given once it's done. Cancelled tasks
+    have called them themselves
+    """
+    if state not in (RETRY, IGNORED):
+        deliver_webhooks(task_id)
+
+
+@task_postrun.connect(sender=terraform)
+def advance_pipelines(task_id=None, state=None, **kw):
+    """
+    Advances pipeline task was launched for. Result of the task is
+    stored by now, unlike when its link callbacks are sent
+    """
+    if state != RETRY:
+        advance_pipeline_of(task_id)
+
+
+@task_revoked.connect(sender=terraform)
+def record_revoked(request=None, **kwargs):
+    registry = task_registry()
+    registry.record(request.id, REVOKED)
+
+    task = registry.get(request.id)
+    if task.get('config'):
+        task_scheduler().forget(
+            task['config'], task.get('workspace', 'default'), request.id)
+
+    deliver_webhooks(request.id)
+    advance_pipeline_of(request.id)
+
+
+def advance_pipeline_of(task_id):
+    pipeline_id = pipeline_registry().pipeline_of(task_id)
+    if pipeline_id:
+        advance_pipeline.delay(pipeline_id)
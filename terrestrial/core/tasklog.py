@@ -0,0 +1,106 @@
+import logging
+import threading
+
+
+logger = logging.getLogger(__name__)
+
+
+# Returns offset of the first line found at <offset> or after it,
+# along with up to <limit> lines, in a single atomic step
+READ_SCRIPT = """
+local count = tonumber(redis.call('GET', KEYS[2]) or '0')
+local first = count - redis.call('LLEN', KEYS[1])
+local start = math.max(tonumber(ARGV[1]) - first, 0)
+local lines = redis.call('LRANGE', KEYS[1], start, start + tonumber(ARGV[2]) - 1)
+return {first + start, lines}
+"""
+
+
+class TaskLog:
+    """
+    Output of a task kept in Redis line by line while Terraform
+    runs, trimmed to last <max_lines>. Lines are addressed by
+    their offset from the very beginning of the output
+    """
+    def __init__(self, client, task_id, max_lines=100000, ttl=86400,
+                 flush_lines=100, flush_interval=0.5):
+        self.client = client
+        self.key = f'terrestrial:log:{task_id}'
+        self.count_key = f'{self.key}:count'
+        self.max_lines = max_lines
+        self.ttl = ttl
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+
+        self._buffer = []
+        # Lines dropped from buffer while Redis failed, still counted
+        self._dropped = 0
+        self._failing = False
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = None
+
+    def write(self, stream, line):
+        with self._lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self.flush_lines:
+                self._flush()
+
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_periodically, daemon=True)
+                self._flusher.start()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        self._closed.set()
+        self.flush()
+
+    def read(self, offset=0, limit=1000):
+        """
+        Reads up to <limit> lines starting at <offset>,
+        returns them along with offset to continue from
+        """
+        script = self.client.register_script(READ_SCRIPT)
+        first, lines = script(
+            keys=[self.key, self.count_key], args=[offset, limit])
+
+        lines = [l.decode('utf-8', errors='replace') for l in lines]
+        return lines, first + len(lines)
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+
+        pipe = self.client.pipeline()
+        pipe.rpush(self.key, *self._buffer)
+        pipe.ltrim(self.key, -self.max_lines, -1)
+        pipe.incrby(self.count_key, len(self._buffer) + self._dropped)
+        pipe.expire(self.key, self.ttl)
+        pipe.expire(self.count_key, self.ttl)
+        try:
+            pipe.execute()
+        except Exception as e:
+            if not self._failing:
+                logger.warning(f'Failed to flush task log {self.key}: {e}')
+                self._failing = True
+
+            # Keep lines for the next attempt, no more than log itself keeps
+            if len(self._buffer) > self.max_lines:
+                self._dropped += len(self._buffer) - self.max_lines
+                self._buffer = self._buffer[-self.max_lines:]
+            return
+
+        if self._failing:
+            logger.info(f'Flushed task log {self.key} again')
+            self._failing = False
+
+        self._buffer = []
+        self._dropped = 0
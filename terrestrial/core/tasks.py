@@ -1,22 +1,120 @@
 import os
+import hmac
+import json
+import time
+import random
 import signal
+import hashlib
 import logging
+import tempfile
+import threading
 from pathlib import Path
-
-from celery_once import QueueOnce
-from celery.signals import worker_ready
-from celery.states import PENDING, STARTED
+from uuid import uuid4
+from functools import partial
+from contextlib import ExitStack
+from shutil import copy2
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+
+from celery.signals import worker_init, worker_ready, worker_process_shutdown
+from prometheus_client import start_http_server
+from celery.states import SUCCESS, REVOKED
+from celery.exceptions import Ignore
 from celery.utils.log import get_logger, get_task_logger
+from celery.utils.iso8601 import parse_iso8601
+from python_terraform import IsFlagged
 
-from terrestrial.errors import TerrestrialRetryError
+from terrestrial.errors import (
+    TerrestrialRetryError, TerrestrialFatalError, TerrestrialCancelledError,
+    TerrestrialQueueFullError)
 from .celery import app
-from .tfconfig import TerraformConfig
-from .tfworker import TerraformWorker
+from .sandbox import SandboxPool
+from .tfworker import parse_options
+from .initializer import ConfigInitializer
+from .manifest import Manifest, config_digest
+from .tasklog import TaskLog
+from .plugins import PluginCache
+from .artifacts import ArtifactStore
+from .cache import ReadCache
+from .formats import variant
+from .scheduler import Scheduler
+from .registry import TaskRegistry
+from .tfconfig import TerraformConfig, SANDBOX_PREFIX
+from .batches import BatchRegistry
+from .workspaces import WorkspaceIndex
+from .catalog import describe, check_variables
+from .drift import Budget, DriftRegistry
+from . import drift
+from .pipelines import PipelineRegistry
+from .results import get_meta, get_metas, pack, unpack, result_store
+from . import pipelines
+from . import metrics
 
 
 logger = get_logger(__name__)
 task_logger = get_task_logger(__name__)
 
+PLAN_FILE = 'terrestrial.tfplan'
+READ_ONLY_ACTIONS = ['show', 'output']
+MUTATING_ACTIONS = ['apply', 'destroy']
+
+_sandbox_pool = None
+_config_initializer = None
+
+
+def sandbox_pool():
+    """
+    Returns pool of pre-warmed sandboxes of current worker process
+    """
+    global _sandbox_pool
+
+    if _sandbox_pool is None:
+        _sandbox_pool = SandboxPool(
+            size=app.conf.TF_SANDBOX_POOL_SIZE, logger=logger,
+            clone_strategy=app.conf.TF_CLONE_STRATEGY,
+            sandbox_path=app.conf.TF_SANDBOX_PATH,
+            output_tail=app.conf.TF_OUTPUT_TAIL, limits=execution_limits(),
+            workspaces=workspace_index())
+
+    return _sandbox_pool
+
+
+@worker_process_shutdown.connect
+def close_sandbox_pool(*args, **kwargs):
+    if _sandbox_pool is not None:
+        _sandbox_pool.close()
+
+
+@worker_process_shutdown.connect
+def forget_process_metrics(pid=None, *args, **kwargs):
+    metrics.process_dead(pid or os.getpid())
+
+
+@worker_init.connect
+def prepare_plugin_cache(*args, **kwargs):
+    """
+    Sets up provider plugins cache before worker
+    processes are forked, so all of them share it
+    """
+    PluginCache(app.conf.TF_PLUGIN_CACHE_DIR, logger=logger).prepare()
+
+
+@worker_init.connect
+def start_metrics_exporter(*args, **kwargs):
+    """
+    Serves metrics of all worker processes,
+    along with disk usage of worker data
+    """
+    if not app.conf.TF_METRICS_PORT:
+        return
+
+    registry = metrics.registry(metrics.DiskUsageCollector(
+        app.conf.TF_SANDBOX_PATH or tempfile.gettempdir(), f'{SANDBOX_PREFIX}*',
+        plugins=app.conf.TF_PLUGIN_CACHE_DIR, plans=app.conf.TF_PLAN_PATH))
+
+    start_http_server(app.conf.TF_METRICS_PORT, registry=registry)
+    logger.info(f'Serving metrics on port {app.conf.TF_METRICS_PORT}')
+
 
 @worker_ready.connect
 def init(*args, **kwargs):
@@ -27,94 +125,595 @@ def init(*args, **kwargs):
 
     logger.debug(f'Starting configurations initialization')
 
-    for p in Path(app.conf.TF_CONF_PATH).iterdir():
-        if p.is_dir():
-            logger.debug(f'Initializing {p.stem}')
+    paths = [
+        p.absolute() for p in Path(app.conf.TF_CONF_PATH).iterdir()
+        if p.is_dir()]
+
+    config_initializer().reset(p.stem for p in paths)
+
+    if app.conf.TF_INIT_BACKGROUND:
+        threading.Thread(
+            target=init_all, args=(paths,), daemon=True).start()
+        logger.info(
+            'Ready to process tasks, initializing configurations in background')
+    else:
+        init_all(paths, shutdown_on_failure=True)
+
 
-            with TerraformConfig(path=p.absolute(), logger=logger) as c:
-                rc_i, stdout, stderr = c.init()
-                if rc_i != 0:
-                    logger.error(
-                        f'Initialization failed for "{p.stem}"')
+def init_all(paths, shutdown_on_failure=False):
+    start = time.monotonic()
+    failed = config_initializer().initialize_all(paths)
 
-                rc_v, stdout, stderr = c.validate()
-                if rc_v != 0:
-                    logger.error(
-                        f'Configuration "{p.stem}" is invalid')
+    if failed:
+        logger.error(
+            f'Failed to initialize configurations: {", ".join(failed)}')
 
-                if rc_i != 0 or rc_v != 0:
-                    logger.error('Shutting down!')
-                    os.kill(os.getpid(), signal.SIGTERM)
+        if shutdown_on_failure:
+            logger.error('Shutting down!')
+            os.kill(os.getpid(), signal.SIGTERM)
+            return
 
-    logger.info('Initialized. Ready to process tasks')
+    providers = PluginCache(app.conf.TF_PLUGIN_CACHE_DIR).providers()
+    logger.info(
+        f'Provider plugins cached: {", ".join(f"{n} {v}" for n, v in providers)}')
 
+    logger.info(
+        f'Initialized {len(paths) - len(failed)} configurations '
+        f'in {time.monotonic() - start:.2f}s. Ready to process tasks')
 
-@app.task(base=QueueOnce, bind=True)
-def terraform(self, config, action, var={}, workspace='default'):
+    if app.conf.TF_RELOAD_INTERVAL:
+        threading.Thread(
+            target=config_initializer().watch,
+            args=(app.conf.TF_CONF_PATH, app.conf.TF_RELOAD_INTERVAL),
+            daemon=True).start()
+        logger.info(
+            f'Watching {app.conf.TF_CONF_PATH} for configuration changes')
+
+
+def config_initializer():
+    """
+    Returns configurations initializer of current worker process
+    """
+    global _config_initializer
+
+    if _config_initializer is None:
+        _config_initializer = ConfigInitializer(
+            f'{app.conf.TF_DATA_PATH}/ready',
+            manifest=Manifest(f'{app.conf.TF_DATA_PATH}/manifest.json'),
+            concurrency=app.conf.TF_INIT_CONCURRENCY, logger=logger,
+            limits=execution_limits())
+
+    return _config_initializer
+
+
+def execution_limits():
+    """
+    Returns limits every Terraform process runs with
+    """
+    return {
+        'timeout': app.conf.TF_TIMEOUT or None,
+        'memory': app.conf.TF_MEMORY_LIMIT or None,
+        'cpu': app.conf.TF_CPU_LIMIT or None,
+        'grace': app.conf.TF_KILL_GRACE
+    }
+
+
+@app.task(bind=True)
+def terraform(self, config, action, var={}, workspace='default',
+              plan=None, save=False, options=None, reuse=False):
     """
     Performs arbitrary terraform action on configuration
     in <workspace> given corresponding variables as <var>
+    and Terraform <options>.
+    Plan can be <save>d, and applied later by its task ID as <plan>.
+    With <reuse> set, sandbox is taken over from a previous task
+    on the same configuration and left for the next one.
+    Tasks for the same configuration and workspace run one at a time
+    """
+    if task_registry().cancelled(self.request.id):
+        cancel(self, config, workspace)
+
+    # Read-only actions don't wait for their turn, see serialized
+    scheduler = task_scheduler()
+    locked = serialized(action)
+    eta = scheduler.eta(config, workspace, self.request.id) if locked else None
+    if locked and not scheduler.acquire(config, workspace, self.request.id):
+        task_logger.debug(f'{config}/{workspace} is busy, waiting')
+        raise self.retry(
+            countdown=app.conf.TF_LOCK_RETRY_INTERVAL,
+            max_retries=app.conf.TF_QUEUE_TIMEOUT // app.conf.TF_LOCK_RETRY_INTERVAL)
+
+    metrics.observe(
+        'queue_wait', queue_wait(self.request.id), config, workspace, action)
+
+    try:
+        with ExitStack() as stack:
+            if locked:
+                stack.enter_context(
+                    scheduler.keep(config, workspace, self.request.id))
+            result = run_action(
+                self.request.id, config, action, var, workspace, plan, save,
+                parse_options(action, options), reuse=reuse)
+        result = pack_result(self.request.id, result)
+        # Result is stored once task returns, see signals
+        self.request.returned_at = time.monotonic()
+        return result
+    except TerrestrialCancelledError:
+        cancel(self, config, workspace)
+    except TerrestrialRetryError as exc:
+        # Task left the queue taking the lock, it's retried in its place
+        if locked:
+            scheduler.requeue(config, workspace, self.request.id, eta)
+        raise self.retry(exc=exc, countdown=5)
+    finally:
+        if locked:
+            scheduler.release(config, workspace, self.request.id)
+
+
+def serialized(action):
+    """
+    Whether tasks performing <action> take their turn in the queue
+    of their configuration and workspace. Read-only actions run in
+    sandboxes of their own right away, so they neither wait behind
+    applies nor take places of them
+    """
+    return action not in READ_ONLY_ACTIONS
+
+
+def pack_result(task_id, result):
+    """
+    Packs result of task <task_id> for result backend
     """
+    return pack(
+        result, compression=app.conf.TF_RESULT_COMPRESSION,
+        max_bytes=app.conf.TF_RESULT_MAX_BYTES,
+        store=result_store(), name=task_id)
+
+
+def cancel(task, config, workspace):
+    """
+    Marks <task> cancelled on user's request as revoked, giving up
+    its place in the queue of <config> and <workspace>
+    """
+    task_logger.info(f'Task {task.request.id} was cancelled')
+    task.update_state(state=REVOKED)
+    task_registry().record(task.request.id, REVOKED)
+    task_scheduler().forget(config, workspace, task.request.id)
+    deliver_webhooks(task.request.id)
+    raise Ignore()
+
 
+def run_action(task_id, config, action, var, workspace, plan, save, options,
+               reuse=False):
     task_logger.debug(f'Spawning Terraform {action} process for {config}')
 
-    with TerraformWorker(
-        config_path=f'{app.conf.TF_CONF_PATH}/{config}',
-        workspace=workspace, logger=task_logger) as w:
+    initializer = config_initializer()
+    initializer.wait(config, timeout=app.conf.TF_INIT_WAIT_TIMEOUT)
+    generation = initializer.generation(config)
+
+    config_path = f'{app.conf.TF_CONF_PATH}/{config}'
+    pool = sandbox_pool()
+
+    log = TaskLog(
+        app.backend.client, task_id,
+        max_lines=app.conf.TF_LOG_MAX_LINES, ttl=app.conf.TF_LOG_TTL)
+
+    cache = read_cache()
+    if action in READ_ONLY_ACTIONS:
+        state_generation = cache.generation(config, workspace)
+
+    w = pool.acquire(config_path, workspace, generation, switch=reuse)
+    reusable = False
+    try:
+        w.logger = task_logger
+        w.log = log
+        w.cancelled = partial(task_registry().cancelled, task_id)
+        if not reuse:
+            pool.refill(config_path, workspace, generation)
+
+        for phase, seconds in w.timings.items():
+            metrics.observe(phase, seconds, config, workspace, action)
+        w.timings.clear()
+
+        start = time.monotonic()
+        w_action = getattr(w, action)
+        planfile = f'{w.config_path}/{PLAN_FILE}'
+        json_plan = action == 'plan' and options.pop('json', False)
+
+        if action == 'plan' and save:
+            rc, stdout, stderr = save_plan(
+                task_id, w, config, workspace, var, options)
+        elif json_plan:
+            rc, stdout, stderr = w.plan(var=var, out=planfile, **options)
+        elif action == 'apply' and plan:
+            rc, stdout, stderr = apply_plan(
+                plan, w, config, workspace, options)
+        elif action in ['plan', 'apply', 'destroy']:
+            rc, stdout, stderr = w_action(var=var, **options)
+        else:
+            rc, stdout, stderr = w_action(**options)
+
+        # Plan can only be shown as JSON once saved
+        if json_plan and rc == 0:
+            rc, stdout, stderr = w.show(planfile, json=True)
+
+        metrics.observe(
+            'terraform', time.monotonic() - start, config, workspace, action)
+
+        if action in READ_ONLY_ACTIONS and rc == 0 and set(options) <= {'json'}:
+            cache.put(
+                config, workspace, variant(action, options),
+                state_generation, stdout)
+
+        reusable = reuse
+        return rc, stdout, stderr
+    finally:
+        log.close()
+        if reusable:
+            w.log = w.cancelled = None
+            pool.release(w, generation)
+        else:
+            w.close()
+
+
+def queue_wait(task_id):
+    """
+    Returns how long task <task_id> has been waiting since
+    it was queued, or since its ETA if it was delayed
+    """
+    registry = task_registry()
+    queued = registry.queued(task_id)
+    if queued is None:
+        return 0
+
+    eta = registry.get(task_id).get('eta')
+    if eta:
+        queued = max(queued, parse_iso8601(eta).timestamp())
+
+    return max(time.time() - queued, 0)
+
+
+def route_task(name, args, kwargs, options, task=None, **kw):
+    """
+    Sends read-only actions and helper tasks to the fast queue,
+    the rest, drift checks included, to the queue of their
+    configuration, if it has one
+    """
+    if name == detect_drift.name:
+        call = dict(zip(['config'], args or []), action='drift')
+    elif name == terraform.name:
+        call = dict(zip(['config', 'action'], args or []))
+    else:
+        return {'queue': app.conf.TF_FAST_QUEUE}
+
+    call.update(kwargs or {})
+    action = call.get('action')
+
+    if action in READ_ONLY_ACTIONS:
+        queue = app.conf.TF_FAST_QUEUE
+    else:
+        queue = app.conf.TF_CONFIG_QUEUES.get(
+            call.get('config'), app.conf.TF_DEFAULT_QUEUE)
+
+    return {'queue': queue, 'priority': app.conf.TF_PRIORITIES.get(action)}
 
+
+@app.task()
+def list_workspaces(config):
+    """
+    Lists workspaces of configuration, refreshing workspace index
+    """
+    c = TerraformConfig(
+        f'{app.conf.TF_CONF_PATH}/{config}', logger=task_logger,
+        limits=execution_limits())
+    workspaces = c.workspaces()
+
+    workspace_index().replace(config, workspaces)
+    return workspaces
+
+
+@app.task()
+def advance_pipeline(pipeline_id):
+    """
+    Launches nodes of pipeline whose parents all succeeded,
+    called whenever one of its tasks finishes, see signals
+    """
+    registry = pipeline_registry()
+    pipeline = registry.get(pipeline_id)
+    if not pipeline:
+        logger.warning(f'Pipeline {pipeline_id} not found')
+        return
+
+    nodes, tasks, errors = (
+        pipeline['nodes'], pipeline['tasks'], pipeline['errors'])
+    metas = dict(zip(tasks, get_metas(list(tasks.values()))))
+    node_states = pipelines.states(nodes, tasks, errors, metas)
+
+    for name in pipelines.ready(nodes, node_states):
+        task_id = str(uuid4())
+        if not registry.claim(pipeline_id, name, task_id):
+            continue
+
+        node = nodes[name]
         try:
-            w_action = getattr(w, action)
+            var = dict(node['var'], **pipelines.upstream_vars(node, metas))
+            if serialized(node['action']):
+                task_scheduler().admit(
+                    node['config'], node['workspace'], task_id)
+        except (TerrestrialFatalError, TerrestrialQueueFullError) as e:
+            logger.warning(f'Pipeline {pipeline_id} failed to launch {name}: {e}')
+            registry.fail(pipeline_id, name, str(e))
+            continue
 
-            if action in ['plan', 'apply', 'destroy']:
-                rc, stdout, stderr = w_action(var=var)
-            else:
-                rc, stdout, stderr = w_action()
+        try:
+            terraform.apply_async(
+                (node['config'], node['action'], var, node['workspace']),
+                {'options': node['options']}, task_id=task_id)
+        except Exception as e:
+            # Node stays claimed, so it's failed rather than left pending
+            if serialized(node['action']):
+                task_scheduler().forget(
+                    node['config'], node['workspace'], task_id)
+            logger.error(f'Pipeline {pipeline_id} failed to launch {name}: {e}')
+            registry.fail(pipeline_id, name, str(e))
+            continue
+
+        logger.info(f'Pipeline {pipeline_id} launched {name} as {task_id}')
+
+
+def deliver_webhooks(task_id):
+    """
+    Has webhooks task <task_id> was given called, once
+    """
+    for url in task_registry().pop_callbacks(task_id):
+        deliver_webhook.delay(task_id, url)
 
-            return rc, stdout, stderr
-        except TerrestrialRetryError as exc:
-            raise self.retry(exc=exc, countdown=5)
+
+@app.task(bind=True)
+def deliver_webhook(self, task_id, url):
+    """
+    Posts state of finished task <task_id> to <url> as JSON, signed
+    with TF_WEBHOOK_SECRET if it's set. Delivery is retried with
+    growing delays unless <url> rejects it as a bad request
+    """
+    meta = get_meta(task_id)
+    task = task_registry().get(task_id)
+    result = meta['result'] if meta['status'] == SUCCESS else None
+
+    body = json.dumps({
+        'id': task_id,
+        'state': meta['status'],
+        'config': task.get('config'),
+        'workspace': task.get('workspace'),
+        'action': task.get('action'),
+        'rc': result[0] if result else None
+    }).encode()
+
+    headers = {'Content-Type': 'application/json'}
+    if app.conf.TF_WEBHOOK_SECRET:
+        signature = hmac.new(
+            app.conf.TF_WEBHOOK_SECRET.encode(), body, hashlib.sha256)
+        headers['X-Terrestrial-Signature'] = f'sha256={signature.hexdigest()}'
+
+    try:
+        req = Request(url, data=body, headers=headers, method='POST')
+        with urlopen(req, timeout=app.conf.TF_WEBHOOK_TIMEOUT):
+            pass
+    except Exception as e:
+        if isinstance(e, HTTPError) and 400 <= e.code < 500 and e.code != 429:
+            task_logger.error(f'Webhook {url} of task {task_id} rejected: {e}')
+            return False
+
+        task_logger.warning(f'Webhook {url} of task {task_id} failed: {e}')
+        raise self.retry(
+            exc=e, max_retries=app.conf.TF_WEBHOOK_RETRIES,
+            countdown=app.conf.TF_WEBHOOK_RETRY_DELAY * 2 ** self.request.retries)
+
+    task_logger.debug(f'Webhook {url} of task {task_id} delivered')
+    return True
 
 
 @app.task()
-def list_celery_tasks(state=None):
+def schedule_drift(interval=None):
+    """
+    Schedules drift detection over every configuration and workspace,
+    spreading runs over time and skipping pairs whose configuration
+    and state didn't change since their last clean plan. Checks which
+    don't run within <interval> seconds, or TF_DRIFT_TIMEOUT, are dropped
     """
-    Queries Celery for tasks of a given state and
-    simplifies them down to a plain list of IDs
+    registry = drift_registry()
+    cache = read_cache()
+    scheduled = skipped = 0
+
+    paths = sorted(
+        p for p in Path(app.conf.TF_CONF_PATH).iterdir() if p.is_dir())
+    for path in paths:
+        config = path.stem
+        meta = describe(path)
+
+        try:
+            workspaces = workspace_index().get(config) or list_workspaces(config)
+        except Exception as e:
+            logger.error(f'Failed to list workspaces of "{config}": {e}')
+            continue
+
+        try:
+            # Drift can only be planned with variables configuration has
+            check_variables(meta, {}, app.conf.TF_ENV_VARIABLES)
+        except TerrestrialFatalError as e:
+            for w in workspaces:
+                registry.record(config, w, drift.SKIPPED, reason=str(e))
+            continue
+
+        digest = config_digest(path)
+        for w in workspaces:
+            if drift.unchanged(
+                    registry.get(config, w), digest,
+                    cache.generation(config, w), app.conf.TF_DRIFT_RECHECK):
+                skipped += 1
+                continue
+
+            # Checks queue for their workspace once they get drift
+            # detection budget, not to hold user tasks back meanwhile
+            delay = random.uniform(0, app.conf.TF_DRIFT_JITTER)
+            detect_drift.apply_async(
+                (config, w, meta['providers'],
+                 time.time() + (interval or app.conf.TF_DRIFT_TIMEOUT)),
+                countdown=delay)
+            scheduled += 1
+
+    logger.info(
+        f'Scheduled {scheduled} drift checks, '
+        f'skipped {skipped} unchanged workspaces')
+
+
+@app.task(bind=True, max_retries=None)
+def detect_drift(self, config, workspace, providers=(), deadline=None):
+    """
+    Plans configuration in <workspace> within drift detection budget,
+    recording whether infrastructure drifted from the configuration.
+    Checks which didn't get to run by <deadline> are left to the next
+    round
     """
-    allowed_states = [PENDING, STARTED]
-    if state and state not in allowed_states:
-        raise ValueError(
-            f'state must be in {allowed_states}')
+    limits = {'global': app.conf.TF_DRIFT_CONCURRENCY}
+    limits.update({
+        f'provider:{p}': app.conf.TF_DRIFT_PROVIDER_CONCURRENCY
+        for p in providers})
+
+    budget = drift_budget()
+    scheduler = task_scheduler()
+    if deadline and time.time() > deadline:
+        drift_registry().record(
+            config, workspace, drift.SKIPPED, task_id=self.request.id,
+            reason='Did not get to run within drift detection interval')
+        scheduler.forget(config, workspace, self.request.id)
+        budget.release(self.request.id, limits)
+        return None
 
-    def parse_tasks(tasks, parsed):
-        if not tasks:
-            raise ValueError(
-                'no workers connected?')
+    if not budget.acquire(self.request.id, limits):
+        task_logger.debug(f'Drift budget is spent, {config}/{workspace} waits')
+        raise self.retry(
+            countdown=app.conf.TF_LOCK_RETRY_INTERVAL * random.uniform(1, 3))
 
-        w_tasks = []
-        if isinstance(tasks, list):
-            for t in tasks:
-                parse_tasks(t)
+    # Budget slots are kept while waiting for the workspace, and only
+    # checks holding them take a place in its queue
+    try:
+        scheduler.admit(config, workspace, self.request.id)
+    except TerrestrialQueueFullError:
+        budget.release(self.request.id, limits)
+        task_logger.debug(f'{config}/{workspace} is busy, drift check waits')
+        raise self.retry(countdown=app.conf.TF_LOCK_RETRY_INTERVAL)
 
-        worker = list(tasks.keys())[0]
-        logger.debug(f'Listing tasks of a worker "{worker}"')
+    if not scheduler.acquire(config, workspace, self.request.id):
+        raise self.retry(countdown=app.conf.TF_LOCK_RETRY_INTERVAL)
 
-        if tasks[worker]:
-            w_tasks = [t['request']['id'] for t in tasks[worker]]
+    try:
+        generation = read_cache().generation(config, workspace)
+        digest = config_digest(f'{app.conf.TF_CONF_PATH}/{config}')
+        with scheduler.keep(config, workspace, self.request.id):
+            rc, stdout, stderr = run_action(
+                self.request.id, config, 'plan', {}, workspace, None, False,
+                {'detailed_exitcode': IsFlagged})
+    except TerrestrialRetryError as exc:
+        raise self.retry(exc=exc, countdown=5)
+    finally:
+        scheduler.release(config, workspace, self.request.id)
+        budget.release(self.request.id, limits)
 
-        parsed.update(w_tasks)
+    # Plan exits with 2 once there are changes to apply
+    status = {0: drift.CLEAN, 2: drift.DRIFTED}.get(rc, drift.FAILED)
+    drift_registry().record(
+        config, workspace, status, task_id=self.request.id,
+        digest=digest, generation=generation,
+        summary=drift.summarize(stdout) if status != drift.FAILED
+        else stderr[-1000:])
+    task_logger.info(f'{config}/{workspace} drift check: {status}')
 
-    inspect = app.control.inspect()
-    parsed = set()
+    return pack_result(self.request.id, (rc, stdout, stderr))
+
+
+def drift_registry():
+    return DriftRegistry(app.backend.client)
+
+
+def drift_budget():
+    return Budget(app.backend.client, ttl=app.conf.TF_LOCK_TIMEOUT)
+
+
+def pipeline_registry():
+    return PipelineRegistry(app.backend.client, ttl=app.conf.TF_REGISTRY_TTL)
+
+
+def workspace_index():
+    return WorkspaceIndex(
+        app.backend.client, ttl=app.conf.TF_WORKSPACE_INDEX_TTL)
+
+
+def batch_registry():
+    return BatchRegistry(app.backend.client, ttl=app.conf.TF_REGISTRY_TTL)
+
+
+def task_registry():
+    return TaskRegistry(app.backend.client, ttl=app.conf.TF_REGISTRY_TTL)
+
+
+def task_scheduler():
+    return Scheduler(
+        app.backend.client, max_depth=app.conf.TF_QUEUE_DEPTH,
+        lock_timeout=app.conf.TF_LOCK_TIMEOUT,
+        queue_timeout=app.conf.TF_QUEUE_TIMEOUT)
+
+
+def read_cache():
+    return ReadCache(app.backend.client, ttl=app.conf.TF_READ_CACHE_TTL)
+
+
+def plan_store():
+    return ArtifactStore(
+        app.conf.TF_PLAN_PATH, ttl=app.conf.TF_PLAN_TTL,
+        max_size=app.conf.TF_PLAN_STORE_SIZE, logger=logger)
+
+
+def save_plan(plan_id, w, config, workspace, var, options):
+    """
+    Runs plan saving it to plans store as <plan_id>
+    """
+    planfile = f'{w.config_path}/{PLAN_FILE}'
+    rc, stdout, stderr = w.plan(var=var, out=planfile, **options)
+
+    if rc == 0:
+        plan_store().put(plan_id, planfile, meta={
+            'config': config,
+            'workspace': workspace,
+            'var': hashlib.sha256(
+                json.dumps(var, sort_keys=True).encode()).hexdigest(),
+            'digest': w.config.digest()
+        })
+        task_logger.debug(f'Saved plan {plan_id}')
+
+    return rc, stdout, stderr
+
+
+def apply_plan(plan_id, w, config, workspace, options):
+    """
+    Applies plan previously saved as <plan_id>
+    """
+    saved = plan_store().get(plan_id)
+    if not saved:
+        raise TerrestrialFatalError(f'Plan {plan_id} not found or expired')
 
-    if state == STARTED or state is None:
-        parse_tasks(inspect.active(), parsed)
+    path, meta = saved
+    if (meta['config'], meta['workspace']) != (config, workspace):
+        raise TerrestrialFatalError(
+            f'Plan {plan_id} was made for "{meta["config"]}" '
+            f'in "{meta["workspace"]}" workspace')
 
-    if state == PENDING or state is None:
-        parse_tasks(inspect.reserved(), parsed)
-        parse_tasks(inspect.scheduled(), parsed)
+    if meta['digest'] != w.config.digest():
+        raise TerrestrialFatalError(
+            f'Configuration "{config}" changed since plan {plan_id} was made')
 
-    return '\n'.join(parsed)
+    planfile = copy2(path, f'{w.config_path}/{PLAN_FILE}')
+    return w.apply(planfile, **options)
 
 
 @app.task(bind=True)
@@ -126,4 +725,4 @@ def get_task_state(self, task_id):
 @app.task(bind=True)
 def get_task_result(self, task_id):
     task = self.AsyncResult(task_id)
-    return task.result
+    return unpack(task.result, result_store())
@@ -1,18 +1,48 @@
+import re
 import logging
 from pathlib import Path
+from functools import lru_cache
 from tempfile import mkdtemp
-from shutil import copytree, rmtree
+from shutil import rmtree
 
 from python_terraform import Terraform, IsFlagged
 
 from terrestrial.errors import TerrestrialFatalError
+from .clone import CLONE_STRATEGIES
+from .manifest import config_digest
+from . import executor
+
+
+SANDBOX_PREFIX = 'terrestrial-'
+VERSION_EXPR = re.compile(r'^Terraform v(\d+)\.(\d+)\.(\d+)', re.MULTILINE)
+
+
+@lru_cache()
+def terraform_version():
+    """
+    Returns (major, minor, patch) version of Terraform found in PATH,
+    or None if it can't be told
+    """
+    try:
+        rc, stdout, stderr = executor.run(['terraform', 'version'], timeout=30)
+    except Exception as e:
+        logging.getLogger(__name__).warning(
+            f'Failed to tell Terraform version: {e}')
+        return None
+
+    m = re.search(VERSION_EXPR, stdout)
+    return tuple(int(v) for v in m.groups()) if m else None
 
 
 class TerraformConfig:
-    def __init__(self, path, logger=None):
+    def __init__(self, path, logger=None,
+                 clone_strategy='copy', sandbox_path=None, limits=None):
         self.logger = logger or logging.getLogger(__name__)
         self.path = path
         self.name = Path(path).stem
+        self.clone_strategy = clone_strategy
+        self.sandbox_path = sandbox_path
+        self.limits = limits or {}
 
         self._clone_path = None
 
@@ -28,10 +58,26 @@ class TerraformConfig:
 
         self._path = p
 
+    @property
+    def clone_strategy(self):
+        return self._clone_strategy
+
+    @clone_strategy.setter
+    def clone_strategy(self, s):
+        if s not in CLONE_STRATEGIES:
+            raise TerrestrialFatalError(
+                f'Clone strategy must be one of {list(CLONE_STRATEGIES)}')
+
+        self._clone_strategy = s
+
     def clone(self):
         if not self._clone_path:
-            self._clone_path = copytree(
-                self.path, f'{mkdtemp()}/{self.name}')
+            if self.sandbox_path:
+                Path(self.sandbox_path).mkdir(parents=True, exist_ok=True)
+
+            clone = CLONE_STRATEGIES[self.clone_strategy]
+            self._clone_path = clone(
+                self.path, f'{mkdtemp(prefix=SANDBOX_PREFIX, dir=self.sandbox_path)}/{self.name}')
 
         return self._clone_path
 
@@ -39,9 +85,16 @@ class TerraformConfig:
         if self._clone_path and Path(self._clone_path).exists():
             rmtree(Path(self._clone_path).parent)
 
+    def digest(self):
+        return config_digest(self.path)
+
     def _tfcmd(self, cmd, **kwargs):
         tf = Terraform(working_dir=self.path)
-        return tf.cmd(cmd, no_color=IsFlagged, **kwargs)
+        cmds = tf.generate_cmd_string(cmd, no_color=IsFlagged, **kwargs)
+        try:
+            return executor.run(cmds, cwd=self.path, **self.limits)
+        finally:
+            tf.temp_var_files.clean_up()
 
     def init(self):
         return self._tfcmd('init')
@@ -49,6 +102,14 @@ class TerraformConfig:
     def validate(self):
         return self._tfcmd('validate', check_variables=False)
 
+    def workspaces(self):
+        rc, stdout, stderr = self._tfcmd('workspace list')
+        if rc != 0:
+            raise TerrestrialFatalError(
+                f'Failed to list workspaces of "{self.name}": {stderr}')
+
+        return [w.strip('* ') for w in stdout.splitlines() if w.strip('* ')]
+
     def __enter__(self):
         return self
 
@@ -1,12 +1,18 @@
 import re
+import time
 import logging
+from pathlib import Path
 
 from python_terraform import Terraform, IsFlagged
 
 from terrestrial.errors import TerrestrialFatalError
 from .tfconfig import TerraformConfig
+from . import executor
 
 
+# Commands whose output is their result, so it's never cut down
+FULL_OUTPUT = ['show', 'output']
+
 KWARGS_MAPPING = {
     'plan': {
         'input': False
@@ -21,11 +27,86 @@ KWARGS_MAPPING = {
     }
 }
 
+# Terraform options which can be passed along with an action
+OPTIONS = {
+    'target': ['plan', 'apply', 'destroy'],
+    'parallelism': ['plan', 'apply', 'destroy'],
+    'refresh': ['plan', 'apply', 'destroy'],
+    'lock_timeout': ['plan', 'apply', 'destroy'],
+    'json': ['show', 'output', 'plan']
+}
+
+TARGET_EXPR = re.compile(r'^[\w\-.\[\]"]{1,512}$')
+LOCK_TIMEOUT_EXPR = re.compile(r'^\d{1,6}(ms|s|m|h)$')
+MISSING_WORKSPACE_EXPR = re.compile(
+    r'workspace.{0,300}(does not|doesn\'t) exist', re.IGNORECASE | re.DOTALL)
+MAX_PARALLELISM = 256
+
+
+def parse_options(action, options):
+    """
+    Validates Terraform <options> given to <action> against allowed
+    ones, returns them as keyword arguments of the action
+    """
+    kwargs = {}
+
+    for name, values in (options or {}).items():
+        if action not in OPTIONS.get(name, []):
+            raise TerrestrialFatalError(
+                f'Option "{name}" is not supported by {action}')
+
+        values = [str(v) for v in (values if isinstance(values, list) else [values])]
+        if name != 'target' and len(values) != 1:
+            raise TerrestrialFatalError(f'Option "{name}" takes a single value')
+
+        if name == 'target':
+            for v in values:
+                if not re.match(TARGET_EXPR, v):
+                    raise TerrestrialFatalError(f'Invalid target address: {v}')
+            kwargs['target'] = values
+        elif name == 'parallelism':
+            try:
+                parallelism = int(values[0])
+            except ValueError:
+                parallelism = 0
+            if not 0 < parallelism <= MAX_PARALLELISM:
+                raise TerrestrialFatalError(
+                    f'Parallelism must be an integer from 1 to {MAX_PARALLELISM}')
+            kwargs['parallelism'] = parallelism
+        elif name in ['refresh', 'json']:
+            if values[0].lower() not in ['true', 'false']:
+                raise TerrestrialFatalError(
+                    f'Option "{name}" must be either true or false')
+            kwargs[name] = values[0].lower() == 'true'
+        elif name == 'lock_timeout':
+            if not re.match(LOCK_TIMEOUT_EXPR, values[0]):
+                raise TerrestrialFatalError(
+                    'Lock timeout must be a duration, like 30s or 5m')
+            kwargs['lock_timeout'] = values[0]
+
+    return kwargs
+
 
 class TerraformWorker:
-    def __init__(self, config_path, workspace, isolate=True, logger=None):
+    def __init__(self, config_path, workspace, isolate=True, logger=None,
+                 clone_strategy='copy', sandbox_path=None,
+                 log=None, output_tail=None, limits=None, workspaces=None):
         self.logger = logger or logging.getLogger(__name__)
+        # Seconds spent cloning and switching workspace, until collected
+        self.timings = {}
+        self.log = log
+        self.output_tail = output_tail
+        # Arguments of executor.run limiting every Terraform process
+        self.limits = limits or {}
+        # Returns True once task running actions is cancelled
+        self.cancelled = None
+        # Index of workspaces known to exist, to switch without Terraform
+        self.workspaces = workspaces
+        # Whether the workspace was selected from the index, unconfirmed
+        self.assumed = False
         self.isolate = isolate
+        self.clone_strategy = clone_strategy
+        self.sandbox_path = sandbox_path
         self.config_path = config_path
         self.tf = Terraform(working_dir=self.config_path)
         self.workspace = workspace
@@ -37,24 +118,55 @@ class TerraformWorker:
             if item in KWARGS_MAPPING:
                 kwargs.update(KWARGS_MAPPING[item])
 
-            rc, stdout, stderr = self.tf.cmd(
-                item, *args, **kwargs)
-
-            return rc, stdout.strip(), stderr.strip()
+            return self._run(item, *args, **kwargs)
 
         return wrapper
 
+    def _run(self, cmd, *args, **kwargs):
+        cmds = self.tf.generate_cmd_string(cmd, *args, **kwargs)
+        try:
+            rc, stdout, stderr = executor.run(
+                cmds, cwd=self.config_path,
+                on_output=self.log.write if self.log else None,
+                tail=None if cmd in FULL_OUTPUT else self.output_tail,
+                cancelled=self.cancelled,
+                **self.limits)
+        finally:
+            self.tf.temp_var_files.clean_up()
+
+        if rc != 0 and self.assumed and re.search(MISSING_WORKSPACE_EXPR, stderr):
+            # Index is stale, create the workspace and run the command again
+            self.logger.warning(
+                f'Workspace {self.workspace} is missing, creating it')
+            self.assumed = False
+            self.workspaces.remove(self.config.name, self.workspace)
+            self._create(self.workspace)
+            return self._run(cmd, *args, **kwargs)
+
+        if rc == 0:
+            self.assumed = False
+
+        return rc, stdout.strip(), stderr.strip()
+
+    @property
+    def config(self):
+        return self._config
+
     @property
     def config_path(self):
         return self._config_path
 
     @config_path.setter
     def config_path(self, c):
-        self._config = TerraformConfig(c)
+        start = time.monotonic()
+        self._config = TerraformConfig(
+            c, clone_strategy=self.clone_strategy,
+            sandbox_path=self.sandbox_path, limits=self.limits)
         if self.isolate:
             self._config_path = self._config.clone()
         else:
             self._config_path = self._config.path
+        self.timings['clone'] = time.monotonic() - start
 
     @property
     def workspace(self):
@@ -68,25 +180,54 @@ class TerraformWorker:
             raise TerrestrialFatalError(
                 'Workspace name must contain only URL safe characters.')
 
-        rc, stdout, stderr = self.tf.cmd(
-            'workspace', 'new', w, '-no-color')
+        start = time.monotonic()
+        self.assumed = False
+        if w == 'default':
+            self._select(w)
+        elif self.workspaces and self.workspaces.contains(self.config.name, w):
+            self._select(w)
+            self.assumed = True
+        else:
+            self._create(w)
 
-        if rc != 0:
-            if 'already exists' in stderr:
-                rc, stdout, stderr = self.tf.cmd(
-                    'workspace', 'select', w ,'-no-color')
+        self.logger.debug(f'Switched workspace to {w}')
 
-                if rc != 0:
-                    raise TerrestrialFatalError(
-                        f'Failed to set workspace to {self.workspace}')
+        self._workspace = w
+        self.timings['workspace'] = time.monotonic() - start
 
-        self.logger.debug(
-            f'Switched workspace to {self.workspace}')
+    def _create(self, w):
+        """
+        Creates workspace <w>, or selects it if it already exists
+        """
+        rc, stdout, stderr = self._run('workspace', 'new', w, '-no-color')
 
-        self._workspace = w
+        if rc != 0:
+            if 'already exists' not in stderr:
+                raise TerrestrialFatalError(
+                    f'Failed to set workspace to {w}: {stderr}')
+            self._select(w)
+
+        if self.workspaces:
+            self.workspaces.add(self.config.name, w)
+
+    def _select(self, w):
+        """
+        Selects existing workspace <w> the way "terraform workspace
+        select" does, without running it
+        """
+        path = Path(self.config_path, '.terraform')
+        path.mkdir(exist_ok=True)
+
+        # File may be hardlinked to the original configuration, replace it
+        tmp = path / '.environment'
+        tmp.write_text(w)
+        tmp.rename(path / 'environment')
+
+    def close(self):
+        self._config.close()
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_t, exc_v, traceback):
-        self._config.close()
+        self.close()
@@ -0,0 +1,51 @@
+class WorkspaceIndex:
+    """
+    Workspaces known to exist in every configuration. Workspaces
+    are added once created or found by tasks, removed once found
+    missing, and replaced as a whole once listed by Terraform.
+    Listing is trusted to be complete for <ttl> seconds
+    """
+    KEY = 'terrestrial:workspaces'
+
+    def __init__(self, client, ttl=3600):
+        self.client = client
+        self.ttl = ttl
+
+    def get(self, config):
+        """
+        Returns workspaces of <config>, or None if they weren't
+        listed lately
+        """
+        pipe = self.client.pipeline()
+        pipe.exists(self._key(config, 'listed'))
+        pipe.smembers(self._key(config))
+        listed, workspaces = pipe.execute()
+
+        if not listed:
+            return None
+
+        return sorted(w.decode() for w in workspaces)
+
+    def replace(self, config, workspaces):
+        pipe = self.client.pipeline()
+        pipe.delete(self._key(config))
+        if workspaces:
+            pipe.sadd(self._key(config), *workspaces)
+            pipe.expire(self._key(config), self.ttl)
+        pipe.set(self._key(config, 'listed'), 1, ex=self.ttl)
+        pipe.execute()
+
+    def add(self, config, workspace):
+        pipe = self.client.pipeline()
+        pipe.sadd(self._key(config), workspace)
+        pipe.expire(self._key(config), self.ttl)
+        pipe.execute()
+
+    def remove(self, config, workspace):
+        self.client.srem(self._key(config), workspace)
+
+    def contains(self, config, workspace):
+        return bool(self.client.sismember(self._key(config), workspace))
+
+    def _key(self, config, name=None):
+        return f'{self.KEY}:{config}:{name}' if name else f'{self.KEY}:{config}'
@@ -8,3 +8,15 @@ class TerrestrialRetryError(TerrestrialError):
 
 class TerrestrialFatalError(TerrestrialError):
     pass
+
+
+class TerrestrialQueueFullError(TerrestrialError):
+    pass
+
+
+class TerrestrialTimeoutError(TerrestrialFatalError):
+    pass
+
+
+class TerrestrialCancelledError(TerrestrialError):
+    pass
@@ -0,0 +1,81 @@
+import time
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+
+from celery.backends.redis import RedisBackend
+
+from terrestrial.api import celery as celery_api
+import terrestrial.config as config
+from terrestrial.api import api
+from terrestrial.core.celery import app
+
+from .helpers import REDIS_URL, redis_client, requires_redis
+
+
+@requires_redis
+class TestStreamStates(unittest.TestCase):
+    '''
+    Streams task states as result backend stores them
+    '''
+    def setUp(self):
+        redis_client().flushdb()
+        self.backend = RedisBackend(app=app, url=REDIS_URL)
+
+        patches = [
+            patch.object(celery_api, 'app', MagicMock(backend=self.backend)),
+            patch.object(celery_api, 'get_metas', lambda ids: [
+                self.backend.get_task_meta(t) for t in ids]),
+            patch.object(config, 'API_EVENTS_KEEPALIVE', 0.1)
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+
+    def stream(self, query):
+        with api.test_request_context(f'/api/v1/tasks/events?{query}'):
+            response = celery_api.stream_states()
+            if isinstance(response, tuple):
+                return response
+            return list(response.response)
+
+
+    def store_later(self, *results):
+        def store():
+            for task_id, state in results:
+                time.sleep(0.2)
+                self.backend.store_result(task_id, None, state)
+
+        thread = threading.Thread(target=store)
+        thread.start()
+        self.addCleanup(thread.join)
+
+
+    def test_stream(self):
+        self.backend.store_result('a', None, 'STARTED')
+        self.store_later(('a', 'STARTED'), ('b', 'STARTED'), ('a', 'SUCCESS'),
+                         ('b', 'FAILURE'))
+
+        events = [e for e in self.stream('id=a&id=b') if e.startswith('event')]
+        self.assertEqual(events, [
+            'event: state\ndata: a STARTED\n\n',
+            'event: state\ndata: b PENDING\n\n',
+            'event: state\ndata: b STARTED\n\n',
+            'event: state\ndata: a SUCCESS\n\n',
+            'event: state\ndata: b FAILURE\n\n'])
+
+
+    def test_done(self):
+        self.backend.store_result('a', None, 'SUCCESS')
+        self.assertEqual(
+            self.stream('id=a'), ['event: state\ndata: a SUCCESS\n\n'])
+
+
+    def test_keepalive(self):
+        self.store_later(('a', 'SUCCESS'))
+        self.assertIn(': keepalive\n\n', self.stream('id=a'))
+
+
+    def test_no_ids(self):
+        self.assertEqual(self.stream('')[1], 500)
@@ -0,0 +1,54 @@
+import os
+import time
+import unittest
+from pathlib import Path
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from terrestrial.core.artifacts import ArtifactStore
+
+
+class TestArtifactStore(unittest.TestCase):
+    '''
+    Stores, expires and evicts fake plan files
+    '''
+    def setUp(self):
+        self.tmp = mkdtemp()
+        self.src = Path(self.tmp, 'test.tfplan')
+        self.src.write_bytes(b'0' * 1024)
+
+
+    def tearDown(self):
+        rmtree(self.tmp)
+
+
+    def test_put_get(self):
+        store = ArtifactStore(f'{self.tmp}/store')
+        store.put('plan', self.src, meta={'config': 'test'})
+
+        path, meta = store.get('plan')
+        self.assertEqual(path.read_bytes(), self.src.read_bytes())
+        self.assertEqual(meta, {'config': 'test'})
+
+
+    def test_expired(self):
+        store = ArtifactStore(f'{self.tmp}/store', ttl=60)
+        path = store.put('plan', self.src)
+
+        past = time.time() - 120
+        os.utime(path, (past, past))
+        self.assertIsNone(store.get('plan'))
+
+
+    def test_evict_least_recently_used(self):
+        store = ArtifactStore(f'{self.tmp}/store', max_size=2048)
+        for name in ['first', 'second']:
+            path = store.put(name, self.src)
+            past = time.time() - 10
+            os.utime(path, (past, time.time()))
+        store.get('first')
+
+        store.put('third', self.src)
+        self.assertIsNotNone(store.get('first'))
+        self.assertIsNone(store.get('second'))
+        self.assertIsNotNone(store.get('third'))
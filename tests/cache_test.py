@@ -0,0 +1,60 @@
+import unittest
+
+from terrestrial.core.cache import ReadCache, etag
+
+from .helpers import redis_client, requires_redis
+
+
+@requires_redis
+class TestReadCache(unittest.TestCase):
+    '''
+    Caches read-only results until state could have changed
+    '''
+    def setUp(self):
+        self.client = redis_client()
+        self.client.flushdb()
+        self.cache = ReadCache(self.client)
+
+
+    def test_get(self):
+        self.assertIsNone(self.cache.get('network', 'default', 'output'))
+
+        self.cache.put('network', 'default', 'output', 0, '{"vpc": 1}')
+        entry = self.cache.get('network', 'default', 'output')
+
+        self.assertEqual(entry['stdout'], '{"vpc": 1}')
+        self.assertEqual(entry['etag'], etag('{"vpc": 1}'))
+        self.assertIsNone(self.cache.get('network', 'staging', 'output'))
+        self.assertIsNone(self.cache.get('network', 'default', 'show'))
+
+
+    def test_bump(self):
+        self.cache.put('network', 'default', 'output', 0, 'old')
+        self.cache.bump('network', 'default')
+
+        self.assertEqual(self.cache.generation('network', 'default'), 1)
+        self.assertIsNone(self.cache.get('network', 'default', 'output'))
+
+        self.cache.put('network', 'default', 'output', 1, 'new')
+        self.assertEqual(
+            self.cache.get('network', 'default', 'output')['stdout'], 'new')
+
+
+    def test_stale_put(self):
+        # Output produced before an apply finished isn't cached
+        generation = self.cache.generation('network', 'default')
+        self.cache.bump('network', 'default')
+        self.cache.put('network', 'default', 'output', generation, 'old')
+
+        self.assertIsNone(self.cache.get('network', 'default', 'output'))
+
+
+    def test_disabled(self):
+        cache = ReadCache(self.client, ttl=0)
+        cache.put('network', 'default', 'output', 0, 'out')
+        self.assertIsNone(cache.get('network', 'default', 'output'))
+
+
+    def test_etag(self):
+        self.assertEqual(etag('out'), etag('out'))
+        self.assertNotEqual(etag('out'), etag('other'))
@@ -0,0 +1,57 @@
+import unittest
+from pathlib import Path
+from tempfile import mkdtemp
+from shutil import rmtree, copytree
+
+from terrestrial.core.catalog import Catalog, describe, check_variables
+from terrestrial.errors import TerrestrialFatalError
+
+
+class TestCatalog(unittest.TestCase):
+    '''
+    Describes configurations from their files and validates
+    variables against them
+    '''
+    def setUp(self):
+        self.tmp = mkdtemp()
+        copytree(
+            Path(__file__).parents[0] / 'configurations',
+            f'{self.tmp}/configurations')
+
+
+    def tearDown(self):
+        rmtree(self.tmp)
+
+
+    def test_describe(self):
+        meta = describe(f'{self.tmp}/configurations/valid-unset')
+
+        self.assertEqual(meta['name'], 'valid-unset')
+        self.assertTrue(meta['variables']['test']['required'])
+        self.assertEqual(meta['providers'], ['null'])
+        self.assertEqual(meta['errors'], [])
+
+
+    def test_check_variables(self):
+        meta = describe(f'{self.tmp}/configurations/valid-unset')
+        check_variables(meta, {'test': 'value'})
+
+        for var in [{}, {'test': 'value', 'unknown': 'value'}]:
+            with self.assertRaises(TerrestrialFatalError):
+                check_variables(meta, var)
+
+        # Workers pass it from their environment
+        check_variables(meta, {}, provided=['test'])
+
+
+    def test_refresh(self):
+        catalog = Catalog(f'{self.tmp}/configurations', interval=0)
+        self.assertEqual(catalog.names(), ['invalid', 'valid', 'valid-unset'])
+        self.assertEqual(catalog.get('valid')['variables'], {})
+
+        path = Path(self.tmp, 'configurations', 'valid', 'variables.tf')
+        path.write_text('variable "size" { default = "small" }\n')
+        Path(self.tmp, 'configurations', 'new').mkdir()
+
+        self.assertIn('new', catalog.names())
+        self.assertFalse(catalog.get('valid')['variables']['size']['required'])
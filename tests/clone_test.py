@@ -0,0 +1,57 @@
+import os
+import unittest
+from pathlib import Path
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from terrestrial.core.clone import copy_tree, link_tree
+
+
+class TestCloneStrategies(unittest.TestCase):
+    '''
+    Clones a fake initialized configuration
+    using every clone strategy available
+    '''
+    @classmethod
+    def setUpClass(self):
+        self.tmp = mkdtemp()
+        self.config = Path(self.tmp, 'config')
+
+        plugins = self.config / '.terraform' / 'plugins'
+        plugins.mkdir(parents=True)
+        (plugins / 'terraform-provider-null').write_text('binary')
+
+        cache = Path(self.tmp, 'plugin-cache')
+        cache.mkdir()
+        (cache / 'terraform-provider-template').write_text('binary')
+        (plugins / 'terraform-provider-template').symlink_to(
+            cache / 'terraform-provider-template')
+
+        (self.config / '.terraform' / 'environment').write_text('default')
+        (self.config / 'test.tf').write_text('resource null_resource "dummy" {}')
+
+
+    @classmethod
+    def tearDownClass(self):
+        rmtree(self.tmp)
+
+
+    def test_copy_tree(self):
+        clone = copy_tree(self.config, f'{self.tmp}/copy')
+        self.assertEqual(
+            sorted(os.listdir(self.config)), sorted(os.listdir(clone)))
+        self.assertFalse(Path(clone, '.terraform', 'plugins').is_symlink())
+        self.assertTrue(Path(
+            clone, '.terraform', 'plugins', 'terraform-provider-template').is_symlink())
+
+
+    def test_link_tree(self):
+        clone = link_tree(self.config, f'{self.tmp}/link')
+        self.assertEqual(
+            sorted(os.listdir(self.config)), sorted(os.listdir(clone)))
+
+        self.assertTrue(Path(clone, '.terraform', 'plugins').is_symlink())
+        self.assertTrue(Path(
+            clone, 'test.tf').samefile(self.config / 'test.tf'))
+        self.assertFalse(Path(clone, '.terraform', 'environment').samefile(
+            self.config / '.terraform' / 'environment'))
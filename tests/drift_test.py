@@ -0,0 +1,105 @@
+import time
+import unittest
+from unittest.mock import patch
+
+from celery.exceptions import Retry
+
+from terrestrial.core import drift, tasks
+from terrestrial.core.scheduler import Scheduler
+
+from .helpers import redis_client, requires_redis
+
+
+class TestDrift(unittest.TestCase):
+    '''
+    Summarizes drift checks and tells which of them can be skipped
+    '''
+    def test_summarize(self):
+        stdout = 'Refreshing state...\n\nPlan: 1 to add, 0 to change, 0 to destroy.\n'
+        self.assertEqual(
+            drift.summarize(stdout), 'Plan: 1 to add, 0 to change, 0 to destroy.')
+        self.assertIsNone(drift.summarize('No changes. Infrastructure is up-to-date.'))
+
+
+    def test_unchanged(self):
+        entry = {
+            'status': drift.CLEAN, 'digest': 'abc', 'generation': 1,
+            'checked': time.time()}
+
+        self.assertTrue(drift.unchanged(entry, 'abc', 1, recheck=3600))
+        self.assertFalse(drift.unchanged(None, 'abc', 1, recheck=3600))
+        self.assertFalse(drift.unchanged(entry, 'def', 1, recheck=3600))
+        self.assertFalse(drift.unchanged(entry, 'abc', 2, recheck=3600))
+        self.assertFalse(drift.unchanged(entry, 'abc', 1, recheck=0))
+        self.assertFalse(drift.unchanged(
+            dict(entry, status=drift.DRIFTED), 'abc', 1, recheck=3600))
+
+
+@requires_redis
+class TestDriftBudget(unittest.TestCase):
+    '''
+    Queues drift checks for their workspace only within the budget
+    '''
+    def setUp(self):
+        self.client = redis_client()
+        self.client.flushdb()
+        self.budget = drift.Budget(self.client)
+        self.scheduler = Scheduler(self.client)
+
+        patches = [
+            patch.object(tasks, 'drift_budget', lambda: self.budget),
+            patch.object(tasks, 'task_scheduler', lambda: self.scheduler),
+            patch.object(tasks.detect_drift, 'retry', side_effect=Retry)
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+        concurrency = tasks.app.conf.TF_DRIFT_CONCURRENCY
+        tasks.app.conf.TF_DRIFT_CONCURRENCY = 1
+        self.addCleanup(
+            setattr, tasks.app.conf, 'TF_DRIFT_CONCURRENCY', concurrency)
+
+
+    def detect(self, task_id, deadline=None):
+        tasks.detect_drift.push_request(id=task_id)
+        try:
+            return tasks.detect_drift.run('network', 'default', deadline=deadline)
+        finally:
+            tasks.detect_drift.pop_request()
+
+
+    def test_spent_budget(self):
+        self.budget.acquire('other', {'global': 1})
+
+        with self.assertRaises(Retry):
+            self.detect('check')
+        self.assertEqual(self.scheduler.depth('network', 'default'), 0)
+
+
+    def test_busy_workspace(self):
+        self.scheduler.admit('network', 'default', 'user')
+        self.scheduler.acquire('network', 'default', 'user')
+
+        with self.assertRaises(Retry):
+            self.detect('check')
+        self.assertEqual(self.scheduler.depth('network', 'default'), 1)
+
+        # Slot is kept while waiting for the workspace
+        self.assertFalse(self.budget.acquire('other', {'global': 1}))
+
+
+    def test_deadline(self):
+        self.scheduler.admit('network', 'default', 'user')
+        self.scheduler.acquire('network', 'default', 'user')
+        with self.assertRaises(Retry):
+            self.detect('check')
+
+        with patch.object(tasks, 'drift_registry') as registry:
+            self.assertIsNone(self.detect('check', deadline=time.time() - 1))
+        self.assertEqual(
+            registry().record.call_args[0][:3],
+            ('network', 'default', drift.SKIPPED))
+
+        self.assertEqual(self.scheduler.depth('network', 'default'), 0)
+        self.assertTrue(self.budget.acquire('other', {'global': 1}))
@@ -0,0 +1,54 @@
+import time
+import unittest
+
+from terrestrial.core import executor
+from terrestrial.errors import TerrestrialTimeoutError, TerrestrialCancelledError
+
+
+class TestExecutor(unittest.TestCase):
+    '''
+    Runs, limits and stops processes standing in for Terraform
+    '''
+    def test_run(self):
+        lines = []
+        rc, stdout, stderr = executor.run(
+            ['sh', '-c', 'echo out; echo err >&2'],
+            on_output=lambda *a: lines.append(a))
+
+        self.assertEqual((rc, stdout, stderr), (0, 'out', 'err'))
+        self.assertIn(('stdout', 'out'), lines)
+
+
+    def test_timeout(self):
+        start = time.monotonic()
+        with self.assertRaises(TerrestrialTimeoutError):
+            executor.run(
+                ['sh', '-c', 'trap "" INT; sleep 30'], timeout=1, grace=1)
+        self.assertLess(time.monotonic() - start, 10)
+
+
+    def test_cancel(self):
+        start = time.monotonic()
+        with self.assertRaises(TerrestrialCancelledError):
+            executor.run(
+                ['sh', '-c', 'sleep 30 & sleep 30'], cancelled=lambda: True)
+        self.assertLess(time.monotonic() - start, 10)
+
+
+    def test_cpu_limit(self):
+        rc, stdout, stderr = executor.run(
+            ['sh', '-c', 'while :; do :; done'], cpu=1)
+        self.assertNotEqual(rc, 0)
+
+
+    def test_memory_limit(self):
+        rc, stdout, stderr = executor.run(
+            ['sh', '-c', 'sleep 1; ulimit -d'], memory=512 * 1024 * 1024)
+        self.assertEqual((rc, stdout), (0, str(512 * 1024)))
+
+
+    def test_tail(self):
+        rc, stdout, stderr = executor.run(
+            ['sh', '-c', 'seq 5; echo err >&2'], tail=2)
+        self.assertEqual(stdout, f'{executor.TRUNCATED}\n4\n5')
+        self.assertEqual(stderr, 'err')
@@ -0,0 +1,69 @@
+import json
+import unittest
+
+from terrestrial.core.formats import select, variant, supports_json
+
+
+STATE = {
+    'values': {
+        'root_module': {
+            'resources': [{'address': 'null_resource.test[0]'}],
+            'child_modules': [{
+                'address': 'module.app',
+                'resources': [{'address': 'module.app.null_resource.app'}]
+            }]
+        }
+    }
+}
+OUTPUTS = {
+    'vpc_id': {'sensitive': False, 'type': 'string', 'value': 'vpc-1'},
+    'subnets': {'sensitive': False, 'type': 'list', 'value': ['a', 'b']}
+}
+
+
+class TestFormats(unittest.TestCase):
+    '''
+    Narrows JSON output of Terraform actions down
+    '''
+    def test_variant(self):
+        self.assertEqual(variant('show', {}), 'show')
+        self.assertEqual(variant('show', {'json': True}), 'show.json')
+
+
+    def test_output(self):
+        body = json.dumps(OUTPUTS)
+        self.assertEqual(select('output', body), body)
+        self.assertEqual(
+            json.loads(select('output', body, names=['vpc_id'])),
+            {'vpc_id': OUTPUTS['vpc_id']})
+
+        with self.assertRaises(KeyError):
+            select('output', body, names=['missing'])
+
+
+    def test_show(self):
+        body = json.dumps(STATE)
+        for address, expected in [
+                ('null_resource.test', ['null_resource.test[0]']),
+                ('module.app', ['module.app.null_resource.app']),
+                ('null_resource.tes', [])]:
+            selected = json.loads(select('show', body, addresses=[address]))
+            self.assertEqual(
+                [r['address'] for r in selected['resources']], expected)
+
+
+    def test_plan(self):
+        body = json.dumps({'resource_changes': [
+            {'address': 'null_resource.a'}, {'address': 'null_resource.b'}]})
+        selected = json.loads(select('plan', body, addresses=['null_resource.b']))
+        self.assertEqual(
+            selected['resource_changes'], [{'address': 'null_resource.b'}])
+
+
+    def test_supports_json(self):
+        self.assertTrue(supports_json('output', (0, 11, 10)))
+        self.assertFalse(supports_json('show', (0, 11, 10)))
+        self.assertFalse(supports_json('plan', (0, 11, 10)))
+        self.assertTrue(supports_json('plan', (0, 12, 0)))
+        self.assertTrue(supports_json('show', (1, 0, 0)))
+        self.assertTrue(supports_json('show', None))
@@ -1,5 +1,9 @@
+import os
+import unittest
 from warnings import catch_warnings, simplefilter
 
+import redis
+
 
 def ignore_warnings(test):
     def do_test(self, *args, **kwargs):
@@ -7,3 +11,25 @@ def ignore_warnings(test):
             simplefilter("ignore")
             test(self, *args, **kwargs)
     return do_test
+
+
+REDIS_URL = os.getenv('TEST_REDIS_URL') or 'redis://localhost:6379/15'
+
+
+def redis_client():
+    """
+    Returns client of a Redis database tests are free to flush,
+    or None if there's no Redis to test against
+    """
+    client = redis.Redis.from_url(REDIS_URL)
+    try:
+        client.ping()
+    except redis.ConnectionError:
+        return None
+
+    return client
+
+
+def requires_redis(test):
+    return unittest.skipUnless(
+        redis_client(), f'Redis is not available at {REDIS_URL}')(test)
@@ -0,0 +1,109 @@
+import unittest
+from pathlib import Path
+from tempfile import mkdtemp
+from shutil import rmtree
+from unittest.mock import patch, MagicMock
+
+from terrestrial.core import initializer
+from terrestrial.core.initializer import ConfigInitializer
+from terrestrial.errors import TerrestrialFatalError
+
+
+class TestConfigInitializer(unittest.TestCase):
+    '''
+    Keeps track of configurations readiness, so tasks wait for them
+    '''
+    def setUp(self):
+        self.tmp = mkdtemp()
+        self.initializer = ConfigInitializer(self.tmp)
+        self.initializer.reset(['network'])
+
+
+    def tearDown(self):
+        rmtree(self.tmp)
+
+
+    def test_wait_pending(self):
+        with self.assertRaisesRegex(TerrestrialFatalError, 'Timed out'):
+            self.initializer.wait('network', timeout=0.1)
+
+        self.initializer._mark('network', initializer.READY)
+        self.initializer.wait('network', timeout=0.1)
+
+
+    def test_wait_failed(self):
+        self.initializer._mark('network', initializer.FAILED)
+        with self.assertRaisesRegex(TerrestrialFatalError, 'failed'):
+            self.initializer.wait('network')
+
+
+    def test_wait_unknown(self):
+        with self.assertRaisesRegex(TerrestrialFatalError, 'not known'):
+            self.initializer.wait('database', timeout=600)
+
+
+    def marker(self, name):
+        return Path(self.tmp, name).read_text()
+
+
+    def test_reset(self):
+        self.initializer._mark('database', initializer.READY)
+        self.initializer.reset(['network'])
+
+        self.assertEqual(self.marker('network'), initializer.PENDING)
+        self.assertFalse(Path(self.tmp, 'database').exists())
+
+
+    def test_initialize_all(self):
+        paths = [Path('/configurations/network'), Path('/configurations/database')]
+        attempts = []
+
+        def initialize(path):
+            attempts.append(path.stem)
+            # Database only fails along with others
+            return path.stem != 'database' or attempts.count('database') > 1
+
+        init = ConfigInitializer(self.tmp, concurrency=2)
+        with patch.object(init, 'initialize', side_effect=initialize):
+            self.assertEqual(init.initialize_all(paths), [])
+
+        self.assertEqual(attempts.count('database'), 2)
+        self.assertEqual(self.marker('network'), initializer.READY)
+        self.assertEqual(self.marker('database'), initializer.READY)
+
+
+    def test_initialize_all_failed(self):
+        paths = [Path('/configurations/network'), Path('/configurations/database')]
+
+        init = ConfigInitializer(self.tmp, concurrency=1)
+        with patch.object(
+                init, 'initialize',
+                side_effect=lambda p: p.stem == 'network') as initialize:
+            self.assertEqual(init.initialize_all(paths), ['database'])
+
+        # Nothing to retry alone when running alone already
+        self.assertEqual(initialize.call_count, 2)
+        self.assertEqual(self.marker('database'), initializer.FAILED)
+
+
+    def test_initialize_unchanged(self):
+        config = MagicMock()
+        config.__enter__.return_value = config
+        config.digest.return_value = 'abc'
+        manifest = MagicMock()
+        manifest.get.return_value = 'abc'
+
+        path = Path(self.tmp, 'configurations', 'network')
+        (path / '.terraform').mkdir(parents=True)
+        init = ConfigInitializer(self.tmp, manifest=manifest)
+        with patch.object(initializer, 'TerraformConfig', return_value=config):
+            self.assertTrue(init.initialize(path))
+
+        config.init.assert_not_called()
+        config.digest.return_value = 'def'
+        config.init.return_value = config.validate.return_value = (0, '', '')
+        with patch.object(initializer, 'TerraformConfig', return_value=config):
+            self.assertTrue(init.initialize(path))
+
+        config.init.assert_called_once_with()
+        manifest.update.assert_called_once_with('network', 'def')
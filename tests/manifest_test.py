@@ -0,0 +1,75 @@
+import unittest
+from pathlib import Path
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from terrestrial.core.manifest import Manifest, config_digest
+
+
+class TestConfigDigest(unittest.TestCase):
+    '''
+    Checks configuration digest follows changes
+    of configuration files and local modules
+    '''
+    def setUp(self):
+        self.tmp = mkdtemp()
+        self.config = Path(self.tmp, 'config')
+        self.module = Path(self.tmp, 'module')
+        self.config.mkdir()
+        self.module.mkdir()
+
+        (self.config / 'test.tf').write_text(
+            'module "test" {\n  source = "../module"\n}\n')
+        (self.module / 'main.tf').write_text('resource null_resource "dummy" {}')
+
+
+    def tearDown(self):
+        rmtree(self.tmp)
+
+
+    def test_digest_is_stable(self):
+        self.assertEqual(config_digest(self.config), config_digest(self.config))
+
+
+    def test_digest_follows_config(self):
+        before = config_digest(self.config)
+        (self.config / 'variables.tf').write_text('variable "test" {}')
+        self.assertNotEqual(before, config_digest(self.config))
+
+
+    def test_digest_follows_local_module(self):
+        before = config_digest(self.config)
+        (self.module / 'main.tf').write_text('resource null_resource "other" {}')
+        self.assertNotEqual(before, config_digest(self.config))
+
+
+    def test_digest_ignores_terraform_dir(self):
+        before = config_digest(self.config)
+        (self.config / '.terraform').mkdir()
+        (self.config / '.terraform' / 'environment').write_text('test')
+        self.assertEqual(before, config_digest(self.config))
+
+
+class TestManifest(unittest.TestCase):
+    '''
+    Checks manifest survives being reloaded from disk
+    '''
+    def setUp(self):
+        self.tmp = mkdtemp()
+        self.path = f'{self.tmp}/manifest.json'
+
+
+    def tearDown(self):
+        rmtree(self.tmp)
+
+
+    def test_manifest_persists(self):
+        Manifest(self.path).update('test', 'digest')
+        self.assertEqual(Manifest(self.path).get('test'), 'digest')
+
+
+    def test_manifest_remove(self):
+        manifest = Manifest(self.path)
+        manifest.update('test', 'digest')
+        manifest.remove('test')
+        self.assertIsNone(Manifest(self.path).get('test'))
@@ -0,0 +1,173 @@
+import json
+import unittest
+from unittest.mock import patch
+
+from terrestrial.core import pipelines, tasks, signals
+from terrestrial.core.scheduler import Scheduler
+from terrestrial.errors import TerrestrialFatalError
+
+from .helpers import redis_client, requires_redis
+
+
+NODES = {
+    'network': {'config': 'network', 'action': 'apply'},
+    'network-out': {
+        'config': 'network', 'action': 'output', 'after': ['network']},
+    'database': {
+        'config': 'database', 'action': 'apply', 'after': ['network-out'],
+        'var_from': {'vpc_id': 'network-out.vpc_id'}},
+    'dns': {'config': 'dns', 'action': 'plan'}
+}
+CONFIGURATIONS = {
+    name: {'name': name, 'variables': {}, 'errors': []}
+    for name in ['network', 'dns']}
+CONFIGURATIONS['database'] = {
+    'name': 'database',
+    'variables': {'vpc_id': {'required': True}, 'size': {'required': False}},
+    'errors': []
+}
+
+
+def meta(status, rc=0, stdout=''):
+    return {'status': status, 'result': [rc, stdout, '']}
+
+
+class TestPipelines(unittest.TestCase):
+    '''
+    Validates pipelines and works out which of their nodes run next
+    '''
+    def setUp(self):
+        self.nodes = pipelines.validate(NODES, CONFIGURATIONS)
+
+
+    def test_validate(self):
+        self.assertEqual(self.nodes['network']['workspace'], 'default')
+        self.assertEqual(self.nodes['network-out']['options'], {'json': True})
+
+        for nodes in [
+                {},
+                {'a': {'config': 'missing', 'action': 'plan'}},
+                {'a': {'config': 'dns', 'action': 'import'}},
+                {'a': {'config': 'dns', 'action': 'plan', 'after': ['b']}},
+                {'a': {'config': 'dns', 'action': 'plan', 'after': ['b']},
+                 'b': {'config': 'dns', 'action': 'plan', 'after': ['a']}},
+                {'a': {'config': 'dns', 'action': 'plan'},
+                 'b': {'config': 'dns', 'action': 'plan',
+                       'var_from': {'x': 'a.x'}}},
+                {'a': {'config': 'dns', 'action': 'plan'},
+                 'b': {'config': 'dns', 'action': 'plan', 'after': ['a'],
+                       'var_from': {'x': 'a.x'}}},
+                {'a': {'config': 'database', 'action': 'plan'}},
+                {'a': {'config': 'dns', 'action': 'plan', 'var': {'x': 1}}}]:
+            with self.assertRaises(TerrestrialFatalError):
+                pipelines.validate(nodes, CONFIGURATIONS)
+
+
+    def test_ready(self):
+        states = pipelines.states(self.nodes, {}, {}, {})
+        self.assertEqual(
+            sorted(pipelines.ready(self.nodes, states)), ['dns', 'network'])
+
+        tasks = {'network': '1', 'dns': '2'}
+        metas = {'network': meta('SUCCESS'), 'dns': meta('STARTED')}
+        states = pipelines.states(self.nodes, tasks, {}, metas)
+        self.assertEqual(pipelines.ready(self.nodes, states), ['network-out'])
+        self.assertEqual(pipelines.state(states), 'STARTED')
+
+
+    def test_failure(self):
+        tasks = {'network': '1', 'dns': '2'}
+        metas = {'network': meta('SUCCESS', rc=1), 'dns': meta('SUCCESS')}
+        states = pipelines.states(self.nodes, tasks, {}, metas)
+
+        self.assertEqual(states['network'], 'FAILURE')
+        self.assertEqual(states['database'], pipelines.SKIPPED)
+        self.assertEqual(pipelines.ready(self.nodes, states), [])
+        self.assertEqual(pipelines.state(states), 'FAILURE')
+
+
+    def test_upstream_vars(self):
+        outputs = json.dumps({'vpc_id': {'type': 'string', 'value': 'vpc-1'}})
+        metas = {'network-out': meta('SUCCESS', stdout=outputs)}
+        self.assertEqual(
+            pipelines.upstream_vars(self.nodes['database'], metas),
+            {'vpc_id': 'vpc-1'})
+
+        with self.assertRaises(TerrestrialFatalError):
+            pipelines.upstream_vars(
+                self.nodes['database'], {'network-out': meta('SUCCESS')})
+
+
+@requires_redis
+class TestPipelineAdvance(unittest.TestCase):
+    '''
+    Launches pipeline nodes once results of their parents are stored
+    '''
+    def setUp(self):
+        self.client = redis_client()
+        self.client.flushdb()
+        self.registry = pipelines.PipelineRegistry(self.client)
+        self.metas = {}
+
+        nodes = pipelines.validate({
+            'network': {'config': 'network', 'action': 'apply'},
+            'network-out': {
+                'config': 'network', 'action': 'output', 'after': ['network']}
+        }, CONFIGURATIONS)
+        self.registry.create('p', nodes)
+
+        patches = [
+            patch.object(tasks, 'pipeline_registry', lambda: self.registry),
+            patch.object(
+                tasks, 'task_scheduler', lambda: Scheduler(self.client)),
+            patch.object(tasks, 'get_metas', lambda ids: [
+                self.metas.get(i, meta('PENDING')) for i in ids]),
+            patch.object(signals, 'pipeline_registry', lambda: self.registry)
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+
+    def launched(self):
+        return [c[0][0][1] for c in self.apply_async.call_args_list]
+
+
+    def test_unfinished_parent(self):
+        with patch.object(tasks.terraform, 'apply_async') as self.apply_async:
+            tasks.advance_pipeline('p')
+            self.assertEqual(self.launched(), ['apply'])
+            network = self.registry.get('p')['tasks']['network']
+
+            # Parent's callbacks may run before its result is stored
+            self.metas[network] = meta('STARTED')
+            tasks.advance_pipeline('p')
+            self.assertEqual(self.launched(), ['apply'])
+
+            # Once it's stored, pipeline is advanced again
+            self.metas[network] = meta('SUCCESS')
+            with patch.object(signals.advance_pipeline, 'delay') as delay:
+                signals.advance_pipelines(task_id=network, state='SUCCESS')
+            delay.assert_called_once_with('p')
+
+            tasks.advance_pipeline('p')
+            self.assertEqual(self.launched(), ['apply', 'output'])
+
+
+    def test_publish_failure(self):
+        with patch.object(tasks.terraform, 'apply_async') as self.apply_async:
+            self.apply_async.side_effect = OSError('Broker is down')
+            tasks.advance_pipeline('p')
+
+        pipeline = self.registry.get('p')
+        self.assertEqual(pipeline['errors'], {'network': 'Broker is down'})
+        self.assertEqual(Scheduler(self.client).depth('network', 'default'), 0)
+
+
+    def test_retrying_parent(self):
+        self.registry.claim('p', 'network', 'network-task')
+
+        with patch.object(signals.advance_pipeline, 'delay') as delay:
+            signals.advance_pipelines(task_id='network-task', state='RETRY')
+            signals.advance_pipelines(task_id='unrelated', state='SUCCESS')
+        delay.assert_not_called()
@@ -0,0 +1,106 @@
+import time
+import unittest
+
+from terrestrial.core.registry import TaskRegistry
+
+from .helpers import redis_client, requires_redis
+
+
+@requires_redis
+class TestTaskRegistry(unittest.TestCase):
+    '''
+    Indexes tasks as they get queued, start and finish
+    '''
+    def setUp(self):
+        self.client = redis_client()
+        self.client.flushdb()
+        self.registry = TaskRegistry(self.client)
+
+        tasks = [
+            ('1', 'SUCCESS', 'network', 'default'),
+            ('2', 'FAILURE', 'network', 'staging'),
+            ('3', 'PENDING', 'database', 'default'),
+            ('4', 'STARTED', 'network', 'default')
+        ]
+        for task_id, state, config, workspace in tasks:
+            self.registry.record(
+                task_id, state, config=config, workspace=workspace)
+            # Tasks are ordered by time they were first queued at
+            time.sleep(0.01)
+
+
+    def ids(self, **filters):
+        return [t['id'] for t in self.registry.list(**filters)]
+
+
+    def test_record(self):
+        self.registry.record('3', 'STARTED', worker='worker@host', action=None)
+        task = self.registry.get('3')
+
+        self.assertEqual(task['state'], 'STARTED')
+        self.assertEqual(task['config'], 'database')
+        self.assertEqual(task['worker'], 'worker@host')
+        self.assertNotIn('action', task)
+        self.assertEqual(self.registry.get('unknown'), {})
+
+
+    def test_list(self):
+        self.assertEqual(self.ids(), ['4', '3', '2', '1'])
+
+        # Updates don't move tasks
+        self.registry.record('1', 'SUCCESS')
+        self.assertEqual(self.ids(), ['4', '3', '2', '1'])
+
+
+    def test_filters(self):
+        self.assertEqual(self.ids(states=['PENDING', 'STARTED']), ['4', '3'])
+        self.assertEqual(self.ids(config='network'), ['4', '2', '1'])
+        self.assertEqual(self.ids(workspace='default'), ['4', '3', '1'])
+        self.assertEqual(
+            self.ids(config='network', workspace='default', states=['SUCCESS']),
+            ['1'])
+
+
+    def test_state_index(self):
+        self.registry.record('4', 'SUCCESS')
+        self.registry.record('3', 'STARTED')
+
+        self.assertEqual(self.ids(states=['STARTED']), ['3'])
+        self.assertEqual(self.ids(states=['SUCCESS']), ['4', '1'])
+        self.assertEqual(self.ids(states=['PENDING', 'STARTED', 'RETRY']), ['3'])
+        # Only tasks in given states are read
+        self.assertEqual(
+            self.client.zcard(f'{TaskRegistry.KEY}:state:PENDING'), 0)
+        self.assertEqual(self.client.keys(f'{TaskRegistry.KEY}:list:*'), [])
+
+
+    def test_pagination(self):
+        self.assertEqual(self.ids(limit=2), ['4', '3'])
+        self.assertEqual(self.ids(offset=2, limit=2), ['2', '1'])
+        self.assertEqual(self.ids(config='network', offset=1, limit=1), ['2'])
+        # Ones matching filters are fetched in chunks
+        self.assertEqual(self.ids(config='network', chunk=1), ['4', '2', '1'])
+        self.assertEqual(self.ids(offset=4), [])
+
+
+    def test_expired(self):
+        self.client.delete(f'{TaskRegistry.KEY}:3')
+        self.assertEqual(self.ids(), ['4', '2', '1'])
+
+
+    def test_cancel(self):
+        self.assertFalse(self.registry.cancelled('4'))
+        self.registry.cancel('4')
+
+        self.assertTrue(self.registry.cancelled('4'))
+        self.assertFalse(self.registry.cancelled('3'))
+        self.assertEqual(self.registry.get('4')['state'], 'STARTED')
+
+
+    def test_callbacks(self):
+        self.registry.add_callback('4', 'http://b')
+        self.registry.add_callback('4', 'http://a')
+        self.registry.add_callback('4', 'http://a')
+
+        self.assertEqual(self.registry.pop_callbacks('4'), ['http://a', 'http://b'])
+        self.assertEqual(self.registry.pop_callbacks('4'), [])
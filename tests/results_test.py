@@ -0,0 +1,53 @@
+import unittest
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from terrestrial.core.artifacts import ArtifactStore
+from terrestrial.core.results import pack, unpack, TRUNCATED
+
+
+class TestResults(unittest.TestCase):
+    '''
+    Packs task results for result backend and unpacks them back
+    '''
+    def setUp(self):
+        self.tmp = mkdtemp()
+        self.store = ArtifactStore(self.tmp)
+
+
+    def tearDown(self):
+        rmtree(self.tmp)
+
+
+    def test_compressed(self):
+        result = (0, 'Plan: 1 to add\n' * 1000, '')
+        packed = pack(result, compression='gzip')
+
+        self.assertEqual(packed['compression'], 'gzip')
+        self.assertLess(len(packed['stdout']), len(result[1]))
+        self.assertEqual(unpack(packed), result)
+
+
+    def test_small(self):
+        result = (1, '', 'Error: no such resource')
+        packed = pack(result)
+
+        self.assertEqual(packed['compression'], 'none')
+        self.assertEqual(unpack(packed), result)
+
+
+    def test_spilled(self):
+        result = (0, 'a' * 4096 + 'tail', 'err')
+        packed = pack(result, max_bytes=1024, store=self.store, name='task')
+
+        self.assertEqual(packed['truncated'], ['stdout'])
+        self.assertEqual(unpack(packed, self.store), result)
+
+        rc, stdout, stderr = unpack(packed)
+        self.assertTrue(stdout.startswith(TRUNCATED))
+        self.assertTrue(stdout.endswith('tail'))
+        self.assertEqual(stderr, 'err')
+
+
+    def test_legacy(self):
+        self.assertEqual(unpack([0, 'out', '']), [0, 'out', ''])
@@ -0,0 +1,117 @@
+import time
+import unittest
+from pathlib import Path
+
+from terrestrial.core.sandbox import SandboxPool
+
+
+CONFIG_PATH = str(Path(__file__).parent.absolute() / 'configurations' / 'valid')
+
+
+class KnownWorkspaces:
+    '''
+    Workspace index knowing every workspace, so they're switched
+    to without Terraform
+    '''
+    def contains(self, config, workspace):
+        return True
+
+
+class TestSandboxPool(unittest.TestCase):
+    '''
+    Hands out pre-warmed sandboxes and keeps the pool bounded
+    '''
+    def setUp(self):
+        self.pool = SandboxPool(2, workspaces=KnownWorkspaces())
+
+
+    def tearDown(self):
+        self.pool.close()
+
+
+    def idle(self):
+        return sum(len(i) for i in self.pool._idle.values())
+
+
+    def wait_idle(self, count):
+        deadline = time.monotonic() + 10
+        while self.idle() < count and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+    def test_timings(self):
+        w = self.pool.acquire(CONFIG_PATH, 'default', 1)
+        self.assertIn('clone', w.timings)
+        self.pool.release(w, 1)
+
+        self.pool.refill(CONFIG_PATH, 'default', 1)
+        self.wait_idle(2)
+
+        # Neither reused nor pre-warmed sandboxes were cloned for the task
+        for _ in range(2):
+            w = self.pool.acquire(CONFIG_PATH, 'default', 1)
+            self.assertEqual(w.timings, {})
+            w.close()
+
+
+    def test_reuse(self):
+        w = self.pool.acquire(CONFIG_PATH, 'default', 1)
+        self.pool.release(w, 1)
+
+        self.assertIs(self.pool.acquire(CONFIG_PATH, 'default', 1), w)
+        self.assertEqual(self.idle(), 0)
+        w.close()
+
+
+    def test_generation(self):
+        w = self.pool.acquire(CONFIG_PATH, 'default', 1)
+        self.pool.release(w, 1)
+
+        # Sandbox of the previous configuration is dropped
+        fresh = self.pool.acquire(CONFIG_PATH, 'default', 2)
+        self.assertIsNot(fresh, w)
+        self.assertFalse(Path(w.config_path).exists())
+        self.assertEqual(self.idle(), 0)
+        fresh.close()
+
+
+    def test_lru_eviction(self):
+        sandboxes = [
+            self.pool.acquire(CONFIG_PATH, w, 1) for w in ['a', 'b', 'c']]
+        for w in sandboxes:
+            self.pool.release(w, 1)
+
+        self.assertEqual(self.idle(), 2)
+        self.assertFalse(Path(sandboxes[0].config_path).exists())
+
+        # Reused sandbox becomes the most recently used one
+        w = self.pool.acquire(CONFIG_PATH, 'b', 1)
+        self.pool.release(w, 1)
+        self.pool.release(self.pool._create(CONFIG_PATH, 'd'), 1)
+        self.assertEqual(
+            sorted(k[1] for k in self.pool._idle), ['b', 'd'])
+
+
+    def test_switch(self):
+        w = self.pool.acquire(CONFIG_PATH, 'a', 1)
+        self.pool.release(w, 1)
+
+        other = self.pool.acquire(CONFIG_PATH, 'b', 1)
+        self.assertIsNot(other, w)
+        self.assertEqual(self.idle(), 1)
+        other.close()
+
+        switched = self.pool.acquire(CONFIG_PATH, 'c', 1, switch=True)
+        self.assertIs(switched, w)
+        self.assertEqual(switched.workspace, 'c')
+        switched.close()
+
+
+    def test_refill(self):
+        self.pool.refill(CONFIG_PATH, 'a', 1)
+        self.wait_idle(1)
+        self.assertEqual(list(self.pool._idle), [(CONFIG_PATH, 'a')])
+
+        disabled = SandboxPool(0)
+        disabled.refill(CONFIG_PATH, 'a', 1)
+        self.assertEqual(disabled._pending, set())
@@ -0,0 +1,135 @@
+import time
+import unittest
+
+from terrestrial.core.scheduler import Scheduler, signature
+from terrestrial.errors import TerrestrialQueueFullError
+
+from .helpers import redis_client, requires_redis
+
+
+@requires_redis
+class TestScheduler(unittest.TestCase):
+    '''
+    Runs tasks for the same configuration and workspace one at
+    a time, in order of their ETA
+    '''
+    def setUp(self):
+        self.client = redis_client()
+        self.client.flushdb()
+        self.scheduler = Scheduler(self.client, max_depth=3)
+
+
+    def test_fifo(self):
+        for task_id in ['first', 'second', 'third']:
+            self.scheduler.admit('network', 'default', task_id)
+
+        self.assertFalse(self.scheduler.acquire('network', 'default', 'second'))
+        self.assertTrue(self.scheduler.acquire('network', 'default', 'first'))
+        # Next one waits for the lock, not just for its turn
+        self.assertFalse(self.scheduler.acquire('network', 'default', 'second'))
+
+        self.scheduler.release('network', 'default', 'first')
+        self.assertFalse(self.scheduler.acquire('network', 'default', 'third'))
+        self.assertTrue(self.scheduler.acquire('network', 'default', 'second'))
+
+
+    def test_eta(self):
+        now = time.time()
+        self.scheduler.admit('network', 'default', 'later', eta=now + 60)
+        self.scheduler.admit('network', 'default', 'sooner', eta=now)
+
+        self.assertFalse(self.scheduler.acquire('network', 'default', 'later'))
+        self.assertTrue(self.scheduler.acquire('network', 'default', 'sooner'))
+
+
+    def test_separate_workspaces(self):
+        self.scheduler.admit('network', 'default', 'first')
+        self.scheduler.admit('network', 'staging', 'second')
+
+        self.assertTrue(self.scheduler.acquire('network', 'default', 'first'))
+        self.assertTrue(self.scheduler.acquire('network', 'staging', 'second'))
+
+
+    def test_full_queue(self):
+        for task_id in ['first', 'second', 'third']:
+            self.scheduler.admit('network', 'default', task_id)
+
+        with self.assertRaises(TerrestrialQueueFullError):
+            self.scheduler.admit('network', 'default', 'fourth')
+        self.assertEqual(self.scheduler.depth('network', 'default'), 3)
+
+        # Tasks already queued keep their place
+        self.assertEqual(
+            self.scheduler.admit('network', 'default', 'third'), 'third')
+
+        unlimited = Scheduler(self.client, max_depth=0)
+        unlimited.admit('network', 'default', 'fourth')
+        self.assertEqual(self.scheduler.depth('network', 'default'), 4)
+
+
+    def test_coalesce(self):
+        plan = signature('plan', {'size': 1}, False, {})
+        other = signature('plan', {'size': 2}, False, {})
+
+        first = self.scheduler.admit('network', 'default', 'first', coalesce=plan)
+        joined = self.scheduler.admit('network', 'default', 'second', coalesce=plan)
+        separate = self.scheduler.admit(
+            'network', 'default', 'third', coalesce=other)
+
+        self.assertEqual((first, joined, separate), ('first', 'first', 'third'))
+        self.assertEqual(self.scheduler.depth('network', 'default'), 2)
+
+        # Plans which started are no longer joined
+        self.scheduler.acquire('network', 'default', 'first')
+        self.assertEqual(
+            self.scheduler.admit('network', 'default', 'fourth', coalesce=plan),
+            'fourth')
+
+
+    def test_lock_timeout(self):
+        scheduler = Scheduler(self.client, lock_timeout=0.1)
+        scheduler.admit('network', 'default', 'first')
+        scheduler.admit('network', 'default', 'second')
+
+        self.assertTrue(scheduler.acquire('network', 'default', 'first'))
+        self.assertFalse(scheduler.acquire('network', 'default', 'second'))
+
+        time.sleep(0.2)
+        self.assertTrue(scheduler.acquire('network', 'default', 'second'))
+        # Expired holder doesn't release lock of the next one
+        scheduler.release('network', 'default', 'first')
+        self.assertFalse(scheduler.acquire('network', 'default', 'third'))
+
+
+    def test_keep(self):
+        scheduler = Scheduler(self.client, lock_timeout=0.3)
+        scheduler.admit('network', 'default', 'first')
+        scheduler.admit('network', 'default', 'second')
+        scheduler.acquire('network', 'default', 'first')
+
+        with scheduler.keep('network', 'default', 'first'):
+            time.sleep(0.6)
+            self.assertFalse(scheduler.acquire('network', 'default', 'second'))
+
+        time.sleep(0.4)
+        self.assertTrue(scheduler.acquire('network', 'default', 'second'))
+        # Lock of another task isn't extended
+        self.assertFalse(scheduler.extend('network', 'default', 'first'))
+
+
+    def test_queue_timeout(self):
+        scheduler = Scheduler(self.client, queue_timeout=60)
+        scheduler.admit('network', 'default', 'stale', eta=time.time() - 120)
+        scheduler.admit('network', 'default', 'fresh')
+
+        self.assertTrue(scheduler.acquire('network', 'default', 'fresh'))
+        self.assertEqual(scheduler.depth('network', 'default'), 0)
+
+
+    def test_forget(self):
+        self.scheduler.admit('network', 'default', 'first')
+        self.scheduler.admit('network', 'default', 'second')
+
+        self.scheduler.forget('network', 'default', 'first')
+        self.assertEqual(self.scheduler.depth('network', 'default'), 1)
+        self.assertTrue(self.scheduler.acquire('network', 'default', 'second'))
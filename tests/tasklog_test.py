@@ -0,0 +1,49 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+from redis.exceptions import ConnectionError
+
+from terrestrial.core.tasklog import TaskLog
+
+from .helpers import redis_client, requires_redis
+
+
+@requires_redis
+class TestTaskLog(unittest.TestCase):
+    '''
+    Keeps output of a task bounded, even while Redis fails
+    '''
+    def setUp(self):
+        self.client = redis_client()
+        self.client.flushdb()
+        self.log = TaskLog(
+            self.client, 'task', max_lines=4, flush_lines=2,
+            flush_interval=3600)
+        self.addCleanup(self.log.close)
+
+
+    def test_read(self):
+        for i in range(6):
+            self.log.write('stdout', f'line {i}')
+        self.log.flush()
+
+        self.assertEqual(
+            self.log.read(), (['line 2', 'line 3', 'line 4', 'line 5'], 6))
+        self.assertEqual(self.log.read(5), (['line 5'], 6))
+
+
+    def test_failing_redis(self):
+        pipe = MagicMock()
+        pipe.execute.side_effect = ConnectionError('Redis is down')
+        with patch.object(self.client, 'pipeline', return_value=pipe), \
+                self.assertLogs('terrestrial.core.tasklog', 'WARNING') as logs:
+            for i in range(10):
+                self.log.write('stdout', f'line {i}')
+
+        self.assertEqual(len(logs.output), 1)
+        self.assertEqual(len(self.log._buffer), 4)
+
+        # Dropped lines still count, so offsets stay right
+        self.log.flush()
+        self.assertEqual(
+            self.log.read(), (['line 6', 'line 7', 'line 8', 'line 9'], 10))
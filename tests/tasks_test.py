@@ -0,0 +1,273 @@
+import hmac
+import json
+import hashlib
+import unittest
+from unittest.mock import patch
+from urllib.error import HTTPError, URLError
+
+from celery.exceptions import Ignore, Retry
+
+from terrestrial.core import tasks
+from terrestrial.core.registry import TaskRegistry
+from terrestrial.core.scheduler import Scheduler
+from terrestrial.errors import TerrestrialRetryError
+
+from .helpers import redis_client, requires_redis
+
+
+@requires_redis
+class TestCancel(unittest.TestCase):
+    '''
+    Gives up places of cancelled tasks and calls their webhooks
+    '''
+    def setUp(self):
+        self.client = redis_client()
+        self.client.flushdb()
+        self.registry = TaskRegistry(self.client)
+        self.scheduler = Scheduler(self.client)
+
+        patches = [
+            patch.object(tasks, 'task_registry', lambda: self.registry),
+            patch.object(tasks, 'task_scheduler', lambda: self.scheduler),
+            patch.object(tasks.terraform, 'update_state'),
+            patch.object(tasks.deliver_webhook, 'delay')
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+
+    def test_cancelled_in_queue(self):
+        self.scheduler.admit('network', 'default', 'first')
+        self.scheduler.admit('network', 'default', 'second')
+        self.registry.add_callback('first', 'http://hooks/done')
+        self.registry.cancel('first')
+
+        tasks.terraform.push_request(id='first')
+        try:
+            with self.assertRaises(Ignore):
+                tasks.terraform.run('network', 'plan')
+        finally:
+            tasks.terraform.pop_request()
+
+        self.assertEqual(self.registry.get('first')['state'], 'REVOKED')
+        tasks.deliver_webhook.delay.assert_called_once_with(
+            'first', 'http://hooks/done')
+
+        # Next task doesn't wait for the cancelled one
+        self.assertEqual(self.scheduler.depth('network', 'default'), 1)
+        self.assertTrue(self.scheduler.acquire('network', 'default', 'second'))
+
+
+@requires_redis
+class TestReadOnly(unittest.TestCase):
+    '''
+    Runs read-only actions without waiting for their turn
+    '''
+    def setUp(self):
+        self.client = redis_client()
+        self.client.flushdb()
+        self.scheduler = Scheduler(self.client)
+
+        patches = [
+            patch.object(tasks, 'task_registry', lambda: TaskRegistry(self.client)),
+            patch.object(tasks, 'task_scheduler', lambda: self.scheduler),
+            patch.object(tasks, 'run_action', return_value=(0, 'out', '')),
+            patch.object(tasks, 'pack_result', side_effect=lambda i, r: r),
+            patch.object(tasks, 'queue_wait', return_value=0)
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+
+    def test_locked_workspace(self):
+        self.scheduler.admit('network', 'default', 'apply')
+        self.scheduler.acquire('network', 'default', 'apply')
+
+        tasks.terraform.push_request(id='output')
+        try:
+            self.assertEqual(
+                tasks.terraform.run('network', 'output'), (0, 'out', ''))
+        finally:
+            tasks.terraform.pop_request()
+
+        # Lock of the apply is left alone
+        self.assertFalse(self.scheduler.acquire('network', 'default', 'plan'))
+
+
+    def test_serialized(self):
+        self.assertTrue(tasks.serialized('apply'))
+        self.assertTrue(tasks.serialized('plan'))
+        self.assertFalse(tasks.serialized('show'))
+        self.assertFalse(tasks.serialized('output'))
+
+
+@requires_redis
+class TestRetry(unittest.TestCase):
+    '''
+    Keeps places of tasks retried after taking their turn
+    '''
+    def setUp(self):
+        self.client = redis_client()
+        self.client.flushdb()
+        self.scheduler = Scheduler(self.client)
+
+        patches = [
+            patch.object(tasks, 'task_registry', lambda: TaskRegistry(self.client)),
+            patch.object(tasks, 'task_scheduler', lambda: self.scheduler),
+            patch.object(
+                tasks, 'run_action', side_effect=TerrestrialRetryError('busy')),
+            patch.object(tasks, 'queue_wait', return_value=0),
+            patch.object(tasks.terraform, 'retry', side_effect=Retry)
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+
+    def test_requeue(self):
+        self.scheduler.admit('network', 'default', 'first')
+        eta = self.scheduler.eta('network', 'default', 'first')
+
+        tasks.terraform.push_request(id='first')
+        try:
+            self.scheduler.admit('network', 'default', 'second')
+            with self.assertRaises(Retry):
+                tasks.terraform.run('network', 'apply')
+        finally:
+            tasks.terraform.pop_request()
+
+        self.assertEqual(self.scheduler.eta('network', 'default', 'first'), eta)
+        self.assertFalse(self.scheduler.acquire('network', 'default', 'second'))
+        self.assertTrue(self.scheduler.acquire('network', 'default', 'first'))
+
+
+class TestRouting(unittest.TestCase):
+    '''
+    Routes tasks to queues of their kind and configuration
+    '''
+    def setUp(self):
+        queues = tasks.app.conf.TF_CONFIG_QUEUES
+        tasks.app.conf.TF_CONFIG_QUEUES = {'network': 'terrestrial.network'}
+        self.addCleanup(setattr, tasks.app.conf, 'TF_CONFIG_QUEUES', queues)
+
+
+    def route(self, task, *args, **kwargs):
+        return tasks.route_task(task.name, args, kwargs, {})
+
+
+    def test_read_only(self):
+        for action in ['show', 'output']:
+            route = self.route(tasks.terraform, 'network', action)
+            self.assertEqual(route['queue'], tasks.app.conf.TF_FAST_QUEUE)
+            self.assertEqual(
+                route['priority'], tasks.app.conf.TF_PRIORITIES[action])
+
+
+    def test_config_queues(self):
+        self.assertEqual(
+            self.route(tasks.terraform, 'network', 'apply')['queue'],
+            'terrestrial.network')
+        self.assertEqual(
+            self.route(tasks.terraform, 'database', 'apply')['queue'],
+            tasks.app.conf.TF_DEFAULT_QUEUE)
+        # Arguments may be given by name too
+        self.assertEqual(
+            self.route(tasks.terraform, config='network', action='plan')['queue'],
+            'terrestrial.network')
+
+
+    def test_priorities(self):
+        priorities = [
+            self.route(tasks.terraform, 'network', a)['priority']
+            for a in ['output', 'plan', 'apply']]
+        drift = self.route(tasks.detect_drift, 'network', 'default')
+
+        self.assertEqual(priorities, sorted(priorities))
+        self.assertEqual(drift['queue'], 'terrestrial.network')
+        self.assertGreater(drift['priority'], priorities[-1])
+
+
+    def test_helpers(self):
+        self.assertEqual(
+            self.route(tasks.list_workspaces, 'network'),
+            {'queue': tasks.app.conf.TF_FAST_QUEUE})
+
+
+class TestWebhooks(unittest.TestCase):
+    '''
+    Posts states of finished tasks to their webhooks
+    '''
+    def setUp(self):
+        meta = {'status': 'SUCCESS', 'result': (0, 'out', '')}
+        task = {'config': 'network', 'workspace': 'default', 'action': 'apply'}
+
+        patches = [
+            patch.object(tasks, 'get_meta', return_value=meta),
+            patch.object(tasks, 'task_registry'),
+            patch.object(tasks, 'urlopen'),
+            patch.object(tasks.deliver_webhook, 'retry', side_effect=Retry)
+        ]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+        tasks.task_registry().get.return_value = task
+
+        secret = tasks.app.conf.TF_WEBHOOK_SECRET
+        tasks.app.conf.TF_WEBHOOK_SECRET = 'secret'
+        self.addCleanup(setattr, tasks.app.conf, 'TF_WEBHOOK_SECRET', secret)
+
+
+    def deliver(self, retries=0):
+        tasks.deliver_webhook.push_request(id='webhook', retries=retries)
+        try:
+            return tasks.deliver_webhook.run('task', 'http://hooks/done')
+        finally:
+            tasks.deliver_webhook.pop_request()
+
+
+    def test_deliver(self):
+        self.assertTrue(self.deliver())
+
+        req = tasks.urlopen.call_args[0][0]
+        self.assertEqual(req.full_url, 'http://hooks/done')
+        self.assertEqual(json.loads(req.data.decode()), {
+            'id': 'task', 'state': 'SUCCESS', 'config': 'network',
+            'workspace': 'default', 'action': 'apply', 'rc': 0})
+
+        signature = hmac.new(b'secret', req.data, hashlib.sha256).hexdigest()
+        self.assertEqual(
+            req.get_header('X-terrestrial-signature'), f'sha256={signature}')
+
+
+    def test_unsigned(self):
+        tasks.app.conf.TF_WEBHOOK_SECRET = None
+        self.deliver()
+
+        req = tasks.urlopen.call_args[0][0]
+        self.assertIsNone(req.get_header('X-terrestrial-signature'))
+
+
+    def test_retry(self):
+        tasks.urlopen.side_effect = URLError('refused')
+        with self.assertRaises(Retry):
+            self.deliver(retries=2)
+
+        countdown = tasks.deliver_webhook.retry.call_args[1]['countdown']
+        self.assertEqual(countdown, tasks.app.conf.TF_WEBHOOK_RETRY_DELAY * 4)
+
+
+    def test_rejected(self):
+        def error(code):
+            return HTTPError('http://hooks/done', code, 'error', {}, None)
+
+        tasks.urlopen.side_effect = error(400)
+        self.assertFalse(self.deliver())
+        tasks.deliver_webhook.retry.assert_not_called()
+
+        # Too many requests and server errors are retried
+        for code in [429, 503]:
+            tasks.urlopen.side_effect = error(code)
+            with self.assertRaises(Retry):
+                self.deliver()
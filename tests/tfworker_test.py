@@ -1,8 +1,10 @@
 import unittest
 from shutil import rmtree
 from pathlib import Path
+from unittest.mock import patch
 
-from terrestrial.core.tfworker import TerraformWorker
+from terrestrial.core.tfworker import TerraformWorker, parse_options
+from terrestrial.errors import TerrestrialFatalError
 
 from .helpers import ignore_warnings
 
@@ -40,3 +42,91 @@ class TestTerraformActions(unittest.TestCase):
     def test_destroy(self):
         rc, stdout, stderr = self.worker.destroy()
         self.assertNotEqual(rc, 0, f'non-zero exit code on destroy: {stderr}')
+
+
+class TestTerraformOptions(unittest.TestCase):
+    '''
+    Validates Terraform options passed along with actions
+    '''
+    def test_valid(self):
+        options = parse_options('plan', {
+            'target': ['module.test.null_resource.test[0]'],
+            'parallelism': ['20'],
+            'refresh': ['false'],
+            'lock_timeout': ['30s']
+        })
+        self.assertEqual(options, {
+            'target': ['module.test.null_resource.test[0]'],
+            'parallelism': 20,
+            'refresh': False,
+            'lock_timeout': '30s'
+        })
+
+
+    def test_invalid(self):
+        for action, options in [
+                ('show', {'target': ['null_resource.test']}),
+                ('apply', {'target': ['null_resource.test; rm -rf /']}),
+                ('apply', {'parallelism': ['0']}),
+                ('apply', {'refresh': ['maybe']}),
+                ('apply', {'lock_timeout': ['forever']}),
+                ('apply', {'json': ['true']})]:
+            with self.assertRaises(TerrestrialFatalError):
+                parse_options(action, options)
+
+
+class KnownWorkspaces:
+    def __init__(self, workspaces):
+        self.workspaces = workspaces
+
+    def contains(self, config, workspace):
+        return workspace in self.workspaces.get(config, [])
+
+    def add(self, config, workspace):
+        self.workspaces.setdefault(config, []).append(workspace)
+
+    def remove(self, config, workspace):
+        self.workspaces.get(config, []).remove(workspace)
+
+
+class TestTerraformWorkspaces(unittest.TestCase):
+    '''
+    Switches to workspaces known to exist without running Terraform
+    '''
+    @ignore_warnings
+    def test_known(self):
+        tests_path = Path(__file__).parents[0]
+        with TerraformWorker(
+                config_path=f'{tests_path}/configurations/valid',
+                workspace='default',
+                workspaces=KnownWorkspaces({'valid': ['test']})) as w:
+            with patch('terrestrial.core.executor.run') as run:
+                w.workspace = 'test'
+                run.assert_not_called()
+
+            environment = Path(w.config_path, '.terraform', 'environment')
+            self.assertEqual(environment.read_text(), 'test')
+
+
+    @ignore_warnings
+    def test_missing(self):
+        tests_path = Path(__file__).parents[0]
+        workspaces = KnownWorkspaces({'valid': ['test']})
+        with TerraformWorker(
+                config_path=f'{tests_path}/configurations/valid',
+                workspace='default',
+                workspaces=workspaces) as w:
+            w.workspace = 'test'
+            with patch('terrestrial.core.executor.run') as run:
+                run.side_effect = [
+                    (1, '', 'Currently selected workspace "test" does not exist'),
+                    (0, 'Created and switched to workspace "test"!', ''),
+                    (0, 'No changes.', '')]
+                rc, stdout, stderr = w.plan()
+
+            self.assertEqual(rc, 0)
+            self.assertEqual(stdout, 'No changes.')
+            self.assertEqual(run.call_count, 3)
+            self.assertIn('new', run.call_args_list[1][0][0])
+            self.assertEqual(workspaces.workspaces['valid'], ['test'])
+            self.assertFalse(w.assumed)